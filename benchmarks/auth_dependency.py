@@ -0,0 +1,44 @@
+"""
+Times the auth dependencies alone, without HTTP: get_principal with a cold and a warm
+token cache, and get_current_user served from the local user cache.
+
+    python benchmarks/auth_dependency.py
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.database.models import Role, User  # noqa: E402
+from src.services.auth import auth_service  # noqa: E402
+from src.services.cache import CachedUser  # noqa: E402
+
+
+async def measure(title: str, call, number: int, before=None):
+    started = time.perf_counter()
+    for _ in range(number):
+        if before:
+            before()
+        await call()
+    elapsed = (time.perf_counter() - started) / number * 1e6
+    print(f'{title:>36}: {elapsed:7.2f} us/call')
+
+
+async def main(number: int = 50_000):
+    user = User(id=42, username='deadpool', email='deadpool@example.com', role=Role.user,
+                confirmed=True, avatar=None, token_version=0)
+    token = await auth_service.create_access_token(data=auth_service.token_claims(user))
+    await auth_service.cache.set(user.email, CachedUser.from_user(user))
+
+    await measure('get_principal, token cache cold', lambda: auth_service.get_principal(token), number,
+                  before=auth_service.token_cache.clear)
+    await measure('get_principal, token cache warm', lambda: auth_service.get_principal(token), number)
+    await measure('get_current_user, local user cache', lambda: auth_service.get_current_user(token, db=None),
+                  number)
+    print(auth_service.token_cache.stats())
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+"""
+What the avatar pipeline saves per upload of a camera-sized JPEG: the bytes sent to the storage and the
+time to send them over a link of --bandwidth bytes per second, against the time spent rendering the
+variants (with draft decoding and box reduction, and with a plain LANCZOS fit of the full decode), the
+time to recognise a re-upload by its hash, and how rendering scales over the worker threads.
+
+    python benchmarks/avatar_pipeline.py --width 4000 --height 3000 --workers 4
+"""
+import argparse
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image, ImageOps  # noqa: E402
+
+from src.services.avatars import IMAGE_FORMATS, avatar_digest, render_avatar  # noqa: E402
+
+
+def make_photo(width: int, height: int, quality: int = 92) -> bytes:
+    """A noisy gradient, which compresses about as badly as a photo."""
+    gradient = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 40)
+    image = Image.merge('RGB', (gradient, noise, Image.blend(gradient, noise, 0.5)))
+    file = io.BytesIO()
+    image.save(file, 'JPEG', quality=quality)
+    return file.getvalue()
+
+
+def naive_render(data: bytes, sizes: list[int], image_format: str) -> dict[int, bytes]:
+    variants = {}
+    image = Image.open(io.BytesIO(data)).convert('RGB')
+    for size in sizes:
+        buffer = io.BytesIO()
+        ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS).save(buffer, IMAGE_FORMATS[image_format])
+        variants[size] = buffer.getvalue()
+    return variants
+
+
+def timed(call, repeat: int) -> tuple[float, object]:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = call()
+    return (time.perf_counter() - started) / repeat, result
+
+
+def main(args):
+    photo = make_photo(args.width, args.height)
+    print(f'source: {args.width}x{args.height} JPEG, {len(photo) / 1024:8.0f} KiB, '
+          f'upload {len(photo) / args.bandwidth * 1000:8.0f} ms')
+    for image_format in ('webp', 'jpeg'):
+        elapsed, variants = timed(lambda: render_avatar(io.BytesIO(photo), args.sizes, image_format), args.repeat)
+        size = sum(len(data) for data in variants.values())
+        naive, _ = timed(lambda: naive_render(photo, args.sizes, image_format), args.repeat)
+        print(f'{image_format:>6}: {size / 1024:8.1f} KiB, upload {size / args.bandwidth * 1000:8.1f} ms, '
+              f'render {elapsed * 1000:6.1f} ms (full decode and fit {naive * 1000:6.1f} ms)')
+    elapsed, _ = timed(lambda: avatar_digest(io.BytesIO(photo), args.sizes, 'webp'), args.repeat)
+    print(f'hash of a re-upload: {elapsed * 1000:6.2f} ms')
+
+    for workers in (1, args.workers):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            started = time.perf_counter()
+            list(executor.map(lambda _: render_avatar(io.BytesIO(photo), args.sizes, 'webp'), range(args.images)))
+            elapsed = time.perf_counter() - started
+        print(f'{workers} worker threads: {args.images / elapsed:6.1f} images/sec')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--width', type=int, default=4000)
+    parser.add_argument('--height', type=int, default=3000)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[250, 64])
+    parser.add_argument('--bandwidth', type=int, default=8 * 1024 * 1024, help='Storage upload bytes per second')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--images', type=int, default=16, help='Images rendered in the worker pool')
+    parser.add_argument('--workers', type=int, default=4)
+    main(parser.parse_args())
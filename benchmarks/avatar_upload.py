@@ -0,0 +1,121 @@
+"""
+Latency of contact reads while avatars are being uploaded to a slow storage, with the image uploaded as
+sent inside the request handler as before, and handed to the AvatarUploads worker pool which renders it.
+The storage writes local files but sleeps as if sending them over a link of --bandwidth bytes per second,
+blocking like the Cloudinary SDK.
+Seeds its own database, so point it at a scratch one.
+
+    python benchmarks/avatar_upload.py --db-url sqlite+aiosqlite:///./avatars.db --uploads 8 --reads 400
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+from fastapi import Depends, FastAPI, Request  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # noqa: E402
+
+from avatar_pipeline import make_photo  # noqa: E402
+from http_load import percentile  # noqa: E402
+from pagination_depth import seed  # noqa: E402
+from src.database.models import Base  # noqa: E402
+from src.repository import one_contact  # noqa: E402
+from src.repository import users as repositories_users  # noqa: E402
+from src.services.avatars import AvatarUploads, LocalStorage, spool_upload  # noqa: E402
+
+
+class SlowStorage(LocalStorage):
+    def __init__(self, root: str, bandwidth: int):
+        super().__init__(root, '/static/avatars')
+        self.bandwidth = bandwidth
+
+    def save(self, name, data, image_format):
+        time.sleep(len(data) / self.bandwidth)
+        return super().save(name, data, image_format)
+
+
+def build(engine, user, uploads: AvatarUploads) -> FastAPI:
+    app = FastAPI()
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def get_db():
+        async with session_maker() as db:
+            yield db
+
+    @app.get('/contact/{contact_id}')
+    async def read_contact(contact_id: int, db: AsyncSession = Depends(get_db)):
+        contact = await one_contact.get_contact(contact_id, user, db)
+        return {'id': contact.id, 'email': contact.email}
+
+    @app.patch('/inline')
+    async def upload_inline(request: Request, db: AsyncSession = Depends(get_db)):
+        file = await spool_upload(request.stream())
+        url = uploads.storage.save(user.email, file.read(), 'jpeg')
+        await repositories_users.update_avatar_url(user.email, url, db)
+        return {'url': url}
+
+    @app.patch('/offload', status_code=202)
+    async def upload_offload(request: Request, db: AsyncSession = Depends(get_db)):
+        file = await spool_upload(request.stream())
+        return (await uploads.submit(file, user.id, user.email, db.bind))._asdict()
+
+    return app
+
+
+async def run(app: FastAPI, path: str, args, image: bytes) -> tuple[list[float], float]:
+    latencies: list[float] = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=600) as client:
+        async def upload():
+            await client.patch(path, content=image, headers={'Content-Type': 'image/png'})
+
+        async def read(i: int):
+            # Timed from when the read was due, a read the blocked event loop could not even send counts too
+            due = started + i * args.interval
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            await client.get(f'/contact/{i % args.contacts + 1}')
+            latencies.append((time.perf_counter() - due) * 1000)
+
+        await client.get('/contact/1')
+        started = time.perf_counter()
+        await asyncio.gather(*(upload() for _ in range(args.uploads)), *(read(i) for i in range(args.reads)))
+        return latencies, time.perf_counter() - started
+
+
+async def main(args):
+    engine = create_async_engine(args.db_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    user = await seed(async_sessionmaker(engine, expire_on_commit=False), args.contacts)
+    image = make_photo(args.width, args.height)
+    with tempfile.TemporaryDirectory() as directory:
+        uploads = AvatarUploads(storage='local', workers=args.workers)
+        uploads.storage = SlowStorage(directory, args.bandwidth)
+        app = build(engine, user, uploads)
+        for name, path in [('no uploads', None), ('inline', '/inline'), ('offload', '/offload')]:
+            settings = argparse.Namespace(**{**vars(args), 'uploads': 0 if path is None else args.uploads})
+            latencies, elapsed = await run(app, path, settings, image)
+            await uploads.stop()
+            print(f'{name:>10}: reads p50 {statistics.median(latencies):8.1f} ms, '
+                  f'p99 {percentile(latencies, 99):8.1f} ms, max {max(latencies):8.1f} ms, total {elapsed:6.2f} s')
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db-url', default='sqlite+aiosqlite:///./avatars.db')
+    parser.add_argument('--contacts', type=int, default=1000)
+    parser.add_argument('--uploads', type=int, default=8, help='Concurrent avatar uploads')
+    parser.add_argument('--reads', type=int, default=400, help='Contact reads, started every --interval seconds')
+    parser.add_argument('--interval', type=float, default=0.005)
+    parser.add_argument('--width', type=int, default=1600, help='Of the uploaded JPEG')
+    parser.add_argument('--height', type=int, default=1200)
+    parser.add_argument('--bandwidth', type=int, default=8 * 1024 * 1024, help='Storage upload bytes per second')
+    parser.add_argument('--workers', type=int, default=4)
+    asyncio.run(main(parser.parse_args()))
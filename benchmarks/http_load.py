@@ -0,0 +1,71 @@
+"""
+Small HTTP load generator used to compare endpoint latency between revisions.
+
+Run the API (``uvicorn main:app``) with ``RATE_LIMIT_DEFAULT=`` (empty) so the rate limiter does not
+answer most of the load with 429, and point the script at it:
+
+    python benchmarks/http_load.py http://localhost:8000/api/contacts/ --token <access_token> -c 200 -n 5000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(url: str, headers: dict, concurrency: int, total: int, method: str = 'GET', **request_kwargs) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            started = time.perf_counter()
+            response = await client.request(method, url, headers=headers, **request_kwargs)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        'requests': total,
+        'errors': errors,
+        'rps': total / elapsed,
+        'p50_ms': statistics.median(latencies),
+        'p99_ms': percentile(latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('url')
+    parser.add_argument('--token', help='Bearer access token')
+    parser.add_argument('-c', '--concurrency', type=int, default=100)
+    parser.add_argument('-n', '--requests', type=int, default=2000)
+    parser.add_argument('-X', '--method', default='GET')
+    args = parser.parse_args()
+
+    headers = {'Authorization': f'Bearer {args.token}'} if args.token else {}
+    result = asyncio.run(run(args.url, headers, args.concurrency, args.requests, args.method))
+    for key, value in result.items():
+        print(f'{key:>10}: {value:.2f}' if isinstance(value, float) else f'{key:>10}: {value}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Builds an IP ban list of random IPv4 and IPv6 rules (single addresses and CIDR blocks) and times
+lookups in the prefix tree against a linear scan of the same rules, as a list of networks would do.
+
+    python benchmarks/ip_ban_lookup.py --rules 100000
+"""
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from ipaddress import IPv4Address, IPv4Network, IPv6Address, IPv6Network, ip_address
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services.ip_bans import IpBanList, parse_rules  # noqa: E402
+
+IPV4_PREFIXES = [32] * 6 + [24, 24, 20, 16]
+IPV6_PREFIXES = [128, 128, 64, 48, 32]
+
+
+def make_rules(count: int, rng: random.Random) -> list[str]:
+    rules = []
+    for i in range(count):
+        if i % 5:
+            rules.append(str(IPv4Network((rng.getrandbits(32), rng.choice(IPV4_PREFIXES)), strict=False)))
+        else:
+            rules.append(str(IPv6Network((rng.getrandbits(128), rng.choice(IPV6_PREFIXES)), strict=False)))
+    return rules
+
+
+def make_hosts(count: int, rng: random.Random) -> list[str]:
+    return [str(IPv4Address(rng.getrandbits(32))) if i % 5 else str(IPv6Address(rng.getrandbits(128)))
+            for i in range(count)]
+
+
+def main(args):
+    rng = random.Random(42)
+    rules = make_rules(args.rules, rng)
+    hosts = make_hosts(args.lookups, rng)
+
+    started = time.perf_counter()
+    bans = IpBanList(path=None)
+    bans.tree = parse_rules(rules)
+    build = time.perf_counter() - started
+    tracemalloc.start()
+    parse_rules(rules)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'prefix tree: {args.rules} rules built in {build:6.2f} s, peak {peak / 2 ** 20:6.1f} MiB')
+
+    started = time.perf_counter()
+    banned = sum(bans.is_banned(host) for host in hosts)
+    elapsed = time.perf_counter() - started
+    print(f'prefix tree: {len(hosts) / elapsed:12.0f} lookups/sec ({banned} of {len(hosts)} banned)')
+
+    networks = [IPv4Network(rule) if ':' not in rule else IPv6Network(rule) for rule in rules]
+    sample = hosts[:args.linear]
+    started = time.perf_counter()
+    for host in sample:
+        address = ip_address(host)
+        any(address in network for network in networks)
+    elapsed = time.perf_counter() - started
+    print(f'linear scan: {len(sample) / elapsed:12.0f} lookups/sec')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rules', type=int, default=100_000)
+    parser.add_argument('--lookups', type=int, default=200_000)
+    parser.add_argument('--linear', type=int, default=50, help='Lookups timed with the linear scan')
+    main(parser.parse_args())
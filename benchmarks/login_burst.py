@@ -0,0 +1,37 @@
+"""
+Measures /api/contacts/ read latency while a burst of logins is hashing passwords.
+Start the API with RATE_LIMIT_DEFAULT= (empty), otherwise the rate limiter refuses most of the burst.
+
+    python benchmarks/login_burst.py http://localhost:8000 --email user@example.com --password 12345678 --token <access_token>
+"""
+import argparse
+import asyncio
+
+from http_load import run
+
+
+async def main(args):
+    contacts_url = f'{args.base_url}/api/contacts/'
+    headers = {'Authorization': f'Bearer {args.token}'}
+
+    baseline = await run(contacts_url, headers, args.concurrency, args.reads)
+    reads, logins = await asyncio.gather(
+        run(contacts_url, headers, args.concurrency, args.reads),
+        run(f'{args.base_url}/api/auth/login', {}, args.logins, args.logins * 5, 'POST',
+            data={'username': args.email, 'password': args.password}),
+    )
+    for title, result in (('reads alone', baseline), ('reads during logins', reads), ('logins', logins)):
+        print(f"{title:>20}: p50={result['p50_ms']:.1f}ms p99={result['p99_ms']:.1f}ms "
+              f"rps={result['rps']:.0f} errors={result['errors']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base_url')
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--token', required=True)
+    parser.add_argument('-c', '--concurrency', type=int, default=50)
+    parser.add_argument('-n', '--reads', type=int, default=2000)
+    parser.add_argument('-l', '--logins', type=int, default=50, help='Concurrent login clients')
+    asyncio.run(main(parser.parse_args()))
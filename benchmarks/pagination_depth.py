@@ -0,0 +1,97 @@
+"""
+Compares skip/limit with keyset pagination on a large contact list, at the first page and deep
+into the list, for both sort orders: the contacts of one user (/api/contacts/page) and all contacts
+(/api/all/page). Seeds its own database, so point it at a scratch one.
+
+    python benchmarks/pagination_depth.py --db-url sqlite+aiosqlite:///./pagination.db --contacts 1000000 --depth 900000
+"""
+import argparse
+import asyncio
+import itertools
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import func, insert, select  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.orm import selectinload  # noqa: E402
+
+from src.database.models import Base, Contact, User  # noqa: E402
+from src.repository.pagination import ORDER_COLUMNS, ContactOrder, encode_cursor, keyset_page  # noqa: E402
+
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Wilson', 'Taylor']
+
+
+async def seed(session_maker, contacts: int, chunk: int = 10_000) -> User:
+    async with session_maker() as db:
+        user = (await db.execute(select(User).filter(User.email == 'pagination@example.com'))).scalar_one_or_none()
+        if user is None:
+            user = User(username='pagination', email='pagination@example.com', password='x', confirmed=True)
+            db.add(user)
+            await db.commit()
+        present = await db.scalar(select(func.count(Contact.id)).filter(Contact.user_id == user.id))
+        for start in range(present, contacts, chunk):
+            rows = [{
+                'first_name': f'first{i}', 'last_name': f'{LAST_NAMES[i % len(LAST_NAMES)]}{i % 997}',
+                'email': f'contact{i}@example.com', 'phone': f'+{i:012d}',
+                'birth_date': date(1960 + i % 40, 1, 1) + timedelta(days=i % 366), 'user_id': user.id,
+            } for i in range(start, min(start + chunk, contacts))]
+            await db.execute(insert(Contact), rows)
+            await db.commit()
+            print(f'seeded {min(start + chunk, contacts)}/{contacts}', end='\r')
+        return user
+
+
+async def measure(call, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await call()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+async def main(args):
+    engine = create_async_engine(args.db_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    user = await seed(session_maker, args.contacts)
+    print()
+
+    queries = {
+        'user': select(Contact).filter(Contact.user_id == user.id),
+        'all': select(Contact).options(selectinload(Contact.user)),
+    }
+    async with session_maker() as db:
+        for (name, base), order in itertools.product(queries.items(), ContactOrder):
+            columns = ORDER_COLUMNS[order]
+            for depth in (0, args.depth):
+                async def by_offset():
+                    await db.execute(base.order_by(*columns).offset(depth).limit(args.limit))
+
+                cursor = None
+                if depth:
+                    last = await db.execute(base.order_by(*columns).offset(depth - 1).limit(1))
+                    cursor = encode_cursor(order, last.scalar_one())
+
+                async def by_keyset():
+                    await keyset_page(base, order, cursor, args.limit, db)
+
+                offset_ms = await measure(by_offset, args.repeat)
+                keyset_ms = await measure(by_keyset, args.repeat)
+                db.expunge_all()
+                print(f'{name:>4} order={order.value:<9} depth={depth:>8}: offset {offset_ms:8.2f} ms, '
+                      f'keyset {keyset_ms:8.2f} ms')
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db-url', required=True, help='Async database url, the tables are created if missing')
+    parser.add_argument('--contacts', type=int, default=1_000_000)
+    parser.add_argument('--depth', type=int, default=900_000)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,96 @@
+"""
+Requests per second through a FastAPI app with about as many routes as this one, calling it over ASGI
+without a server: no limiter, fastapi_limiter's RateLimiter, and RateLimiter with the Redis and the
+in-memory backends. Measured for a client under its limit and for one hammering a route it is already
+blocked on, where fastapi_limiter still calls Redis for every request. fastapi_limiter is no longer a
+dependency of the project, its cases are skipped unless it is installed (pip install fastapi-limiter).
+
+    python benchmarks/rate_limit.py --redis-url redis://localhost:6379/15 --requests 5000
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import redis.asyncio as redis  # noqa: E402
+from fastapi import Depends, FastAPI  # noqa: E402
+
+try:
+    from fastapi_limiter import FastAPILimiter
+    from fastapi_limiter.depends import RateLimiter as FastAPIRateLimiter
+except ImportError:
+    FastAPILimiter = None
+
+from src.services.rate_limit import RateLimiter  # noqa: E402
+
+UNLIMITED = 10 ** 9
+ROUTES = 40
+
+
+def build(dependency=None) -> FastAPI:
+    app = FastAPI(dependencies=[Depends(dependency)] if dependency else [])
+    for i in range(ROUTES):
+        app.get(f'/api/filler/{i}')(lambda: None)
+
+    @app.get('/api/contact/{contact_id}')
+    async def read_contact(contact_id: int):
+        return {'id': contact_id}
+
+    return app
+
+
+async def measure(app: FastAPI, requests: int) -> tuple[float, int]:
+    statuses = []
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        messages = iter([{'type': 'http.request', 'body': b'', 'more_body': False}])
+
+        async def receive():
+            return next(messages, {'type': 'http.disconnect'})
+
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': '/api/contact/1', 'raw_path': b'/api/contact/1', 'root_path': '', 'query_string': b'',
+            'client': ('10.0.0.1', 1234), 'server': ('testserver', 80), 'headers': [],
+        }
+        await app(scope, receive, send)
+    return requests / (time.perf_counter() - started), statuses.count(429)
+
+
+async def main(args):
+    client = redis.from_url(args.redis_url)
+    await client.flushdb()
+    redis_limiter = RateLimiter(default=f'{UNLIMITED}/60', routes={}, users={})
+    await redis_limiter.start(client)
+    blocked_limiter = RateLimiter(default='1/3600', routes={}, users={})
+    await blocked_limiter.start(client)
+    cases = {
+        'no limiter': build(),
+        'RateLimiter, Redis': build(redis_limiter),
+        'RateLimiter, memory': build(RateLimiter(default=f'{UNLIMITED}/60', routes={}, users={})),
+        'RateLimiter, Redis, blocked': build(blocked_limiter),
+    }
+    if FastAPILimiter is not None:
+        await FastAPILimiter.init(client)
+        cases['fastapi_limiter'] = build(FastAPIRateLimiter(times=UNLIMITED, seconds=60))
+        cases['fastapi_limiter, blocked'] = build(FastAPIRateLimiter(times=1, seconds=3600))
+    for name, app in cases.items():
+        rate, rejected = await measure(app, args.requests)
+        print(f'{name:>28}: {rate:8.0f} requests/sec, {rejected} rejected')
+    await client.flushdb()
+    await client.aclose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--redis-url', default='redis://localhost:6379/15', help='A scratch database, it is flushed')
+    parser.add_argument('--requests', type=int, default=5000)
+    asyncio.run(main(parser.parse_args()))
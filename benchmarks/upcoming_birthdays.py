@@ -0,0 +1,73 @@
+"""
+Compares the former upcoming-birthday lookup, which loaded every contact of the user and filtered
+in Python, with the indexed birthday_key range query. Seeds its own database, so point it at a scratch one.
+
+    python benchmarks/upcoming_birthdays.py --db-url sqlite+aiosqlite:///./birthdays.db --contacts 100000
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import select  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from pagination_depth import seed  # noqa: E402
+from src.database.models import Base, Contact  # noqa: E402
+from src.repository.contacts import get_upcoming_birthdays_contacts  # noqa: E402
+
+
+async def load_and_filter(user, db, days: int) -> tuple[int, int]:
+    result = await db.execute(select(Contact).filter(Contact.user_id == user.id))
+    contacts = result.scalars().all()
+    today = date.today()
+    upcoming = 0
+    for contact in contacts:
+        try:
+            birth = contact.birth_date.replace(year=today.year)
+        except ValueError:
+            # February 29 in a non-leap year, which the old code crashed on
+            birth = date(today.year, 3, 1)
+        if birth < today - timedelta(days=1):
+            birth = birth.replace(year=today.year + 1)
+        if today <= birth <= today + timedelta(days=days):
+            upcoming += 1
+    return len(contacts), upcoming
+
+
+async def main(args):
+    engine = create_async_engine(args.db_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    user = await seed(session_maker, args.contacts)
+    print()
+
+    async with session_maker() as db:
+        for days in (7, 30):
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                rows, upcoming = await load_and_filter(user, db, days)
+                db.expunge_all()
+            python_ms = (time.perf_counter() - started) / args.repeat * 1000
+
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                contacts = await get_upcoming_birthdays_contacts(user, db, days)
+                db.expunge_all()
+            sql_ms = (time.perf_counter() - started) / args.repeat * 1000
+            print(f'days={days:>3} python filter: {rows:>7} rows, {upcoming} upcoming, {python_ms:8.2f} ms | '
+                  f'sql filter: {len(contacts):>7} rows, {sql_ms:8.2f} ms')
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db-url', required=True, help='Async database url, the tables are created if missing')
+    parser.add_argument('--contacts', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,91 @@
+"""
+Requests per second through the User-Agent ban check alone, calling a bare Starlette app over ASGI
+without a server: the former @app.middleware('http') function (two prints, one re.search per pattern)
+against UserAgentBanMiddleware, for a mix of User-Agents repeated the way real clients repeat them.
+
+    python benchmarks/user_agent_middleware.py --requests 50000
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from starlette.applications import Starlette  # noqa: E402
+from starlette.middleware import Middleware  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+from starlette.responses import JSONResponse, PlainTextResponse  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+
+from src.services.user_agents import UserAgentBanMiddleware  # noqa: E402
+
+BAN_LIST = [r'Googlebot', r'Python-urllib', r'AhrefsBot', r'SemrushBot', r'MJ12bot', r'DotBot']
+USER_AGENTS = [
+    b'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36',
+    b'Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148',
+    b'okhttp/4.12.0',
+    b'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)',
+]
+
+
+async def homepage(request):
+    return PlainTextResponse('ok')
+
+
+async def former_middleware(request, call_next):
+    print(request.headers.get('Authorization'))
+    user_agent = request.headers.get('user-agent')
+    print(user_agent)
+    for ban_pattern in BAN_LIST:
+        if re.search(ban_pattern, user_agent):
+            return JSONResponse(status_code=403, content={'detail': 'You are banned'})
+    return await call_next(request)
+
+
+def build(middleware: list[Middleware]) -> Starlette:
+    return Starlette(routes=[Route('/', homepage)], middleware=middleware)
+
+
+async def measure(app, requests: int) -> float:
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for i in range(requests):
+        messages = iter([{'type': 'http.request', 'body': b'', 'more_body': False}])
+
+        async def receive():
+            return next(messages, {'type': 'http.disconnect'})
+
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': '/', 'raw_path': b'/', 'root_path': '', 'query_string': b'', 'client': ('10.0.0.1', 1234),
+            'server': ('testserver', 80),
+            'headers': [(b'user-agent', USER_AGENTS[i % len(USER_AGENTS)]), (b'authorization', b'Bearer x')],
+        }
+        await app(scope, receive, send)
+    return requests / (time.perf_counter() - started)
+
+
+async def main(args):
+    apps = {
+        'no middleware': build([]),
+        'former middleware': build([Middleware(BaseHTTPMiddleware, dispatch=former_middleware)]),
+        'UserAgentBanMiddleware': build([Middleware(UserAgentBanMiddleware, patterns=BAN_LIST)]),
+    }
+    for name, app in apps.items():
+        # The former middleware prints twice per request, keep that cost but not the output
+        with contextlib.redirect_stdout(io.StringIO()):
+            rate = await measure(app, args.requests)
+        print(f'{name:>22}: {rate:10.0f} requests/sec')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=50_000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,35 @@
+"""
+Compares the user cache codec with pickling a SQLAlchemy User instance.
+
+    python benchmarks/user_cache_codec.py
+"""
+import pickle
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.database.models import Role, User  # noqa: E402
+from src.services.cache import CachedUser, decode_user, encode_user  # noqa: E402
+
+
+def main(number: int = 100_000):
+    user = User(id=42, username='deadpool', email='deadpool@example.com', password='x' * 60,
+                refresh_token='y' * 180, role=Role.user, confirmed=True,
+                avatar='https://res.cloudinary.com/demo/image/upload/c_fill,h_250,w_250/v1/Web/deadpool')
+    cached = CachedUser.from_user(user)
+
+    codecs = {
+        'pickle(User)': (lambda: pickle.dumps(user), pickle.loads),
+        'msgpack(CachedUser)': (lambda: encode_user(cached), decode_user),
+    }
+    for name, (dumps, loads) in codecs.items():
+        data = dumps()
+        encode = timeit.timeit(dumps, number=number) / number * 1e6
+        decode = timeit.timeit(lambda: loads(data), number=number) / number * 1e6
+        print(f'{name:>20}: {len(data):5d} bytes, encode {encode:6.2f} us, decode {decode:6.2f} us')
+
+
+if __name__ == '__main__':
+    main()
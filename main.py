@@ -1,40 +1,58 @@
 import uvicorn
-import re
 import redis.asyncio as redis
 
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Depends, HTTPException, Request, status
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi import FastAPI, Depends, HTTPException
+from fastapi.responses import HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi_limiter import FastAPILimiter
 from sqlalchemy import text
-from sqlalchemy.orm import Session
-from ipaddress import ip_address
-from typing import Callable
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.routes import contacts, one_contact, auth, full_access, users
 from src.schemas.contacts import ContactResponse
-from src.database.db import get_db
+from src.database.db import get_db, engine, pool_metrics
 from src.database.models import Contact
 from src.conf.config import config
+from src.conf.logs import queue_logging
+from src.services.auth import auth_service
+from src.services.avatars import avatar_uploads
+from src.services.birthdays import birthday_calendar
+from src.services.cache import user_cache
+from src.services.ip_bans import IpBanMiddleware, ip_ban_list
+from src.services.rate_limit import rate_limiter
+from src.services.user_agents import UserAgentBanMiddleware
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    r = await redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=0, password=config.REDIS_PASSWORD)
-    await FastAPILimiter.init(r)
+    queue_logging.start()
+    r = redis.Redis(
+        host=config.REDIS_HOST,
+        port=config.REDIS_PORT,
+        db=0,
+        password=config.REDIS_PASSWORD,
+        max_connections=config.REDIS_MAX_CONNECTIONS,
+    )
+    await user_cache.start(r)
+    await birthday_calendar.start(r)
+    await ip_ban_list.start(r)
+    await rate_limiter.start(r)
+    await avatar_uploads.start(r)
     yield
+    await avatar_uploads.stop()
+    await rate_limiter.stop()
+    await ip_ban_list.stop()
+    await birthday_calendar.stop()
+    await user_cache.stop()
+    await r.aclose()
+    queue_logging.stop()
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, dependencies=[Depends(rate_limiter)])
 
 
-banned_ips = [
-    ip_address("192.168.1.1"),
-    ip_address("192.168.1.2"),
-    ip_address("127.0.0.1"),
-]
 origins = ["*"]
 
 app.add_middleware(
@@ -49,19 +67,8 @@ app.add_middleware(
 user_agent_ban_list = [r"Googlebot", r"Python-urllib"]
 
 
-@app.middleware("http")
-async def user_agent_ban_middleware(request: Request, call_next: Callable):
-    print(request.headers.get("Authorization"))
-    user_agent = request.headers.get("user-agent")
-    print(user_agent)
-    for ban_pattern in user_agent_ban_list:
-        if re.search(ban_pattern, user_agent):
-            return JSONResponse(
-                status_code=status.HTTP_403_FORBIDDEN,
-                content={"detail": "You are banned"},
-            )
-    response = await call_next(request)
-    return response
+app.add_middleware(UserAgentBanMiddleware, patterns=user_agent_ban_list)
+app.add_middleware(IpBanMiddleware)
 
 
 app.include_router(auth.router, prefix='/api')
@@ -70,6 +77,9 @@ app.include_router(contacts.router, prefix='/api')
 app.include_router(one_contact.router, prefix='/api')
 app.include_router(full_access.router, prefix='/api')
 
+if config.AVATAR_STORAGE == 'local':
+    app.mount(config.AVATAR_URL, StaticFiles(directory=config.AVATAR_DIR, check_dir=False), name='avatars')
+
 
 
 @app.get('/')
@@ -77,7 +87,7 @@ def read_root():
     return {"message": "Hello World"}
 
 @app.get('/api/healthchecker')
-async def healthchecker(db: Session = Depends(get_db)):
+async def healthchecker(db: AsyncSession = Depends(get_db)):
     try:
         result = await db.execute(text('SELECT 1'))
         result = result.fetchone()
@@ -89,6 +99,29 @@ async def healthchecker(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail='Error connecting to the database')
 
 
+@app.get('/api/healthchecker/pool')
+async def pool_stats():
+    """
+    The pool_stats function reports the state of the database connection pool of this worker:
+    connections checked out, overflow in use and a histogram of checkout wait times.
+
+    :return: A dictionary with the pool counters
+    """
+    return pool_metrics.snapshot(engine.sync_engine.pool)
+
+
+@app.get('/api/healthchecker/cache')
+async def cache_stats():
+    """
+    The cache_stats function reports the cache counters of this worker: for the user cache
+    local and Redis hits, evictions and how late invalidation messages arrive, and the
+    hits and misses of the verified token cache.
+
+    :return: A dictionary with the cache counters
+    """
+    return {'users': user_cache.stats(), 'tokens': auth_service.token_cache.stats()}
+
+
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -0,0 +1,32 @@
+"""add contact birthday key
+
+Revision ID: 5d2b7e4c9a16
+Revises: c81e5a9d0f3b
+Create Date: 2026-10-17 15:27:04.660183
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2b7e4c9a16'
+down_revision: Union[str, None] = 'c81e5a9d0f3b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    birth_date = sa.column('birth_date')
+    op.add_column('contacts', sa.Column(
+        'birthday_key', sa.Integer(),
+        sa.Computed(sa.extract('month', birth_date) * 100 + sa.extract('day', birth_date)), nullable=False,
+    ))
+    op.create_index('ix_contacts_user_id_birthday_key', 'contacts', ['user_id', 'birthday_key'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_birthday_key', table_name='contacts')
+    op.drop_column('contacts', 'birthday_key')
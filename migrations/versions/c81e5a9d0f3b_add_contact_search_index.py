@@ -0,0 +1,32 @@
+"""add contact search index
+
+Revision ID: c81e5a9d0f3b
+Revises: a3c1f0d27b54
+Create Date: 2026-10-17 14:03:19.218464
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81e5a9d0f3b'
+down_revision: Union[str, None] = 'a3c1f0d27b54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # On SQLite the FTS5 fallback is created with the tables by Base.metadata.create_all, see src/database/models.py
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.add_column('contacts', sa.Column('search_text', sa.String(),
+                                        sa.Computed("first_name || ' ' || last_name || ' ' || email")))
+    op.create_index('ix_contacts_search_text_trgm', 'contacts', ['search_text'], postgresql_using='gin',
+                    postgresql_ops={'search_text': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_search_text_trgm', table_name='contacts')
+    op.drop_column('contacts', 'search_text')
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import ConfigDict, validator
 from pydantic_settings import BaseSettings
 
@@ -11,8 +13,25 @@ class Settings(BaseSettings):
     DB_HOST: str
  
     DB_URL: str
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
     SECRET_KEY: str
     ALGORITHM: str
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_LIMIT: int = 64
+    TOKEN_CACHE_SIZE: int = 4096
+    USER_AGENT_CACHE_SIZE: int = 4096
+    IP_BAN_FILE: str | None = None
+    IP_BAN_REDIS_KEY: str = 'ip-bans'
+    IP_BAN_RELOAD_INTERVAL: float = 5
+    RATE_LIMIT_DEFAULT: str | None = '300/60'
+    RATE_LIMIT_ROUTES: dict[str, str] = {'GET /api/users/me': '1/20', 'PATCH /api/users/avatar': '1/20'}
+    RATE_LIMIT_USERS: dict[str, str] = {}
+    RATE_LIMIT_BLOCKED_SIZE: int = 10000
+    LOG_LEVEL: str = 'INFO'
     MAIL_USERNAME: str
     MAIL_PASSWORD: str
     MAIL_FROM: str
@@ -22,10 +41,27 @@ class Settings(BaseSettings):
     REDIS_HOST: str = 'localhost'
     REDIS_PORT: int = 6379
     REDIS_PASSWORD: str | None = None
+    REDIS_MAX_CONNECTIONS: int = 50
+    USER_CACHE_TTL: int = 300
+    USER_CACHE_LOCAL_SIZE: int = 1024
+    USER_CACHE_LOCAL_TTL: float = 30
+    BIRTHDAY_CALENDAR_TTL: int = 24 * 60 * 60
+    IMPORT_BATCH_SIZE: int = 1000
+    EXPORT_BATCH_SIZE: int = 1000
 
     CLOUDINARY_NAME: str
     CLOUDINARY_API_KEY: int = 818941732257654
     CLOUDINARY_API_SECRET: str = 'secret'
+    AVATAR_STORAGE: Literal['cloudinary', 'local'] = 'cloudinary'
+    AVATAR_DIR: str = 'static/avatars'
+    AVATAR_URL: str = '/static/avatars'
+    AVATAR_MAX_BYTES: int = 10 * 1024 * 1024
+    AVATAR_MAX_PIXELS: int = 40_000_000
+    AVATAR_SIZES: list[int] = [250]
+    AVATAR_FORMAT: Literal['webp', 'jpeg'] = 'webp'
+    AVATAR_QUALITY: int = 85
+    AVATAR_UPLOAD_WORKERS: int = 4
+    AVATAR_JOB_TTL: int = 3600
     
     model_config = ConfigDict(extra='ignore', env_file='.env', env_file_decoding='utf-8')
     # class Config:
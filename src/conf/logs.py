@@ -0,0 +1,53 @@
+import logging
+import logging.handlers
+import queue
+
+from src.conf.config import config
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Formats the message and then appends the extra fields of the record as key=value pairs."""
+    reserved = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = [f'{key}={value!r}' for key, value in vars(record).items() if key not in self.reserved]
+        return ' '.join([line, *fields])
+
+
+class QueueLogging:
+    """
+    Sends the records of the application loggers (the src package) through a queue, so a request
+    only enqueues a record and a background thread formats and writes it.
+
+    Attributes:
+        logger (Logger): The parent logger of the application modules.
+        listener (QueueListener | None): The thread writing the records, set by start().
+    """
+
+    def __init__(self, name: str = 'src'):
+        self.logger = logging.getLogger(name)
+        self.listener: logging.handlers.QueueListener | None = None
+        self._handler: logging.Handler | None = None
+
+    def start(self, level: str = config.LOG_LEVEL) -> None:
+        if self.listener is not None:
+            return
+        output = logging.StreamHandler()
+        output.setFormatter(KeyValueFormatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+        records = queue.SimpleQueue()
+        self._handler = logging.handlers.QueueHandler(records)
+        self.logger.addHandler(self._handler)
+        self.logger.setLevel(level)
+        self.listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self) -> None:
+        if self.listener is None:
+            return
+        self.logger.removeHandler(self._handler)
+        self.listener.stop()
+        self.listener = self._handler = None
+
+
+queue_logging = QueueLogging()
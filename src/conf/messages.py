@@ -3,3 +3,14 @@ EMAIL_NOT_CONFIRMED = "Email not confirmed"
 WRONG_PASSWORD = "Invalid password"
 WRONG_EMAIL = "Invalid email"
 NOT_CONTACT = "Contact not found"
+SERVER_BUSY = "Server is busy, try again later"
+INVALID_CURSOR = "Invalid pagination cursor"
+CONTACT_EXISTS = "Contact with this email or phone already exists"
+UNSUPPORTED_IMPORT_FORMAT = "Upload text/csv or application/x-ndjson"
+BANNED = "You are banned"
+TOO_MANY_REQUESTS = "Too many requests, try again later"
+UNSUPPORTED_AVATAR_FORMAT = "Upload a JPEG, PNG, WebP or GIF image"
+AVATAR_TOO_LARGE = "The image is too large"
+AVATAR_JOB_NOT_FOUND = "Avatar upload not found"
+AVATAR_UNCHANGED = "The image is the current avatar, it was not uploaded again"
+AVATAR_UPLOAD_FAILED = "The avatar could not be saved, try again later"
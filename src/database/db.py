@@ -1,18 +1,113 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import time
+from bisect import bisect_left
+from threading import Lock
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from src.conf.config import config
 
-engine = create_engine(config.DB_URL)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+class PoolMetrics:
+    """
+    Counters for the connection pool: checkouts, connects, invalidations and
+    a histogram of the time spent waiting for a connection.
+    """
+    buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float('inf'))
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.connects = 0
+            self.invalidations = 0
+            self.wait_counts = [0] * len(self.buckets)
+            self.wait_sum = 0.0
+            self.wait_max = 0.0
+
+    def observe_wait(self, seconds: float):
+        with self._lock:
+            self.wait_counts[bisect_left(self.buckets, seconds)] += 1
+            self.wait_sum += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def snapshot(self, pool) -> dict:
+        """
+        The snapshot function returns the current pool state and the collected counters.
+
+        :param pool: Pool: The pool of the engine to report on
+        :return: A dictionary that can be returned as JSON
+        """
+        with self._lock:
+            cumulative, histogram = 0, {}
+            for bound, count in zip(self.buckets, self.wait_counts):
+                cumulative += count
+                histogram['+Inf' if bound == float('inf') else str(bound)] = cumulative
+            return {
+                'size': pool.size(),
+                'checked_out': pool.checkedout(),
+                'checked_in': pool.checkedin(),
+                'overflow': pool.overflow(),
+                'checkouts': self.checkouts,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'wait_seconds': {
+                    'count': cumulative,
+                    'sum': self.wait_sum,
+                    'max': self.wait_max,
+                    'buckets': histogram,
+                },
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_metrics.observe_wait(time.perf_counter() - started)
+
+
+engine = create_async_engine(
+    config.DB_URL,
+    poolclass=InstrumentedPool,
+    pool_size=config.DB_POOL_SIZE,
+    max_overflow=config.DB_MAX_OVERFLOW,
+    pool_timeout=config.DB_POOL_TIMEOUT,
+    pool_recycle=config.DB_POOL_RECYCLE,
+    pool_pre_ping=config.DB_POOL_PRE_PING,
+)
+
+
+@event.listens_for(engine.sync_engine.pool, 'checkout')
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_metrics.checkouts += 1
+
+
+@event.listens_for(engine.sync_engine.pool, 'connect')
+def _on_connect(dbapi_connection, connection_record):
+    pool_metrics.connects += 1
+
+
+@event.listens_for(engine.sync_engine.pool, 'invalidate')
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    pool_metrics.invalidations += 1
+
+
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
-
@@ -1,7 +1,7 @@
 import enum
 from datetime import datetime, date
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import String, Date, Integer, ForeignKey, DateTime, func, Enum, Boolean
+from sqlalchemy import String, Date, Integer, ForeignKey, DateTime, func, Enum, Boolean, Computed, DDL, Index, column, event, extract
 from src.database.db import engine
 
 
@@ -16,11 +16,30 @@ class Contact(Base):
     email: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
     phone: Mapped[str] = mapped_column(String, unique=True, nullable=False)
     birth_date: Mapped[Date] = mapped_column(Date)
+    # Month * 100 + day of birth_date, so upcoming birthdays are a range lookup in any year
+    birthday_key: Mapped[int] = mapped_column(
+        Integer, Computed(extract('month', column('birth_date')) * 100 + extract('day', column('birth_date')))
+    )
     info: Mapped[str] = mapped_column(String(100), nullable=True)
     created_at: Mapped[DateTime] = mapped_column(DateTime, default=func.now(), nullable=True)
     updated_at: Mapped[DateTime] = mapped_column(DateTime, default=func.now(), onupdate=func.now(), nullable=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=True)
-    user: Mapped['User'] = relationship(backref='contact', lazy='joined')
+    # Loaded only where a query asks for it (selectinload in full_access), never as a side effect
+    user: Mapped['User'] = relationship(backref='contact', lazy='raise_on_sql')
+    # What /api/contacts/search matches against, kept up to date by the database itself
+    search_text: Mapped[str] = mapped_column(String, Computed("first_name || ' ' || last_name || ' ' || email"))
+
+    # Every per-user lookup leads with user_id, so the owner's rows are one index range
+    __table_args__ = (
+        Index('ix_contacts_user_id_id', 'user_id', 'id'),
+        Index('ix_contacts_last_name_id', 'last_name', 'id'),
+        Index('ix_contacts_user_id_last_name_id', 'user_id', 'last_name', 'id'),
+        Index('ix_contacts_user_id_email', 'user_id', 'email'),
+        Index('ix_contacts_user_id_last_name_first_name', 'user_id', 'last_name', 'first_name'),
+        Index('ix_contacts_user_id_birthday_key', 'user_id', 'birthday_key'),
+        Index('ix_contacts_search_text_trgm', 'search_text', postgresql_using='gin',
+              postgresql_ops={'search_text': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+    )
 
 
 class Role(enum.Enum):
@@ -41,6 +60,26 @@ class User(Base):
     role: Mapped[Enum] = mapped_column(Enum(Role), default=Role.user)
     confirmed: Mapped[bool] = mapped_column(Boolean, default=False)
     avatar: Mapped[str] = mapped_column(String(255), nullable=True)
+    avatar_hash: Mapped[str] = mapped_column(String(64), nullable=True)
+    token_version: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+
+
+# Search index for each backend: pg_trgm on PostgreSQL, a trigram FTS5 table kept in sync by triggers on SQLite
+event.listen(Base.metadata, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+for statement in (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5("
+    "search_text, content='contacts', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+    "INSERT INTO contacts_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); "
+    "INSERT INTO contacts_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+):
+    event.listen(Contact.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Contact.__table__, 'after_drop', DDL('DROP TABLE IF EXISTS contacts_fts').execute_if(dialect='sqlite'))
 
 
 # Base.metadata.create_all(engine)
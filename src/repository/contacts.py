@@ -1,73 +1,114 @@
-from typing import List, Type
+from typing import AsyncIterator, List, Sequence, Tuple, Type
 
 from datetime import date, timedelta
-from sqlalchemy import and_, or_
-from sqlalchemy.orm import Session
+from sqlalchemy import Row, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import Contact, User
+from src.repository.pagination import ContactOrder, keyset_page
+from src.repository.search import search_stmt
+from src.services.birthdays import birthday_calendar, birthday_key
 
 
-async def get_contacts(skip: int, limit: int, user: User, db: Session) -> List[Contact]:
+async def get_contacts(skip: int, limit: int, user: User, db: AsyncSession) -> List[Contact]:
     """
     The get_contacts function returns a list of contacts for the user.
     
     :param skip: int: Skip a number of records in the database
     :param limit: int: Limit the number of contacts returned
     :param user: User: Get the user id from the database
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A list of contacts
     :doc-author: Trelent
     """
-    return db.query(Contact).filter(Contact.user_id == user.id).offset(skip).limit(limit).all()
+    stmt = select(Contact).filter(Contact.user_id == user.id).offset(skip).limit(limit)
+    contacts = await db.execute(stmt)
+    return contacts.scalars().all()
 
 
-async def search_contacts(query: str, user: User, db: Session) -> list[Type[Contact]]:
+async def get_contacts_page(limit: int, user: User, db: AsyncSession, cursor: str | None = None,
+                            order: ContactOrder = ContactOrder.id) -> Tuple[List[Contact], str | None]:
+    """
+    The get_contacts_page function returns one page of the user's contacts using keyset pagination.
+    
+    :param limit: int: Limit the number of contacts returned
+    :param user: User: Get the user id from the database
+    :param db: AsyncSession: Pass the database session to the function
+    :param cursor: str | None: The next_cursor of the previous page
+    :param order: ContactOrder: Sort by id, or by last name then id
+    :return: A list of contacts and the cursor of the next page
+    """
+    stmt = select(Contact).filter(Contact.user_id == user.id)
+    return await keyset_page(stmt, order, cursor, limit, db)
+
+
+EXPORT_COLUMNS = (Contact.id, Contact.first_name, Contact.last_name, Contact.email, Contact.phone,
+                  Contact.birth_date, Contact.info)
+
+
+async def stream_contacts(user: User, db: AsyncSession, batch_size: int = 1000) -> AsyncIterator[Sequence[Row]]:
+    """
+    The stream_contacts function yields all the contacts of the user in id order, batch_size rows at a time.
+    The rows are plain EXPORT_COLUMNS tuples read through a server-side cursor, so neither the driver
+    nor the session holds more than one batch however many contacts there are.
+    
+    :param user: User: Get the user id from the database
+    :param db: AsyncSession: Pass the database session to the function
+    :param batch_size: int: Number of rows fetched from the cursor at a time
+    :return: Batches of rows
+    """
+    stmt = select(*EXPORT_COLUMNS).filter(Contact.user_id == user.id).order_by(Contact.id)
+    result = await db.stream(stmt.execution_options(yield_per=batch_size))
+    async for rows in result.partitions():
+        yield rows
+
+
+async def search_contacts(query: str, user: User, db: AsyncSession, limit: int = 50) -> list[Type[Contact]]:
     """
     The search_contacts function takes in a query string and a user object,
-    and returns all contacts that match the query. The search is case-insensitive.
+    and returns the contacts whose name or email contains the query, best matches first.
+    The search is case-insensitive and served by the search index of the database.
     
     :param query: str: Search for contacts that match the query
     :param user: User: Get the user id of the user who is logged in
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
+    :param limit: int: Maximum number of contacts returned
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contacts = db.query(Contact).filter(
-        and_(
-            Contact.user_id == user.id,
-            or_(
-                Contact.first_name.ilike(f"%{query}%"),
-                Contact.last_name.ilike(f"%{query}%"),
-                Contact.email.ilike(f"%{query}%")
-            )
-        )
-    ).all()
-    return contacts
+    stmt = select(Contact).filter(Contact.user_id == user.id)
+    stmt = search_stmt(stmt, query, db.get_bind().dialect.name).limit(limit)
+    contacts = await db.execute(stmt)
+    return contacts.scalars().all()
 
 
-async def get_upcoming_birthdays_contacts(user: User, db: Session) -> List[Contact]:
+async def get_upcoming_birthdays_contacts(user: User, db: AsyncSession, days: int = 7) -> List[Contact]:
     """
     The get_upcoming_birthdays_contacts function takes in a user and a database session,
-    and returns all contacts that have birthdays within the next 7 days.
-    
+    and returns all contacts that have birthdays within the next days, soonest first.
+    The ids come from the user's birthday calendar in Redis, or from the indexed birthday_key
+    column when Redis is not available. A window that runs past December 31 wraps around
+    to the start of the year.
     
     :param user: User: Get the user id from the database
-    :param db: Session: Connect to the database
-    :return: A list of contacts whose birthdays are within the next 7 days
+    :param db: AsyncSession: Connect to the database
+    :param days: int: Size of the window in days, up to 365
+    :return: A list of contacts whose birthdays are within the next days
     :doc-author: Trelent
     """
     today = date.today()
-    end_date = today + timedelta(days=7)
-    contacts: List[Contact] = db.query(Contact).filter(Contact.user_id == user.id).all()
-    contacts_per_week = []
-    for contact in contacts:
-        if contact.birth_date:
-            birth = contact.birth_date.replace(year=today.year)
-            if birth < today - timedelta(days=1):
-                birth = birth.replace(year=today.year+1)
-            if today <= birth <= end_date:
-                contacts_per_week.append(contact)
-    return contacts_per_week
-
-
+    last_day = today + timedelta(days=days)
+    start, end = birthday_key(today), birthday_key(last_day)
+    ranges = [(start, end)] if last_day.year == today.year else [(start, 1231), (101, end)]
 
+    stmt = select(Contact).filter(Contact.user_id == user.id)
+    ids = await birthday_calendar.upcoming_ids(user.id, ranges, db)
+    if ids is not None:
+        if not ids:
+            return []
+        stmt = stmt.filter(Contact.id.in_(ids))
+    else:
+        stmt = stmt.filter(or_(*(Contact.birthday_key.between(low, high) for low, high in ranges)))
+    stmt = stmt.order_by(Contact.birthday_key < start, Contact.birthday_key, Contact.id)
+    contacts = await db.execute(stmt)
+    return contacts.scalars().all()
@@ -1,22 +1,40 @@
-from typing import List, Type
+from typing import List, Tuple, Type
 
 from datetime import date, timedelta
-from sqlalchemy import and_, or_
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 from src.database.models import Contact, User
+from src.repository.pagination import ContactOrder, keyset_page
 from src.schemas.contacts import ContactBase, ContactResponse
 
 
-async def get_all_contacts(skip: int, limit: int, db: Session) -> List[Contact]:
+async def get_all_contacts(skip: int, limit: int, db: AsyncSession) -> List[Contact]:
     """
     The get_all_contacts function returns a list of all contacts in the database.
+    The owners are loaded with one more SELECT for the whole list, not joined to every row.
     
     :param skip: int: Skip a number of records in the database
     :param limit: int: Limit the number of contacts returned
-    :param db: Session: Pass in the database session to be used
+    :param db: AsyncSession: Pass in the database session to be used
     :return: A list of contact objects
     :doc-author: Trelent
     """
-    return db.query(Contact).offset(skip).limit(limit).all()
+    stmt = select(Contact).options(selectinload(Contact.user)).offset(skip).limit(limit)
+    contacts = await db.execute(stmt)
+    return contacts.scalars().all()
 
+
+async def get_all_contacts_page(limit: int, db: AsyncSession, cursor: str | None = None,
+                                order: ContactOrder = ContactOrder.id) -> Tuple[List[Contact], str | None]:
+    """
+    The get_all_contacts_page function returns one page of all contacts using keyset pagination.
+    
+    :param limit: int: Limit the number of contacts returned
+    :param db: AsyncSession: Pass in the database session to be used
+    :param cursor: str | None: The next_cursor of the previous page
+    :param order: ContactOrder: Sort by id, or by last name then id
+    :return: A list of contacts and the cursor of the next page
+    """
+    return await keyset_page(select(Contact).options(selectinload(Contact.user)), order, cursor, limit, db)
@@ -1,11 +1,16 @@
 from datetime import datetime
-from sqlalchemy import and_, select
-from sqlalchemy.orm import Session
+from typing import Dict, List, Tuple
 
+from sqlalchemy import and_, delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf import messages
 from src.database.models import Contact, User
-from src.schemas.contacts import ContactBase, ContactResponse
+from src.schemas.contacts import ContactBase, ContactOperation, ContactResponse
+from src.services.birthdays import birthday_calendar
 
-async def get_contact(contact_id: int, user: User, db: Session) -> Contact:
+async def get_contact(contact_id: int, user: User, db: AsyncSession) -> Contact:
     """
     The get_contact function is used to retrieve a contact from the database.
     It takes in an integer representing the id of the contact, a user object, and a database session.
@@ -13,33 +18,37 @@ async def get_contact(contact_id: int, user: User, db: Session) -> Contact:
     
     :param contact_id: int: Get the contact from the database
     :param user: User: Get the user from the database
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A contact object
     :doc-author: Trelent
     """
-    return db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).one_or_none()
+    stmt = select(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id))
+    contact = await db.execute(stmt)
+    return contact.scalar_one_or_none()
 
 
-async def get_contact_by_email(contact_email: str, user: User, db: Session) -> Contact:
+async def get_contact_by_email(contact_email: str, user: User, db: AsyncSession) -> Contact:
     """
     The get_contact_by_email function takes in a contact_email and user, and returns the first Contact object
         that matches the given email address.
     
     :param contact_email: str: Specify the email of the contact that we want to retrieve
     :param user: User: Get the user_id from the user object
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A contact object that matches the email address and user id
     :doc-author: Trelent
     """
-    return db.query(Contact).filter(and_(Contact.email == contact_email, Contact.user_id == user.id)).first()
+    stmt = select(Contact).filter(and_(Contact.email == contact_email, Contact.user_id == user.id))
+    contact = await db.execute(stmt)
+    return contact.scalars().first()
 
-async def create_contact(body: ContactBase, user: User, db: Session) -> Contact:
+async def create_contact(body: ContactBase, user: User, db: AsyncSession) -> Contact:
     """
     The create_contact function creates a new contact in the database.
     
     :param body: ContactBase: Get the data from the request body
     :param user: User: Get the user id from the database
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: The newly created contact
     :doc-author: Trelent
     """
@@ -55,12 +64,109 @@ async def create_contact(body: ContactBase, user: User, db: Session) -> Contact:
         user_id = user.id
     )
     db.add(contact)
-    db.commit()
-    db.refresh(contact)
+    await db.commit()
+    await db.refresh(contact)
+    await birthday_calendar.add(contact)
     return contact
 
 
-async def update_contact(contact_id: int, body: ContactBase, user: User, db: Session) -> Contact | None:
+async def create_contacts(bodies: List[dict], user: User, db: AsyncSession) -> Tuple[List[Contact], Dict[int, str]]:
+    """
+    The create_contacts function inserts many contacts with one multi-row INSERT ... RETURNING.
+    Rows whose email or phone is already taken, in the database or earlier in the list, are skipped.
+    
+    :param bodies: List[dict]: Validated ContactBase fields of each contact
+    :param user: User: The owner of the new contacts
+    :param db: AsyncSession: Access the database
+    :return: The created contacts, and an error message by index of every skipped row
+    """
+    failures = await _taken(bodies, db)
+    rows = [{**body, 'user_id': user.id} for index, body in enumerate(bodies) if index not in failures]
+    if not rows:
+        return [], failures
+    try:
+        contacts = (await db.scalars(insert(Contact).returning(Contact), rows)).all()
+        await db.commit()
+    except IntegrityError:
+        # Someone else took one of the values meanwhile, fall back to one transaction per row
+        await db.rollback()
+        return await _create_contacts_one_by_one(bodies, failures, user, db)
+    await birthday_calendar.add(*contacts)
+    return contacts, failures
+
+
+async def _taken(bodies: List[dict], db: AsyncSession) -> Dict[int, str]:
+    # One lookup for the emails and phones already stored, then the list itself is checked for repeats
+    emails = {body['email'] for body in bodies}
+    phones = {body['phone'] for body in bodies}
+    result = await db.execute(
+        select(Contact.email, Contact.phone).filter(or_(Contact.email.in_(emails), Contact.phone.in_(phones)))
+    )
+    taken = {value for row in result.all() for value in row}
+    failures = {}
+    for index, body in enumerate(bodies):
+        if body['email'] in taken or body['phone'] in taken:
+            failures[index] = messages.CONTACT_EXISTS
+            continue
+        taken.update((body['email'], body['phone']))
+    return failures
+
+
+async def _create_contacts_one_by_one(bodies: List[dict], failures: Dict[int, str], user: User,
+                                      db: AsyncSession) -> Tuple[List[Contact], Dict[int, str]]:
+    contacts = []
+    for index, body in enumerate(bodies):
+        if index in failures:
+            continue
+        try:
+            contact = await db.scalar(insert(Contact).returning(Contact), [{**body, 'user_id': user.id}])
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            failures[index] = messages.CONTACT_EXISTS
+            continue
+        contacts.append(contact)
+    await birthday_calendar.add(*contacts)
+    return contacts, failures
+
+
+async def patch_contact(contact_id: int, values: dict, user: User, db: AsyncSession) -> Contact | None:
+    """
+    The patch_contact function sets the given fields of a contact in a single
+    UPDATE ... RETURNING statement, instead of loading the contact first.
+    
+    :param contact_id: int: Identify the contact to update
+    :param values: dict: New values by column name, columns that are left out keep their value
+    :param user: User: Ensure that the user only updates their own contacts
+    :param db: AsyncSession: Access the database
+    :return: The updated contact, or None if the user has no such contact
+    :raises IntegrityError: If another contact already has the new email or phone
+    """
+    if not values:
+        return await get_contact(contact_id, user, db)
+    try:
+        result = await db.execute(_update_stmt(contact_id, values, user))
+        contact = result.scalar_one_or_none()
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise
+    if contact and 'birth_date' in values:
+        await birthday_calendar.add(contact)
+    return contact
+
+
+def _update_stmt(contact_id: int, values: dict, user: User):
+    return (
+        update(Contact)
+        .where(Contact.id == contact_id, Contact.user_id == user.id)
+        .values(**values)
+        .returning(Contact)
+        .execution_options(populate_existing=True)
+    )
+
+
+async def update_contact(contact_id: int, body: ContactBase, user: User, db: AsyncSession) -> Contact | None:
     """
     The update_contact function updates a contact in the database.
         Args:
@@ -70,23 +176,14 @@ async def update_contact(contact_id: int, body: ContactBase, user: User, db: Ses
     :param contact_id: int: Identify the contact that we want to delete
     :param body: ContactBase: Get the data from the request body
     :param user: User: Ensure that the user is authenticated and only updates their own contacts
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: The updated contact
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).one_or_none()
-    if contact:
-        contact.first_name = body.first_name,
-        contact.last_name = body.last_name,
-        contact.email = body.email,
-        contact.phone = body.phone,
-        contact.birth_date = body.birth_date,
-        contact.info = body.info 
-        db.commit()
-    return contact
+    return await patch_contact(contact_id, body.model_dump(), user, db)
 
 
-async def update_name(contact_id: int, first_name: str, user: User, db: Session) -> Contact | None:
+async def update_name(contact_id: int, first_name: str, user: User, db: AsyncSession) -> Contact | None:
     """
     The update_name function updates the first name of a contact.
         Args:
@@ -96,17 +193,13 @@ async def update_name(contact_id: int, first_name: str, user: User, db: Session)
     :param contact_id: int: Specify the contact to update
     :param first_name: str: Update the first name of a contact
     :param user: User: Get the user_id from the user object,
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: The updated contact
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
-    if contact:
-        contact.first_name = first_name,
-        db.commit()
-    return contact
+    return await patch_contact(contact_id, {'first_name': first_name}, user, db)
 
-async def update_last_name(contact_id: int, last_name: str, user: User, db: Session) -> Contact | None:
+async def update_last_name(contact_id: int, last_name: str, user: User, db: AsyncSession) -> Contact | None:
     """
     The update_last_name function updates the last name of a contact in the database.
         Args:
@@ -117,17 +210,13 @@ async def update_last_name(contact_id: int, last_name: str, user: User, db: Sess
     :param contact_id: int: Identify the contact to be updated
     :param last_name: str: Pass the new last name to be updated
     :param user: User: Ensure that the user is logged in and has access to the contact
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: The updated contact, or none if the contact does not exist
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
-    if contact:
-        contact.last_name = last_name,
-        db.commit()
-    return contact
+    return await patch_contact(contact_id, {'last_name': last_name}, user, db)
 
-async def update_email(contact_id: int, email: str, user: User, db: Session) -> Contact | None:
+async def update_email(contact_id: int, email: str, user: User, db: AsyncSession) -> Contact | None:
     """
     The update_email function updates the email of a contact.
         Args:
@@ -137,17 +226,13 @@ async def update_email(contact_id: int, email: str, user: User, db: Session) ->
     :param contact_id: int: Identify the contact to be updated
     :param email: str: Pass in the new email address
     :param user: User: Ensure that the user is authorized to update the contact
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: The contact object
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
-    if contact:
-        contact.email = email,
-        db.commit()
-    return contact
+    return await patch_contact(contact_id, {'email': email}, user, db)
 
-async def update_phone(contact_id: int, phone: str, user: User, db: Session) -> Contact | None:
+async def update_phone(contact_id: int, phone: str, user: User, db: AsyncSession) -> Contact | None:
     """
     The update_phone function updates the phone number of a contact.
         Args:
@@ -157,17 +242,13 @@ async def update_phone(contact_id: int, phone: str, user: User, db: Session) ->
     :param contact_id: int: Identify the contact to be updated
     :param phone: str: Pass the new phone number to the function
     :param user: User: Get the user id from the token
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: The updated contact object
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
-    if contact:
-        contact.phone = phone,
-        db.commit()
-    return contact
+    return await patch_contact(contact_id, {'phone': phone}, user, db)
 
-async def update_info(contact_id: int, info: str, user: User, db: Session) -> Contact | None:
+async def update_info(contact_id: int, info: str, user: User, db: AsyncSession) -> Contact | None:
     """
     The update_info function updates the info field of a contact.
         Args:
@@ -177,32 +258,171 @@ async def update_info(contact_id: int, info: str, user: User, db: Session) -> Co
     :param contact_id: int: Identify the contact to update
     :param info: str: Update the info field in the contact table
     :param user: User: Get the user id from the database
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A contact object or none
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
-    if contact:
-        contact.info = info,
-        db.commit()
-    return contact
+    return await patch_contact(contact_id, {'info': info}, user, db)
+
+def _delete_stmt(contact_ids: List[int], user: User):
+    return (
+        delete(Contact)
+        .where(Contact.id.in_(contact_ids), Contact.user_id == user.id)
+        .returning(Contact)
+        .execution_options(populate_existing=True)
+    )
+
 
-async def remove_contact(contact_id: int, user: User, db: Session) -> Contact | None:
+async def remove_contact(contact_id: int, user: User, db: AsyncSession) -> Contact | None:
     """
     The remove_contact function removes a contact from the database.
         Args:
             contact_id (int): The id of the contact to be removed.
             user (User): The user who is removing the contact. This is used for security purposes, so that users can only remove their own contacts and not other users' contacts. 
-            db (Session): A session object which allows us to interact with our database in order to delete a row from it containing information about this particular Contact object we are deleting.
+            db (AsyncSession): A session object which allows us to interact with our database in order to delete a row from it containing information about this particular Contact object we are deleting.
     
     :param contact_id: int: Specify which contact to delete
     :param user: User: Get the user id from the database
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A contact object
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
+    result = await db.execute(_delete_stmt([contact_id], user))
+    contact = result.scalar_one_or_none()
+    await db.commit()
     if contact:
-        db.delete(contact)
-        db.commit()
-    return contact
\ No newline at end of file
+        await birthday_calendar.remove(contact)
+    return contact
+
+
+async def remove_contacts(contact_ids: List[int], user: User, db: AsyncSession) -> List[Contact]:
+    """
+    The remove_contacts function removes several contacts of the user in one DELETE ... RETURNING statement.
+    Ids that don't exist or belong to another user are skipped.
+    
+    :param contact_ids: List[int]: The ids of the contacts to delete
+    :param user: User: Ensure that the user only removes their own contacts
+    :param db: AsyncSession: Access the database
+    :return: The removed contacts
+    """
+    result = await db.execute(_delete_stmt(contact_ids, user))
+    contacts = result.scalars().all()
+    await db.commit()
+    await birthday_calendar.remove(*contacts)
+    return contacts
+
+
+# Status, contact and error message of one batch operation
+OperationResult = Tuple[int, Contact | None, str | None]
+
+# A batch applies its deletes first, then its updates, then its creates
+BATCH_ORDER = {'delete': 0, 'update': 1, 'create': 2}
+
+
+async def apply_batch(operations: List[ContactOperation], user: User, db: AsyncSession) -> List[OperationResult]:
+    """
+    The apply_batch function runs many create, update and delete operations in one transaction:
+    one DELETE ... RETURNING for all the deletes, one executemany UPDATE for all the updates and
+    one multi-row INSERT ... RETURNING for all the creates, in that order.
+    An operation that fails leaves the others applied. If a unique constraint is still violated,
+    the operations are replayed one by one, each in its own savepoint.
+    
+    :param operations: List[ContactOperation]: The operations in the order of the request
+    :param user: User: Ensure that the user only changes their own contacts
+    :param db: AsyncSession: Access the database
+    :return: The status, the contact and the error message of every operation, in the order of the request
+    """
+    order = sorted(range(len(operations)), key=lambda index: BATCH_ORDER[operations[index].op])
+    try:
+        async with db.begin_nested():
+            results = await _apply_batch_bulk(operations, user, db)
+    except IntegrityError:
+        results = {}
+        for index in order:
+            try:
+                async with db.begin_nested():
+                    results[index] = await _apply_operation(operations[index], user, db)
+            except IntegrityError:
+                results[index] = (409, None, messages.CONTACT_EXISTS)
+    await db.commit()
+
+    removed, changed = [], []
+    for index, (_, contact, _) in results.items():
+        operation = operations[index]
+        if contact is None:
+            continue
+        if operation.op == 'delete':
+            removed.append(contact)
+        elif operation.op == 'create' or 'birth_date' in operation.contact.model_fields_set:
+            changed.append(contact)
+    await birthday_calendar.remove(*removed)
+    await birthday_calendar.add(*changed)
+    return [results[index] for index in range(len(operations))]
+
+
+async def _apply_batch_bulk(operations: List[ContactOperation], user: User,
+                            db: AsyncSession) -> Dict[int, OperationResult]:
+    results = {}
+    deletes = {index: operation.id for index, operation in enumerate(operations) if operation.op == 'delete'}
+    if deletes:
+        result = await db.execute(_delete_stmt(list(set(deletes.values())), user))
+        removed = {contact.id: contact for contact in result.scalars().all()}
+        for index, contact_id in deletes.items():
+            contact = removed.pop(contact_id, None)
+            results[index] = (200, contact, None) if contact else (404, None, messages.NOT_CONTACT)
+
+    updates = {index: operation for index, operation in enumerate(operations) if operation.op == 'update'}
+    if updates:
+        result = await db.execute(select(Contact.id).where(
+            Contact.id.in_({operation.id for operation in updates.values()}), Contact.user_id == user.id
+        ))
+        values = {contact_id: {} for contact_id in result.scalars().all()}
+        for operation in updates.values():
+            if operation.id in values:
+                values[operation.id].update(operation.contact.model_dump(exclude_unset=True))
+        rows = [{'id': contact_id, **fields} for contact_id, fields in values.items() if fields]
+        if rows:
+            # Bulk UPDATE by primary key, the ids were checked against the user above
+            await db.execute(update(Contact), rows)
+        result = await db.execute(
+            select(Contact).where(Contact.id.in_(values)).execution_options(populate_existing=True)
+        )
+        contacts = {contact.id: contact for contact in result.scalars().all()}
+        for index, operation in updates.items():
+            contact = contacts.get(operation.id)
+            results[index] = (200, contact, None) if contact else (404, None, messages.NOT_CONTACT)
+
+    creates = {index: operation.contact.model_dump() for index, operation in enumerate(operations)
+               if operation.op == 'create'}
+    if creates:
+        indexes, bodies = list(creates), list(creates.values())
+        failures = await _taken(bodies, db)
+        rows = [{**body, 'user_id': user.id} for position, body in enumerate(bodies) if position not in failures]
+        created = {}
+        if rows:
+            # RETURNING order is not guaranteed, the emails are unique
+            contacts = (await db.scalars(insert(Contact).returning(Contact), rows)).all()
+            created = {contact.email: contact for contact in contacts}
+        for position, index in enumerate(indexes):
+            if position in failures:
+                results[index] = (409, None, failures[position])
+            else:
+                results[index] = (201, created[bodies[position]['email']], None)
+    return results
+
+
+async def _apply_operation(operation: ContactOperation, user: User, db: AsyncSession) -> OperationResult:
+    if operation.op == 'create':
+        contact = await db.scalar(
+            insert(Contact).returning(Contact), [{**operation.contact.model_dump(), 'user_id': user.id}]
+        )
+        return 201, contact, None
+    if operation.op == 'update':
+        values = operation.contact.model_dump(exclude_unset=True)
+        if values:
+            contact = (await db.execute(_update_stmt(operation.id, values, user))).scalar_one_or_none()
+        else:
+            contact = await get_contact(operation.id, user, db)
+    else:
+        contact = (await db.execute(_delete_stmt([operation.id], user))).scalar_one_or_none()
+    return (200, contact, None) if contact else (404, None, messages.NOT_CONTACT)
@@ -0,0 +1,84 @@
+import base64
+import json
+from enum import Enum
+from typing import List, Tuple
+
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import Contact
+
+
+class ContactOrder(str, Enum):
+    id: str = 'id'
+    last_name: str = 'last_name'
+
+
+ORDER_COLUMNS = {
+    ContactOrder.id: (Contact.id,),
+    ContactOrder.last_name: (Contact.last_name, Contact.id),
+}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(order: ContactOrder, contact: Contact) -> str:
+    """
+    The encode_cursor function builds an opaque cursor pointing right after the given contact.
+
+    :param order: ContactOrder: The order of the page the contact belongs to
+    :param contact: Contact: The last contact of the page
+    :return: A url-safe string
+    """
+    key = [getattr(contact, column.key) for column in ORDER_COLUMNS[order]]
+    raw = json.dumps([order.value, key], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(order: ContactOrder, cursor: str) -> list:
+    """
+    The decode_cursor function returns the sort key stored in a cursor.
+    A cursor made for another order, or one that was tampered with, raises InvalidCursor.
+
+    :param order: ContactOrder: The order of the requested page
+    :param cursor: str: A cursor returned by encode_cursor
+    :return: The sort key values of the last contact of the previous page
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_order, key = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if cursor_order != order.value or not isinstance(key, list) or len(key) != len(ORDER_COLUMNS[order]):
+        raise InvalidCursor(cursor)
+    return key
+
+
+async def keyset_page(stmt: Select, order: ContactOrder, cursor: str | None, limit: int,
+                      db: AsyncSession) -> Tuple[List[Contact], str | None]:
+    """
+    The keyset_page function returns one page of the statement in the given order.
+    Instead of OFFSET it continues after the sort key stored in the cursor, so every page
+    costs the same index range scan no matter how deep it is.
+
+    :param stmt: Select: A select of contacts, already filtered
+    :param order: ContactOrder: Sort the page by id, or by last name then id
+    :param cursor: str | None: The next_cursor of the previous page, None for the first page
+    :param limit: int: Number of contacts in the page
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The contacts and the cursor of the next page, None on the last page
+    """
+    columns = ORDER_COLUMNS[order]
+    if cursor is not None:
+        key = decode_cursor(order, cursor)
+        stmt = stmt.filter(tuple_(*columns) > tuple_(*key))
+    stmt = stmt.order_by(*columns).limit(limit + 1)
+    result = await db.execute(stmt)
+    contacts = list(result.scalars().all())
+    next_cursor = None
+    if len(contacts) > limit:
+        contacts = contacts[:limit]
+        next_cursor = encode_cursor(order, contacts[-1])
+    return contacts, next_cursor
@@ -0,0 +1,43 @@
+from sqlalchemy import Select, column, func, table, text
+
+from src.database.models import Contact
+
+
+# Shorter queries have no trigram to look up, so both backends fall back to a plain scan
+MIN_INDEXED_QUERY = 3
+
+contacts_fts = table('contacts_fts', column('rowid'), column('rank'))
+
+
+def like_pattern(query: str) -> str:
+    """
+    The like_pattern function turns a query into a LIKE pattern matching it anywhere,
+    with the LIKE wildcards in the query escaped.
+
+    :param query: str: The text typed by the user
+    :return: A pattern to be used with escape='\\'
+    """
+    escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def search_stmt(stmt: Select, query: str, dialect: str) -> Select:
+    """
+    The search_stmt function narrows a select of contacts to the ones whose name or email contains
+    the query, best matches first. PostgreSQL answers it from the pg_trgm GIN index on search_text,
+    SQLite from the trigram FTS5 table.
+
+    :param stmt: Select: A select of contacts, already filtered
+    :param query: str: The text typed by the user
+    :param dialect: str: Name of the database dialect of the session
+    :return: The filtered and ordered select
+    """
+    if dialect == 'sqlite' and len(query) >= MIN_INDEXED_QUERY:
+        phrase = '"' + query.replace('"', '""') + '"'
+        return (stmt.join(contacts_fts, contacts_fts.c.rowid == Contact.id)
+                .filter(text('contacts_fts MATCH :phrase').bindparams(phrase=phrase))
+                .order_by(contacts_fts.c.rank, Contact.id))
+    stmt = stmt.filter(Contact.search_text.ilike(like_pattern(query), escape='\\'))
+    if dialect == 'postgresql':
+        return stmt.order_by(func.word_similarity(query, Contact.search_text).desc(), Contact.id)
+    return stmt.order_by(Contact.id)
@@ -1,30 +1,34 @@
 from libgravatar import Gravatar
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User
+from src.services.cache import user_cache
 from src.schemas.user import UserBase, UserResponse
 
-async def get_user_by_email(email: str, db: Session) -> User:
+async def get_user_by_email(email: str, db: AsyncSession) -> User:
     """
     The get_user_by_email function takes in an email and a database session,
     and returns the user associated with that email. If no such user exists,
     it returns None.
     
     :param email: str: Specify the type of input that is expected
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A user object, or none if the user does not exist
     :doc-author: Trelent
     """
-    user = db.query(User).filter(User.email == email).first()
+    stmt = select(User).filter(User.email == email)
+    user = await db.execute(stmt)
+    user = user.scalar_one_or_none()
     return user
 
-async def create_user(body: UserBase, db: Session) -> User:
+async def create_user(body: UserBase, db: AsyncSession) -> User:
     """
     The create_user function creates a new user in the database.
     
     :param body: UserBase: Pass in the user data from the request body
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A user object
     :doc-author: Trelent
     """
@@ -36,53 +40,72 @@ async def create_user(body: UserBase, db: Session) -> User:
         print(err)
     user = User(**body.model_dump(), avatar=avatar)
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
  
-async def update_token(user: User, token: str | None, db: Session) -> None:
+async def update_token(user: User, token: str | None, db: AsyncSession) -> None:
     """
     The update_token function updates the refresh token for a user.
     
     :param user: User: Get the user's id
     :param token: str | None: Store the token in the database
-    :param db: Session: Update the database with the new refresh token
+    :param db: AsyncSession: Update the database with the new refresh token
     :return: Nothing
     :doc-author: Trelent
     """
     user.refresh_token = token
-    db.commit()
+    await db.commit()
+    await user_cache.invalidate(user.email)
+
+
+async def revoke_tokens(user: User, db: AsyncSession) -> None:
+    """
+    The revoke_tokens function drops the user's refresh token and bumps the token version,
+    so access tokens issued before this call are no longer accepted by get_current_user.
+
+    :param user: User: The user whose tokens are revoked
+    :param db: AsyncSession: Update the database
+    :return: Nothing
+    """
+    user.refresh_token = None
+    user.token_version += 1
+    await db.commit()
+    await user_cache.invalidate(user.email)
 
     
-async def confirmed_email(email: str, db: Session) -> None:
+async def confirmed_email(email: str, db: AsyncSession) -> None:
     """
     The confirmed_email function takes an email and a database session as arguments.
     It then gets the user by their email, sets their confirmed status to True, and commits the change.
     
     :param email: str: Get the email address of the user
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: None, but does not return a value
     :doc-author: Trelent
     """
     user = await get_user_by_email(email, db)
     user.confirmed = True
-    db.commit()
+    await db.commit()
+    await user_cache.invalidate(email)
 
 
-async def update_avatar_url(email: str, url: str | None, db: Session) -> User:
+async def update_avatar_url(email: str, url: str | None, db: AsyncSession, avatar_hash: str | None = None) -> User:
     """
     The update_avatar_url function updates the avatar URL for a user.
     
     :param email: str: Get the user by email
     :param url: str | None: Specify that the url parameter can either be a string or none
-    :param db: Session: Pass the database session into the function
+    :param db: AsyncSession: Pass the database session into the function
+    :param avatar_hash: str | None: The content hash of the uploaded image, to recognise it when it is sent again
     :return: A user object
     :doc-author: Trelent
     """
     user = await get_user_by_email(email, db)
     user.avatar = url
-    db.commit()
-    db.refresh(user)
+    user.avatar_hash = avatar_hash
+    await db.commit()
+    await user_cache.invalidate(email)
+    await db.refresh(user)
     return user
-
@@ -4,7 +4,7 @@ from fastapi.security import (
     HTTPAuthorizationCredentials,
     HTTPBearer,
 )
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.database.models import User
@@ -25,7 +25,7 @@ get_refresh_token = HTTPBearer()
     "/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED
 )
 async def signup(
-    body: UserBase, bt: BackgroundTasks, request: Request, db: Session = Depends(get_db)
+    body: UserBase, bt: BackgroundTasks, request: Request, db: AsyncSession = Depends(get_db)
 ) -> User:
     """
     The signup function creates a new user in the database.
@@ -36,7 +36,7 @@ async def signup(
     :param body: UserBase: Get the user's email and password from the request body
     :param bt: BackgroundTasks: Add a task to the background tasks queue
     :param request: Request: Get the base_url of the request
-    :param db: Session: Get a database session
+    :param db: AsyncSession: Get a database session
     :return: A userbase object, which is a subset of the full user model
     :doc-author: Trelent
     """
@@ -45,7 +45,7 @@ async def signup(
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT, detail=messages.ACCOUNT_EXIST
         )
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash(body.password)
     new_user = await repository_users.create_user(body, db)
     bt.add_task(send_email, new_user.email, new_user.username, str(request.base_url))
     return new_user
@@ -53,14 +53,14 @@ async def signup(
 
 @router.post("/login", response_model=TokenBase)
 async def login(
-    body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+    body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)
 ):
     """
     The login function is used to authenticate a user.
         It takes an email and password as input, and returns an access token if the credentials are valid.
 
     :param body: OAuth2PasswordRequestForm: Get the username and password from the body of a post request
-    :param db: Session: Get a database session
+    :param db: AsyncSession: Get a database session
     :return: A dict with the access_token, refresh_token and token type
     :doc-author: Trelent
     """
@@ -73,11 +73,11 @@ async def login(
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.EMAIL_NOT_CONFIRMED
         )
-    if not auth_service.verify_password(body.password, user.password):
+    if not await auth_service.verify_password(body.password, user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.WRONG_PASSWORD
         )
-    access_token = await auth_service.create_access_token(data={"sub": user.email})
+    access_token = await auth_service.create_access_token(data=auth_service.token_claims(user))
     refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
     await repository_users.update_token(user, refresh_token, db)
     return {
@@ -90,7 +90,7 @@ async def login(
 @router.get("/refresh_token", response_model=TokenBase)
 async def refresh_token(
     credentials: HTTPAuthorizationCredentials = Depends(get_refresh_token),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     The refresh_token function is used to refresh the access token.
@@ -98,20 +98,20 @@ async def refresh_token(
         a new refresh token, and the type of authorization.
 
     :param credentials: HTTPAuthorizationCredentials: Get the token from the request header
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: An access_token and a refresh_token
     :doc-author: Trelent
     """
     token = credentials.credentials
     email = await auth_service.decode_refresh_token(token)
-    user: User = repository_users.get_user_by_email(email, db)
+    user: User = await repository_users.get_user_by_email(email, db)
     if user.refresh_token != token:
-        await repository_users.update_token(user, None, db)
+        await repository_users.revoke_tokens(user, db)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token"
         )
 
-    access_token = await auth_service.create_access_token(data={"sub": email})
+    access_token = await auth_service.create_access_token(data=auth_service.token_claims(user))
     refresh_token = await auth_service.create_refresh_token(data={"sub": email})
     await repository_users.update_token(user, refresh_token, db)
     return {
@@ -122,14 +122,14 @@ async def refresh_token(
 
 
 @router.get("/confirmed_email/{token}")
-async def confirmed_email(token: str, db: Session = Depends(get_db)):
+async def confirmed_email(token: str, db: AsyncSession = Depends(get_db)):
     """
     The confirmed_email function takes a token and db as parameters.
         The token is the confirmation email's unique identifier, which is used to confirm the user's email address.
         The db parameter is a database session that will be used to query for users in our database.
 
     :param token: str: Get the token from the url
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: A dictionary with a message
     :doc-author: Trelent
     """
@@ -150,7 +150,7 @@ async def request_email(
     body: RequestEmail,
     bt: BackgroundTasks,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     The request_email function is used to send an email to the user with a link
@@ -161,7 +161,7 @@ async def request_email(
     :param body: RequestEmail: Get the email from the request body
     :param bt: BackgroundTasks: Add a task to the background tasks
     :param request: Request: Get the base url of the server
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :return: A message that will be displayed on the frontend
     :doc-author: Trelent
     """
@@ -1,31 +1,36 @@
 from typing import List
 
-from fastapi import APIRouter, HTTPException, Depends, status, Path
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, status, Path, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.database.models import User, Role, Contact
 
-from src.services.auth import auth_service
+from src.services.auth import Principal, auth_service
 from src.services.roles import RoleAccess
 
-from src.schemas.contacts import ContactResponse
+from src.conf import messages
+from src.schemas.contacts import ContactResponse, ContactPage
 from src.repository import contacts as repository_contacts
+from src.repository.pagination import ContactOrder, InvalidCursor
+from src.services.contact_export import MEDIA_TYPES, export_contacts
+from src.services.contact_import import ImportFormat
 
 
 router = APIRouter(prefix='/contacts', tags=["contacts"])
 
 
 @router.get('/', response_model=List[ContactResponse])
-async def read_contacts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), 
-                        current_user: User = Depends(auth_service.get_current_user)) -> List[Contact]:
+async def read_contacts(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db), 
+                        current_user: Principal = Depends(auth_service.get_principal)) -> List[Contact]:
     """
     The read_contacts function returns a list of contacts.
     
     :param skip: int: Skip the first n contacts
     :param limit: int: Limit the number of contacts returned
-    :param db: Session: Pass the database session to the repository layer
-    :param current_user: User: Get the current user from the database
+    :param db: AsyncSession: Pass the database session to the repository layer
+    :param current_user: Principal: Get the current user from the database
     :return: A list of contacts, which is the same type as the contact class
     :doc-author: Trelent
     """
@@ -33,36 +38,83 @@ async def read_contacts(skip: int = 0, limit: int = 100, db: Session = Depends(g
     return contacts
 
 
+@router.get('/page', response_model=ContactPage)
+async def read_contacts_page(cursor: str | None = None, limit: int = Query(100, ge=1, le=1000),
+                             order: ContactOrder = ContactOrder.id, db: AsyncSession = Depends(get_db),
+                             current_user: Principal = Depends(auth_service.get_principal)) -> dict:
+    """
+    The read_contacts_page function returns a page of contacts and the cursor of the next page.
+        Unlike skip/limit, a deep page is as fast as the first one.
+    
+    :param cursor: str | None: The next_cursor of the previous page, omit it for the first page
+    :param limit: int: Limit the number of contacts returned
+    :param order: ContactOrder: Sort by id, or by last name then id
+    :param db: AsyncSession: Pass the database session to the repository layer
+    :param current_user: Principal: Get the current user from the token
+    :return: The contacts of the page and next_cursor, which is null on the last page
+    """
+    try:
+        contacts, next_cursor = await repository_contacts.get_contacts_page(limit, current_user, db, cursor, order)
+    except InvalidCursor:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=messages.INVALID_CURSOR)
+    return {'items': contacts, 'next_cursor': next_cursor}
+
+
+@router.get('/export', response_class=StreamingResponse)
+async def export_contacts_file(export_format: ImportFormat = Query(ImportFormat.jsonl, alias='format'),
+                               db: AsyncSession = Depends(get_db),
+                               current_user: Principal = Depends(auth_service.get_principal)) -> StreamingResponse:
+    """
+    The export_contacts_file function streams the whole address book of the user as JSON lines or as CSV
+        with a header row, the formats /api/contact/import accepts. The contacts are read from the database
+        while the response is sent, so an export of any size runs in constant memory.
+    
+    :param export_format: ImportFormat: jsonl (the default) or csv, given as ?format=
+    :param db: AsyncSession: Its engine is used by the export, which outlives the request session
+    :param current_user: Principal: Get the current user from the token
+    :return: A streamed file download
+    """
+    return StreamingResponse(
+        export_contacts(export_format, current_user, db.bind),
+        media_type=MEDIA_TYPES[export_format],
+        headers={'Content-Disposition': f'attachment; filename="contacts.{export_format.value}"'},
+    )
+
+
 @router.get('/birthday_for_week', response_model=List[ContactResponse])
-async def read_contacts_with_birth(db: Session = Depends(get_db), 
-                                   current_user: User = Depends(auth_service.get_current_user)) -> List[Contact]:
+async def read_contacts_with_birth(days: int = Query(7, ge=1, le=365), db: AsyncSession = Depends(get_db),
+                                   current_user: Principal = Depends(auth_service.get_principal)) -> List[Contact]:
     """
     The read_contacts_with_birth function returns a list of contacts with upcoming birthdays.
         The function takes in the current user and database session as parameters, and uses them to get the list of contacts from the repository_contacts module.
+        The window is the next 7 days unless days is given.
     
-    
-    :param db: Session: Pass the database session to the function
-    :param current_user: User: Get the current user, and the db: session parameter is used to get a database session
+    :param days: int: Size of the window in days
+    :param db: AsyncSession: Pass the database session to the function
+    :param current_user: Principal: Get the current user, and the db: session parameter is used to get a database session
     :return: A list of contacts with upcoming birthdays
     :doc-author: Trelent
     """
-    contacts = await repository_contacts.get_upcoming_birthdays_contacts(current_user, db)
+    contacts = await repository_contacts.get_upcoming_birthdays_contacts(current_user, db, days)
     return contacts
 
 
 @router.get('/search/{query}', response_model=list[ContactResponse])
-async def search_contacts(query: str, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)) -> List[Contact]:
+async def search_contacts(query: str, limit: int = Query(50, ge=1, le=500), db: AsyncSession = Depends(get_db),
+                          current_user: Principal = Depends(auth_service.get_principal)) -> List[Contact]:
     """
     The search_contacts function searches for contacts in the database.
-        It takes a query string as an argument and returns a list of contacts that match the query.
+        It takes a query string as an argument and returns a list of contacts that match the query,
+        best matches first.
     
     :param query: str: Search for contacts in the database
-    :param db: Session: Pass the database session to the repository layer
-    :param current_user: User: Get the current user from the database
+    :param limit: int: Maximum number of contacts returned
+    :param db: AsyncSession: Pass the database session to the repository layer
+    :param current_user: Principal: Get the current user from the database
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contacts = await repository_contacts.search_contacts(query, current_user, db)
+    contacts = await repository_contacts.search_contacts(query, current_user, db, limit)
     return contacts
 
 
@@ -1,7 +1,7 @@
 from typing import List
 
-from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.database.models import User, Role, Contact
@@ -9,8 +9,10 @@ from src.database.models import User, Role, Contact
 from src.services.auth import auth_service
 from src.services.roles import RoleAccess
 
-from src.schemas.contacts import ContactBase, ContactResponse, ContactResponseAdmin
+from src.conf import messages
+from src.schemas.contacts import ContactBase, ContactResponse, ContactResponseAdmin, ContactPageAdmin
 from src.repository import full_access
+from src.repository.pagination import ContactOrder, InvalidCursor
 
 
 router = APIRouter(prefix='/all', tags=['all'])
@@ -19,7 +21,7 @@ access_to_route_all = RoleAccess([Role.admin, Role.moderator])
 
 
 @router.get('/', response_model=List[ContactResponseAdmin], dependencies=[Depends(access_to_route_all)])
-async def get_all_contacts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)) -> List[Contact]:
+async def get_all_contacts(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)) -> List[Contact]:
     """
     The get_all_contacts function returns a list of all contacts in the database.
         The skip and limit parameters are used to paginate the results, with skip being how many records to skip before returning results, and limit being how many records to return after skipping.
@@ -27,9 +29,29 @@ async def get_all_contacts(skip: int = 0, limit: int = 100, db: Session = Depend
     
     :param skip: int: Skip the first n contacts in the database
     :param limit: int: Limit the number of contacts returned
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A list of contacts
     :doc-author: Trelent
     """
     contacts = await full_access.get_all_contacts(skip, limit, db)
-    return contacts
\ No newline at end of file
+    return contacts
+
+
+@router.get('/page', response_model=ContactPageAdmin, dependencies=[Depends(access_to_route_all)])
+async def get_all_contacts_page(cursor: str | None = None, limit: int = Query(100, ge=1, le=1000),
+                                order: ContactOrder = ContactOrder.id, db: AsyncSession = Depends(get_db)) -> dict:
+    """
+    The get_all_contacts_page function returns a page of all contacts in the database and the cursor of the next page.
+        Pages are read by keyset, so paging deep into the table costs the same as reading the first page.
+    
+    :param cursor: str | None: The next_cursor of the previous page, omit it for the first page
+    :param limit: int: Limit the number of contacts returned
+    :param order: ContactOrder: Sort by id, or by last name then id
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The contacts of the page and next_cursor, which is null on the last page
+    """
+    try:
+        contacts, next_cursor = await full_access.get_all_contacts_page(limit, db, cursor, order)
+    except InvalidCursor:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=messages.INVALID_CURSOR)
+    return {'items': contacts, 'next_cursor': next_cursor}
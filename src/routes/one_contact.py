@@ -1,14 +1,20 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
+from typing import List
+
+from fastapi import APIRouter, HTTPException, Depends, Request, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.database.models import User, Contact
 from src.conf import messages
 
-from src.schemas.contacts import ContactBase, ContactResponse
+from src.schemas.contacts import (
+    ContactBase, ContactBatch, ContactBatchReport, ContactIds, ContactImportReport, ContactResponse, ContactUpdate
+)
 from src.repository import one_contact
 
-from src.services.auth import auth_service
+from src.services.auth import Principal, auth_service
+from src.services.contact_import import CONTENT_TYPES, import_contacts
 
 
 router = APIRouter(prefix="/contact", tags=["contact"])
@@ -17,8 +23,8 @@ router = APIRouter(prefix="/contact", tags=["contact"])
 @router.get("/{contact_id}", response_model=ContactResponse)
 async def read_contact(
     contact_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(auth_service.get_principal),
 ) -> Contact:
     """
     The read_contact function returns a contact by its id.
@@ -26,8 +32,8 @@ async def read_contact(
 
 
     :param contact_id: int: Specify the contact id to be read
-    :param db: Session: Get the database session
-    :param current_user: User: Get the user from the request
+    :param db: AsyncSession: Get the database session
+    :param current_user: Principal: Get the user from the request
     :return: A contact object
     :doc-author: Trelent
     """
@@ -42,16 +48,16 @@ async def read_contact(
 @router.get("/search/{email}", response_model=ContactResponse)
 async def read_contact_by_email(
     email: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(auth_service.get_principal),
 ) -> Contact:
     """
     The read_contact_by_email function takes an email address and returns the contact associated with that email.
         If no such contact exists, it raises a 404 error.
 
     :param email: str: Specify the email of the contact that we want to retrieve
-    :param db: Session: Pass the database session to the function
-    :param current_user: User: Get the current user from the database
+    :param db: AsyncSession: Pass the database session to the function
+    :param current_user: Principal: Get the current user from the database
     :return: A contact object
     :doc-author: Trelent
     """
@@ -66,28 +72,79 @@ async def read_contact_by_email(
 @router.post("/", response_model=ContactResponse, status_code=status.HTTP_201_CREATED)
 async def create_contact(
     body: ContactBase,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(auth_service.get_principal),
 ) -> Contact:
     """
     The create_contact function creates a new contact in the database.
         It takes a ContactBase object as input, and returns the newly created contact's ID.
 
     :param body: ContactBase: Get the data from the request body
-    :param db: Session: Get the database session
-    :param current_user: User: Get the user who is making the request
+    :param db: AsyncSession: Get the database session
+    :param current_user: Principal: Get the user who is making the request
     :return: The contact that was created
     :doc-author: Trelent
     """
     return await one_contact.create_contact(body, current_user, db)
 
 
+@router.post("/import", response_model=ContactImportReport)
+async def import_contacts_file(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(auth_service.get_principal),
+) -> dict:
+    """
+    The import_contacts_file function creates contacts from a CSV file with a header row (Content-Type: text/csv)
+        or from JSON lines (Content-Type: application/x-ndjson), one ContactBase object per line.
+        The body is read as it arrives and inserted in batches, and each invalid or duplicate row is
+        reported by its number instead of failing the whole upload.
+
+    :param request: Request: Read the raw body as a stream
+    :param db: AsyncSession: Pass the database session to the function
+    :param current_user: Principal: Get the current user from the token
+    :return: The number of inserted and failed rows, and the errors of the failed ones
+    """
+    content_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    if content_type not in CONTENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=messages.UNSUPPORTED_IMPORT_FORMAT
+        )
+    return await import_contacts(request.stream(), CONTENT_TYPES[content_type], current_user, db)
+
+
+@router.post("/batch", response_model=ContactBatchReport)
+async def apply_batch(
+    body: ContactBatch,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(auth_service.get_principal),
+) -> dict:
+    """
+    The apply_batch function applies up to 1000 create, update and delete operations in one transaction,
+        so a sync client sends one request instead of one per change. Deletes run first, then updates,
+        then creates. Each operation gets its own result: 201 or 200 with the contact, or 404 or 409
+        with the reason, and a failed operation does not undo the others.
+
+    :param body: ContactBatch: The operations to apply
+    :param db: AsyncSession: Pass the database session to the function
+    :param current_user: Principal: Get the current user from the token
+    :return: The result of every operation, in the order of the request
+    """
+    results = await one_contact.apply_batch(body.operations, current_user, db)
+    return {
+        'results': [
+            {'status': result_status, 'contact': contact, 'detail': detail}
+            for result_status, contact, detail in results
+        ]
+    }
+
+
 @router.put("/{contact_id}", response_model=ContactResponse)
 async def update_contact(
     body: ContactBase,
     contact_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(auth_service.get_principal),
 ) -> Contact:
     """
     The update_contact function updates a contact in the database.
@@ -95,12 +152,43 @@ async def update_contact(
 
     :param body: ContactBase: Get the contact information from the request body
     :param contact_id: int: Identify the contact to be deleted
-    :param db: Session: Pass the database session to the function
-    :param current_user: User: Get the user from the database
+    :param db: AsyncSession: Pass the database session to the function
+    :param current_user: Principal: Get the user from the database
     :return: The contact that was updated
     :doc-author: Trelent
     """
-    contact = await one_contact.update_contact(contact_id, body, current_user, db)
+    try:
+        contact = await one_contact.update_contact(contact_id, body, current_user, db)
+    except IntegrityError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=messages.CONTACT_EXISTS)
+    if contact is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=messages.NOT_CONTACT
+        )
+    return contact
+
+
+@router.patch("/{contact_id}", response_model=ContactResponse)
+async def patch_contact(
+    body: ContactUpdate,
+    contact_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(auth_service.get_principal),
+) -> Contact:
+    """
+    The patch_contact function updates only the fields present in the request body,
+        all of them at once in a single statement.
+
+    :param body: ContactUpdate: The fields to change
+    :param contact_id: int: Identify the contact to be updated
+    :param db: AsyncSession: Pass the database session to the function
+    :param current_user: Principal: Get the user from the token
+    :return: The contact that was updated
+    """
+    try:
+        contact = await one_contact.patch_contact(contact_id, body.model_dump(exclude_unset=True), current_user, db)
+    except IntegrityError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=messages.CONTACT_EXISTS)
     if contact is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=messages.NOT_CONTACT
@@ -112,8 +200,8 @@ async def update_contact(
 async def update_name(
     contact_id: int,
     first_name: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(auth_service.get_principal),
 ) -> Contact:
     """
     The update_name function updates the first name of a contact.
@@ -122,8 +210,8 @@ async def update_name(
 
     :param contact_id: int: Specify the id of the contact to be updated
     :param first_name: str: Set the first name of the contact
-    :param db: Session: Get a database session
-    :param current_user: User: Get the user_id of the current user
+    :param db: AsyncSession: Get a database session
+    :param current_user: Principal: Get the user_id of the current user
     :return: A contact object
     :doc-author: Trelent
     """
@@ -141,8 +229,8 @@ async def update_name(
 async def update_last_name(
     contact_id: int,
     last_name: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(auth_service.get_principal),
 ) -> Contact:
     """
     The update_last_name function updates the last name of a contact.
@@ -151,8 +239,8 @@ async def update_last_name(
 
     :param contact_id: int: Specify the contact that is being updated
     :param last_name: str: Pass the last name of the contact to be updated
-    :param db: Session: Get the database session
-    :param current_user: User: Get the current user
+    :param db: AsyncSession: Get the database session
+    :param current_user: Principal: Get the current user
     :return: The contact with the updated last name
     :doc-author: Trelent
     """
@@ -170,8 +258,8 @@ async def update_last_name(
 async def update_email(
     contact_id: int,
     email: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(auth_service.get_principal),
 ) -> Contact:
     """
     The update_email function updates the email of a contact.
@@ -180,12 +268,15 @@ async def update_email(
 
     :param contact_id: int: Identify the contact to update
     :param email: str: Update the email of a contact
-    :param db: Session: Get the database session
-    :param current_user: User: Get the user_id of the current user
+    :param db: AsyncSession: Get the database session
+    :param current_user: Principal: Get the user_id of the current user
     :return: The updated contact object
     :doc-author: Trelent
     """
-    contact = await one_contact.update_email(contact_id, email, current_user, db)
+    try:
+        contact = await one_contact.update_email(contact_id, email, current_user, db)
+    except IntegrityError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=messages.CONTACT_EXISTS)
     if contact is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=messages.NOT_CONTACT
@@ -197,8 +288,8 @@ async def update_email(
 async def update_phone(
     contact_id: int,
     phone: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(auth_service.get_principal),
 ) -> Contact:
     """
     The update_phone function updates the phone number of a contact.
@@ -208,12 +299,15 @@ async def update_phone(
 
     :param contact_id: int: Find the contact in the database
     :param phone: str: Get the phone number from the request body
-    :param db: Session: Pass the database session to the function
-    :param current_user: User: Get the current user from the auth_service module
+    :param db: AsyncSession: Pass the database session to the function
+    :param current_user: Principal: Get the current user from the auth_service module
     :return: The contact object
     :doc-author: Trelent
     """
-    contact = await one_contact.update_phone(contact_id, phone, current_user, db)
+    try:
+        contact = await one_contact.update_phone(contact_id, phone, current_user, db)
+    except IntegrityError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=messages.CONTACT_EXISTS)
     if contact is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=messages.NOT_CONTACT
@@ -225,8 +319,8 @@ async def update_phone(
 async def update_phone(
     contact_id: int,
     info: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(auth_service.get_principal),
 ) -> Contact:
     """
     The update_phone function takes a contact_id and an info string,
@@ -235,8 +329,8 @@ async def update_phone(
 
     :param contact_id: int: Specify the contact to update
     :param info: str: Update the phone number of a contact
-    :param db: Session: Pass the database session to the function
-    :param current_user: User: Get the current user from the database
+    :param db: AsyncSession: Pass the database session to the function
+    :param current_user: Principal: Get the current user from the database
     :return: A contact object
     :doc-author: Trelent
     """
@@ -251,8 +345,8 @@ async def update_phone(
 @router.delete("/{contact_id}", response_model=ContactResponse)
 async def remove_contact(
     contact_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(auth_service.get_principal),
 ) -> Contact:
     """
     The remove_contact function removes a contact from the database.
@@ -260,8 +354,8 @@ async def remove_contact(
         If the user is not logged in or if there is no such contact with that id, it raises an HTTPException.
 
     :param contact_id: int: Specify the contact to be deleted
-    :param db: Session: Pass the database session to the function
-    :param current_user: User: Get the current user from the database
+    :param db: AsyncSession: Pass the database session to the function
+    :param current_user: Principal: Get the current user from the database
     :return: A contact object
     :doc-author: Trelent
     """
@@ -271,3 +365,21 @@ async def remove_contact(
             status_code=status.HTTP_404_NOT_FOUND, detail=messages.NOT_CONTACT
         )
     return contact
+
+
+@router.delete("/", response_model=List[ContactResponse])
+async def remove_contacts(
+    body: ContactIds,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(auth_service.get_principal),
+) -> List[Contact]:
+    """
+    The remove_contacts function removes several contacts at once.
+        Ids that are not found among the user's contacts are skipped.
+
+    :param body: ContactIds: The ids of the contacts to delete, up to 1000
+    :param db: AsyncSession: Pass the database session to the function
+    :param current_user: Principal: Get the current user from the token
+    :return: The removed contacts
+    """
+    return await one_contact.remove_contacts(body.ids, current_user, db)
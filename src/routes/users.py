@@ -1,31 +1,22 @@
-import cloudinary
-import cloudinary.uploader
-import pickle
-
-from fastapi import APIRouter, HTTPException, Depends, status, BackgroundTasks, Request, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, status, BackgroundTasks, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
-from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.formparsers import MultiPartException
 
 from src.database.db import get_db
 from src.database.models import User
 
-from src.schemas.user import UserBase, UserResponse, TokenBase, RequestEmail
-from src.repository import  users as repositories_users
-from src.services.auth import auth_service
-from src.conf.config import config
+from src.schemas.user import UserBase, UserResponse, TokenBase, RequestEmail, AvatarJobResponse
+from src.services.auth import Principal, auth_service
+from src.services.avatars import AvatarJob, UploadTooLarge, avatar_uploads, spool_form_file, spool_upload
+from src.conf import messages
 
 
 router = APIRouter(prefix='/users', tags=['users'])
 
-cloudinary.config(
-    cloud_name=config.CLOUDINARY_NAME,
-    api_key=config.CLOUDINARY_API_KEY,
-    api_secret=config.CLOUDINARY_API_SECRET,
-    secure=True,
-)
+AVATAR_CONTENT_TYPES = {'image/jpeg', 'image/png', 'image/webp', 'image/gif'}
 
-@router.get('/me', response_model=UserResponse, dependencies=[Depends(RateLimiter(times=1, seconds=20))])
+@router.get('/me', response_model=UserResponse)
 async def get_current_user(user: User = Depends(auth_service.get_current_user)) -> User:
     """
     The get_current_user function is a dependency that will be injected into the
@@ -38,26 +29,58 @@ async def get_current_user(user: User = Depends(auth_service.get_current_user))
     """
     return user
 
-@router.patch('/avatar', response_model=UserResponse, dependencies=[Depends(RateLimiter(times=1, seconds=20))])
-async def update_avatar_user(file: UploadFile = File(), user: User = Depends(auth_service.get_current_user), 
-                             db: Session = Depends(get_db)) -> User:
+@router.patch('/avatar', response_model=AvatarJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def update_avatar_user(request: Request, response: Response,
+                             principal: Principal = Depends(auth_service.get_principal),
+                             db: AsyncSession = Depends(get_db)) -> AvatarJob:
     """
-    The update_avatar_user function takes a file and user as input,
-        uploads the file to Cloudinary, updates the avatar_url of the user in
-        our database with that of the uploaded image's URL, and returns an updated User object.
-    
-    :param file: UploadFile: Get the file from the request
-    :param user: User: Get the current user
-    :param db: Session: Get the database session
-    :return: The updated user object
-    :doc-author: Trelent
+    The update_avatar_user function accepts a new avatar and uploads it in the background.
+        The image is either the request body (Content-Type: image/jpeg, image/png, image/webp or image/gif)
+        or the file field of a multipart form. It is written to a temporary file as it arrives, and the
+        response is sent as soon as it is complete: 202 with the upload job, which the Location header
+        points to. The avatar_url of the user changes when the job is done.
+
+    :param request: Request: Read the raw body as a stream
+    :param response: Response: Set the Location header
+    :param principal: Principal: Get the current user from the token
+    :param db: AsyncSession: The job uses its engine
+    :return: The pending upload job
+    """
+    content_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    try:
+        if content_type in AVATAR_CONTENT_TYPES:
+            file = await spool_upload(request.stream())
+        elif content_type == 'multipart/form-data':
+            # The job takes over the file spooled by the form parser and closes it
+            file = await spool_form_file(request.headers, request.stream())
+            if file is None:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=messages.UNSUPPORTED_AVATAR_FORMAT
+                )
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=messages.UNSUPPORTED_AVATAR_FORMAT
+            )
+    except UploadTooLarge:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=messages.AVATAR_TOO_LARGE)
+    except MultiPartException as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=err.message)
+    job = await avatar_uploads.submit(file, principal.id, principal.email, db.bind)
+    response.headers['Location'] = str(request.url_for('read_avatar_job', job_id=job.id))
+    return job
+
+
+@router.get('/avatar/{job_id}', response_model=AvatarJobResponse)
+async def read_avatar_job(job_id: str, principal: Principal = Depends(auth_service.get_principal)) -> AvatarJob:
+    """
+    The read_avatar_job function reports an avatar upload: pending, done with the new avatar URL,
+        or failed. Jobs are kept for AVATAR_JOB_TTL seconds.
+
+    :param job_id: str: The id returned by update_avatar_user
+    :param principal: Principal: Only the user who uploaded the avatar can see the job
+    :return: The upload job
     """
-    public_id = f'Web/{user.email}'
-    res = cloudinary.uploader.upload(file.file, public_id=public_id, owerite=True)
-    res_url = cloudinary.CloudinaryImage(public_id).build_url(
-        width=250, height=250, crop='fill', version=res.get('version')
-    )
-    user = await repositories_users.update_avatar_url(user.email, res_url, db)
-    auth_service.cache.set(user.email, pickle.dumps(user))
-    auth_service.cache.expire(user.email, 300)
-    return user
\ No newline at end of file
+    job = await avatar_uploads.get(job_id)
+    if job is None or job.user_id != principal.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=messages.AVATAR_JOB_NOT_FOUND)
+    return job
@@ -1,6 +1,6 @@
 import re
 from datetime import datetime, date
-from typing import List, Optional
+from typing import Annotated, List, Literal, Optional, Union
 from pydantic import BaseModel, Field, EmailStr, ConfigDict, validator, datetime_parse
 from pydantic_extra_types.phone_numbers import PhoneNumber as PydanticPhoneNumber
 
@@ -39,6 +39,45 @@ class ContactBase(BaseModel):
     info: Optional[str] = None
 
 
+class ContactUpdate(BaseModel):
+    """Any subset of the ContactBase fields, the ones left out keep their value."""
+    first_name: str = Field(default=None, max_length=15)
+    last_name: str = Field(default=None, max_length=20)
+    email: EmailStr = Field(default=None, max_length=50)
+    phone: PhoneNumber = None
+    birth_date: date = None
+    info: Optional[str] = None
+
+
+class ContactIds(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=1000)
+
+
+class ContactCreateOperation(BaseModel):
+    op: Literal['create']
+    contact: ContactBase
+
+
+class ContactUpdateOperation(BaseModel):
+    op: Literal['update']
+    id: int
+    contact: ContactUpdate
+
+
+class ContactDeleteOperation(BaseModel):
+    op: Literal['delete']
+    id: int
+
+
+ContactOperation = Annotated[
+    Union[ContactCreateOperation, ContactUpdateOperation, ContactDeleteOperation], Field(discriminator='op')
+]
+
+
+class ContactBatch(BaseModel):
+    operations: List[ContactOperation] = Field(min_length=1, max_length=1000)
+
+
 class ContactResponse(ContactBase):
     id: int = 1
     user_id: int | None
@@ -58,3 +97,33 @@ class ContactResponseAdmin(ContactBase):
     # class Config:
     #     from_attributes = True
 
+
+class ContactPage(BaseModel):
+    items: List[ContactResponse]
+    next_cursor: str | None
+
+
+class ContactPageAdmin(BaseModel):
+    items: List[ContactResponseAdmin]
+    next_cursor: str | None
+
+
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+
+class ContactImportReport(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[ImportRowError]
+
+
+class ContactOperationResult(BaseModel):
+    status: int
+    contact: ContactResponse | None = None
+    detail: str | None = None
+
+
+class ContactBatchReport(BaseModel):
+    results: List[ContactOperationResult]
@@ -1,5 +1,5 @@
 from datetime import date
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 from pydantic import BaseModel, Field, EmailStr, ConfigDict
 from src.database.models import Role
 
@@ -31,3 +31,11 @@ class TokenBase(BaseModel):
 
 class RequestEmail(BaseModel):
     email: EmailStr
+
+
+class AvatarJobResponse(BaseModel):
+    id: str
+    status: Literal['pending', 'done', 'failed']
+    url: str | None = None
+    variants: Dict[str, str] | None = None
+    detail: str | None = None
@@ -1,18 +1,30 @@
-import redis
-import pickle
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from hashlib import blake2b
+from typing import NamedTuple, Optional
 
 from fastapi import Depends, HTTPException, status
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
 
 from src.database.db import get_db
-from src.database.models import User
+from src.database.models import Role, User
 from src.repository import users as repository_users
+from src.services.cache import CachedUser, LRUCache, UserCache, user_cache
 from src.conf.config import config
+from src.conf import messages
+
+
+class Principal(NamedTuple):
+    """The identity and role carried by the signed claims of an access token."""
+    id: int
+    email: str
+    role: Role
+    token_version: int
 
 
 class Auth:
@@ -24,7 +36,9 @@ class Auth:
         SECRET_KEY (str): Secret key used for JWT encoding and decoding.
         ALGORITHM (str): Algorithm used for JWT encoding and decoding.
         oauth2_scheme (OAuth2PasswordBearer): An instance of OAuth2PasswordBearer for token authentication.
-        cache (Redis): An instance of Redis for caching user data.
+        cache (UserCache): Two-tier (in-process and Redis) cache of user data.
+        hash_executor (ThreadPoolExecutor): Worker pool running bcrypt outside of the event loop.
+        token_cache (LRUCache): Payloads of verified access tokens, keyed by a digest of the token.
 
     Methods:
         verify_password: Verify if a plain password matches a hashed password.
@@ -32,6 +46,9 @@ class Auth:
         create_access_token: Create an access token for a user.
         create_refresh_token: Create a refresh token for a user.
         decode_refresh_token: Decode a refresh token and extract the email address.
+        token_claims: Get the access token claims for a user.
+        get_principal: Get the caller's identity from the token claims alone.
+        principal_from_token: The same, called outside of dependency injection.
         get_current_user: Get the current authenticated user from the token.
         create_email_token: Create a token for email verification.
         get_email_from_token: Get the email address from an email verification token.
@@ -40,14 +57,38 @@ class Auth:
     SECRET_KEY = config.SECRET_KEY
     ALGORITHM = config.ALGORITHM
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl='api/auth/login')
-    cache = redis.Redis(
-        host=config.REDIS_HOST,
-        port=config.REDIS_PORT,
-        db=0,
-        password=config.REDIS_PASSWORD,
-    )
+    cache: UserCache = user_cache
+    hash_executor = ThreadPoolExecutor(max_workers=config.PASSWORD_HASH_WORKERS, thread_name_prefix='bcrypt')
+
+    def __init__(self):
+        self.hash_pending = 0
+        self.token_cache = LRUCache(maxsize=config.TOKEN_CACHE_SIZE, ttl=0)
+
+    async def _run_hashing(self, func, *args):
+        """
+        The _run_hashing function runs a bcrypt call in the hash_executor pool so the event loop
+        keeps serving other requests. When more than PASSWORD_HASH_QUEUE_LIMIT calls are already
+        queued it fails fast with 503 instead of letting the backlog grow.
+
+        :param self: Represent the instance of the class
+        :param func: The blocking function to run
+        :param args: Arguments passed to func
+        :return: The result of func
+        """
+        if self.hash_pending >= config.PASSWORD_HASH_QUEUE_LIMIT:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=messages.SERVER_BUSY,
+                headers={'Retry-After': '1'},
+            )
+        self.hash_pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.hash_executor, func, *args)
+        finally:
+            self.hash_pending -= 1
 
-    def verify_password(self, plain_password, hashed_password):
+    async def verify_password(self, plain_password, hashed_password):
         """
         The verify_password function takes a plain-text password and hashed
         password as arguments. It then uses the CryptContext instance to verify that
@@ -59,9 +100,9 @@ class Auth:
         :return: True if the plain_password matches the hashed_password
         :doc-author: Trelent
         """
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return await self._run_hashing(self.pwd_context.verify, plain_password, hashed_password)
     
-    def get_password_hash(self, password: str):
+    async def get_password_hash(self, password: str):
         """
         The get_password_hash function takes a password and returns the hashed version of it.
         The hashing algorithm is defined in the config file, which is imported into this module.
@@ -71,7 +112,7 @@ class Auth:
         :return: A string that is a hash of the password
         :doc-author: Trelent
         """
-        return self.pwd_context.hash(password)
+        return await self._run_hashing(self.pwd_context.hash, password)
     
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
         """
@@ -137,44 +178,97 @@ class Auth:
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
     
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    def token_claims(self, user: User) -> dict:
         """
-        The get_current_user function is a dependency that will be used in the
-            get_current_active_user endpoint. It takes in a token and db session,
-            verifies the token, and returns an active user object from the database.
-        
-        :param self: Access the class attributes
-        :param token: str: Get the token from the authorization header
-        :param db: Session: Access the database
-        :return: The user object that is associated with the email address
-        :doc-author: Trelent
+        The token_claims function returns the claims embedded in an access token for the user,
+        so get_principal can authorize a request without loading the user.
+
+        :param self: Represent the instance of the class
+        :param user: User: The user the token is issued for
+        :return: A dictionary to pass to create_access_token
         """
-        credentials_exception = HTTPException(
+        role = user.role or Role.user
+        return {'sub': user.email, 'uid': user.id, 'role': role.value, 'tv': user.token_version}
+
+    @staticmethod
+    def _credentials_exception() -> HTTPException:
+        return HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Could not validate credentials',
             headers={'WWW-Authenticate': 'Bearer'},
         )
+
+    def _decode_access_token(self, token: str) -> dict:
+        """
+        The _decode_access_token function verifies an access token and returns its payload.
+        Any failure is reported as 401 Unauthorized. Verified payloads are kept in token_cache
+        until the token expires, so a client reusing its token skips the signature check.
+
+        :param self: Represent the instance of the class
+        :param token: str: The bearer token from the authorization header
+        :return: The payload of the token, shared between requests and not to be modified
+        """
+        token_key = blake2b(token.encode(), digest_size=16).digest()
+        payload = self.token_cache.get(token_key)
+        if payload is not None:
+            return payload
+        credentials_exception = self._credentials_exception()
         try:
             payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload['scope'] == 'access_token':
-                email = payload['sub']
-                if email is None:
-                    raise credentials_exception
-            else:
+            # Other tokens signed with the same key, such as the email confirmation token, have no access scope
+            if payload.get('scope') != 'access_token' or payload.get('sub') is None or 'exp' not in payload:
                 raise credentials_exception
         except JWTError as e:
             raise credentials_exception
+        self.token_cache.set(token_key, payload, ttl=payload['exp'] - time.time())
+        return payload
+
+    async def get_principal(self, token: str = Depends(oauth2_scheme)) -> Principal:
+        """
+        The get_principal function is a dependency for handlers that only need to know who is calling.
+        It trusts the signed claims of the access token and touches neither the cache nor the database,
+        so a revoked token or a role change takes effect once the access token expires.
+
+        :param self: Access the class attributes
+        :param token: str: Get the token from the authorization header
+        :return: The Principal described by the token
+        """
+        return self.principal_from_token(token)
+
+    def principal_from_token(self, token: str) -> Principal:
+        payload = self._decode_access_token(token)
+        try:
+            return Principal(payload['uid'], payload['sub'], Role(payload['role']), payload['tv'])
+        except (KeyError, ValueError):
+            raise self._credentials_exception()
+
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+        """
+        The get_current_user function is a dependency that will be used in the
+            get_current_active_user endpoint. It takes in a token and db session,
+            verifies the token, and returns an active user object from the database.
+            Tokens issued before the user's tokens were revoked are rejected.
         
+        :param self: Access the class attributes
+        :param token: str: Get the token from the authorization header
+        :param db: AsyncSession: Access the database
+        :return: The CachedUser that is associated with the email address
+        :doc-author: Trelent
+        """
+        payload = self._decode_access_token(token)
+        credentials_exception = self._credentials_exception()
+        email = payload['sub']
+
         user_hash = str(email)
-        user = self.cache.get(user_hash)
+        user = await self.cache.get(user_hash)
         if user is None:
             user = await repository_users.get_user_by_email(email, db)
             if user is None:
                 raise credentials_exception
-            self.cache.set(user_hash, pickle.dumps(user))
-            self.cache.expire(user_hash, 300)
-        else:
-            user = pickle.loads(user)
+            user = CachedUser.from_user(user)
+            await self.cache.set(user_hash, user)
+        if payload.get('tv', 0) != user.token_version:
+            raise credentials_exception
         return user
     
     def create_email_token(self, data: dict):
@@ -0,0 +1,325 @@
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, BinaryIO, Dict, List, NamedTuple, Set
+
+import cloudinary
+import cloudinary.uploader
+import redis.asyncio as redis
+from PIL import Image, ImageOps
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from starlette.datastructures import Headers, UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+from src.conf import messages
+from src.conf.config import config
+from src.repository import users as repositories_users
+from src.services.cache import CachedUser, LRUCache, user_cache
+
+
+logger = logging.getLogger(__name__)
+
+# Bodies up to this size stay in memory while they are read, larger ones go to a temporary file
+SPOOL_MEMORY = 1024 * 1024
+# Room for the boundaries and part headers of a multipart body on top of the image
+MULTIPART_OVERHEAD = 16 * 1024
+
+
+class UploadTooLarge(MultiPartException):
+    # A MultiPartException, so the form parser closes the files it has spooled when the limit stops it
+    def __init__(self, size: int):
+        super().__init__(f'Upload of {size} bytes or more is too large')
+
+
+async def limit_size(chunks: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLarge(size)
+        yield chunk
+
+
+async def spool_form_file(headers: Headers, chunks: AsyncIterator[bytes], field: str = 'file',
+                          max_bytes: int = config.AVATAR_MAX_BYTES) -> BinaryIO | None:
+    """
+    The spool_form_file function reads a multipart/form-data body as it arrives and returns the file of
+    one field, spooled to a temporary file by the form parser. The body is cut off once it is larger than
+    max_bytes plus the multipart framing, so the parser never writes more than that to disk.
+
+    :param headers: Headers: The request headers, with the boundary of the body
+    :param chunks: AsyncIterator[bytes]: The request body as it arrives
+    :param field: str: The name of the file field
+    :param max_bytes: int: The largest accepted file
+    :return: The file, rewound, or None if the form has no such file
+    """
+    parser = MultiPartParser(headers, limit_size(chunks, max_bytes + MULTIPART_OVERHEAD), max_files=1, max_fields=10)
+    form = await parser.parse()
+    upload = form.get(field)
+    for value in form.values():
+        if isinstance(value, UploadFile) and value is not upload:
+            value.file.close()
+    if not isinstance(upload, UploadFile):
+        return None
+    if upload.size is not None and upload.size > max_bytes:
+        upload.file.close()
+        raise UploadTooLarge(upload.size)
+    return upload.file
+
+
+async def spool_upload(chunks: AsyncIterator[bytes], max_bytes: int = config.AVATAR_MAX_BYTES) -> BinaryIO:
+    """
+    The spool_upload function writes a request body to a temporary file as it arrives, so neither the
+    whole image nor the storage upload is held in the request.
+
+    :param chunks: AsyncIterator[bytes]: The request body as it arrives
+    :param max_bytes: int: The largest accepted body
+    :return: The file, rewound
+    """
+    spool = SpooledTemporaryFile(max_size=SPOOL_MEMORY)
+    try:
+        async for chunk in limit_size(chunks, max_bytes):
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+class InvalidImage(Exception):
+    pass
+
+
+IMAGE_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+
+def avatar_digest(file: BinaryIO, sizes: List[int] = config.AVATAR_SIZES,
+                  image_format: str = config.AVATAR_FORMAT, quality: int = config.AVATAR_QUALITY) -> str:
+    """
+    The avatar_digest function hashes an uploaded image together with the settings it is rendered with,
+    so the same file sent again is recognised, and rendered anew once the settings change.
+
+    :param file: BinaryIO: The image as uploaded, rewound afterwards
+    :param sizes: List[int]: The sizes of the variants
+    :param image_format: str: The format of the variants
+    :param quality: int: The encoder quality
+    :return: The hex SHA-256 digest
+    """
+    digest = hashlib.sha256(f'{sizes}:{image_format}:{quality}:'.encode())
+    while chunk := file.read(64 * 1024):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def render_avatar(file: BinaryIO, sizes: List[int] = config.AVATAR_SIZES, image_format: str = config.AVATAR_FORMAT,
+                  quality: int = config.AVATAR_QUALITY, max_pixels: int = config.AVATAR_MAX_PIXELS) -> Dict[int, bytes]:
+    """
+    The render_avatar function decodes an uploaded image, crops it to squares of each size (as the
+    250x250 fill crop of Cloudinary did) and encodes them, so only a few kilobytes are uploaded.
+    Pillow releases the GIL while it decodes, resizes and encodes, so it runs in the worker threads.
+
+    :param file: BinaryIO: The image as uploaded
+    :param sizes: List[int]: The sizes of the variants, in pixels
+    :param image_format: str: webp or jpeg
+    :param quality: int: The encoder quality
+    :param max_pixels: int: Larger images are refused before they are decoded
+    :return: The encoded variants by size
+    """
+    try:
+        image = Image.open(file)
+        if image.width * image.height > max_pixels:
+            raise InvalidImage(f'{image.width}x{image.height} is too large')
+        # Lets the JPEG decoder scale down by up to 8 while decoding, at a fraction of the cost
+        image.draft('RGB', (max(sizes), max(sizes)))
+        image = ImageOps.exif_transpose(image)
+    except (OSError, SyntaxError, Image.DecompressionBombError) as err:
+        raise InvalidImage(str(err)) from err
+    alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    if alpha and image_format == 'webp':
+        image = image.convert('RGBA')
+    elif alpha:
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.convert('RGBA'))
+        image = background
+    else:
+        image = image.convert('RGB')
+    # A box filter halving steps is much cheaper than LANCZOS over the full image and looks the same
+    factor = min(image.size) // (2 * max(sizes))
+    if factor > 1:
+        image = image.reduce(factor)
+    variants = {}
+    for size in sorted(sizes, reverse=True):
+        # Each variant is scaled from the previous, larger one
+        image = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, IMAGE_FORMATS[image_format], quality=quality)
+        variants[size] = buffer.getvalue()
+    return variants
+
+
+class CloudinaryStorage:
+    """Stores avatars in Cloudinary as they are rendered, without URL transformations."""
+
+    def __init__(self):
+        cloudinary.config(
+            cloud_name=config.CLOUDINARY_NAME,
+            api_key=config.CLOUDINARY_API_KEY,
+            api_secret=config.CLOUDINARY_API_SECRET,
+            secure=True,
+        )
+
+    def save(self, name: str, data: bytes, image_format: str) -> str:
+        res = cloudinary.uploader.upload(io.BytesIO(data), public_id=f'Web/{name}', overwrite=True)
+        return res['secure_url']
+
+
+class LocalStorage:
+    """Stores avatars as files under root, served by the app at base_url. For development and tests."""
+
+    def __init__(self, root: str = config.AVATAR_DIR, base_url: str = config.AVATAR_URL):
+        self.root = root
+        self.base_url = base_url.rstrip('/')
+
+    def save(self, name: str, data: bytes, image_format: str) -> str:
+        os.makedirs(self.root, exist_ok=True)
+        filename = f'{hashlib.sha256(name.encode()).hexdigest()[:32]}.{image_format}'
+        partial = os.path.join(self.root, f'.{filename}.{uuid.uuid4().hex}')
+        with open(partial, 'wb') as target:
+            target.write(data)
+        os.replace(partial, os.path.join(self.root, filename))
+        # The content hash changes the URL of a new image, so caches do not serve the old one
+        return f'{self.base_url}/{filename}?v={hashlib.sha256(data).hexdigest()[:12]}'
+
+
+STORAGES = {'cloudinary': CloudinaryStorage, 'local': LocalStorage}
+
+
+class AvatarJob(NamedTuple):
+    id: str
+    user_id: int
+    status: str
+    url: str | None = None
+    variants: Dict[str, str] | None = None
+    detail: str | None = None
+
+
+class AvatarUploads:
+    """
+    Uploads avatars outside of the request: the route spools the body and returns 202, and a worker thread
+    renders the AVATAR_SIZES variants and sends them to the storage. The avatar of the user is then the URL
+    of the first size. An image whose hash is that of the current avatar is neither rendered nor uploaded.
+
+    Job states are kept for AVATAR_JOB_TTL seconds locally and, once started, in Redis as well, so the
+    status of a job can be asked from any worker.
+
+    Attributes:
+        storage (CloudinaryStorage | LocalStorage): Where the images go, chosen by AVATAR_STORAGE.
+        executor (ThreadPoolExecutor): Worker pool hashing and rendering the images and running the blocking
+            storage uploads.
+        jobs (LRUCache): Recent jobs of this worker by id.
+        tasks (set): Jobs still running, awaited on shutdown.
+    """
+    key_prefix = 'avatar-job:'
+
+    def __init__(self, storage: str = config.AVATAR_STORAGE, workers: int = config.AVATAR_UPLOAD_WORKERS,
+                 job_ttl: float = config.AVATAR_JOB_TTL, sizes: List[int] = config.AVATAR_SIZES,
+                 image_format: str = config.AVATAR_FORMAT):
+        self.storage = STORAGES[storage]()
+        self.sizes = sizes
+        self.image_format = image_format
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='avatar')
+        self.job_ttl = job_ttl
+        self.jobs = LRUCache(maxsize=10000, ttl=job_ttl)
+        self.tasks: Set[asyncio.Task] = set()
+        self.redis: redis.Redis | None = None
+
+    async def start(self, client: redis.Redis) -> None:
+        self.redis = client
+
+    async def stop(self) -> None:
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.redis = None
+
+    async def _store(self, job: AvatarJob) -> None:
+        self.jobs.set(job.id, job)
+        if self.redis is not None:
+            try:
+                await self.redis.set(self.key_prefix + job.id, json.dumps(job._asdict()), ex=int(self.job_ttl))
+            except Exception as err:
+                logger.warning('Could not store avatar job %s: %s', job.id, err)
+
+    async def get(self, job_id: str) -> AvatarJob | None:
+        """
+        The get function returns a job started by this or another worker.
+
+        :param job_id: str: The id returned when the upload was accepted
+        :return: The job, or None if it is unknown or expired
+        """
+        job = self.jobs.get(job_id)
+        if job is None and self.redis is not None:
+            data = await self.redis.get(self.key_prefix + job_id)
+            if data is not None:
+                job = AvatarJob(**json.loads(data))
+        return job
+
+    async def submit(self, file: BinaryIO, user_id: int, email: str, engine: AsyncEngine) -> AvatarJob:
+        """
+        The submit function starts uploading a spooled avatar and returns at once.
+
+        :param file: BinaryIO: The image, closed when the job ends
+        :param user_id: int: The owner of the job
+        :param email: str: The user whose avatar is replaced
+        :param engine: AsyncEngine: The job opens its own session, the one of the request is closed by then
+        :return: The pending job
+        """
+        job = AvatarJob(uuid.uuid4().hex, user_id, 'pending')
+        await self._store(job)
+        task = asyncio.create_task(self._run(job, file, email, engine))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return job
+
+    def _render_and_save(self, file: BinaryIO, email: str) -> Dict[str, str]:
+        variants = render_avatar(file, self.sizes, self.image_format)
+        urls = {}
+        for number, size in enumerate(self.sizes):
+            name = email if number == 0 else f'{email}_{size}'
+            urls[str(size)] = self.storage.save(name, variants[size], self.image_format)
+        return urls
+
+    async def _run(self, job: AvatarJob, file: BinaryIO, email: str, engine: AsyncEngine) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+            digest = await loop.run_in_executor(self.executor, avatar_digest, file, self.sizes, self.image_format)
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                user = await repositories_users.get_user_by_email(email, db)
+                if user.avatar_hash == digest:
+                    job = job._replace(status='done', url=user.avatar, detail=messages.AVATAR_UNCHANGED)
+                else:
+                    variants = await loop.run_in_executor(self.executor, self._render_and_save, file, email)
+                    url = variants[str(self.sizes[0])]
+                    user = await repositories_users.update_avatar_url(email, url, db, avatar_hash=digest)
+                    await user_cache.set(user.email, CachedUser.from_user(user))
+                    job = job._replace(status='done', url=url, variants=variants)
+        except InvalidImage as err:
+            logger.info('Avatar upload %s is not a usable image: %s', job.id, err)
+            job = job._replace(status='failed', detail=str(err))
+        except Exception:
+            # Database and storage errors are logged, the client only learns that the upload failed
+            logger.exception('Avatar upload %s failed', job.id)
+            job = job._replace(status='failed', detail=messages.AVATAR_UPLOAD_FAILED)
+        finally:
+            file.close()
+        await self._store(job)
+
+
+avatar_uploads = AvatarUploads()
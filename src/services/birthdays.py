@@ -0,0 +1,188 @@
+import argparse
+import asyncio
+import logging
+from datetime import date
+from typing import Iterable, List, Set, Tuple
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError, WatchError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import config
+from src.database.db import SessionLocal
+from src.database.models import Contact
+
+
+logger = logging.getLogger(__name__)
+
+
+def birthday_key(day: date) -> int:
+    return day.month * 100 + day.day
+
+
+class BirthdayCalendar:
+    """
+    Per-user Redis sorted set of contact ids scored by birthday_key, so an upcoming-birthday
+    window is a ZRANGE instead of a query.
+
+    The set of a user is built from the database on first read and then kept up to date by the
+    contact writes. A sentinel member with a score outside any window marks a complete set, so a
+    set that was evicted or only partially written is rebuilt instead of trusted. Every write also
+    bumps a per-user version, and a rebuild is only stored if no write happened while it read the
+    database. When Redis fails, writes drop the calendar and reads fall back to the database.
+    Every write also renews the expiry of the keys, so a calendar that missed an update, because
+    Redis failed or the process died after the commit, is rebuilt at the latest ttl seconds later.
+
+    Attributes:
+        redis (Redis): The shared Redis client, set by start().
+        key_prefix (str): Prefix of the per-user keys.
+        ttl (int): Seconds a calendar lives after its last write.
+    """
+    key_prefix = 'birthdays:'
+    sentinel = '-'
+
+    def __init__(self, ttl: int = config.BIRTHDAY_CALENDAR_TTL):
+        self.redis: redis.Redis | None = None
+        self.ttl = ttl
+
+    async def start(self, client: redis.Redis) -> None:
+        self.redis = client
+
+    async def stop(self) -> None:
+        self.redis = None
+
+    def key(self, user_id: int) -> str:
+        return f'{self.key_prefix}{user_id}'
+
+    def version_key(self, user_id: int) -> str:
+        return f'{self.key_prefix}{user_id}:version'
+
+    def _bump(self, pipe: redis.client.Pipeline, user_id: int) -> None:
+        pipe.expire(self.key(user_id), self.ttl)
+        pipe.incr(self.version_key(user_id))
+        pipe.expire(self.version_key(user_id), self.ttl)
+
+    async def _forget(self, user_ids: Set[int], err: RedisError) -> None:
+        logger.warning('Birthday calendar update failed for users %s, dropping them: %s', sorted(user_ids), err)
+        try:
+            await self.redis.delete(*(self.key(user_id) for user_id in user_ids))
+        except RedisError as delete_err:
+            logger.warning('Could not drop the birthday calendars: %s', delete_err)
+
+    async def add(self, *contacts: Contact) -> None:
+        """
+        The add function stores or moves contacts in the calendars of their owners.
+
+        :param contacts: Contact: Contacts that were created or whose birth date may have changed
+        :return: None
+        """
+        if self.redis is None:
+            return
+        user_ids = {contact.user_id for contact in contacts if contact.user_id is not None}
+        if not user_ids:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for user_id in user_ids:
+                    owned = [contact for contact in contacts if contact.user_id == user_id]
+                    pipe.zadd(self.key(user_id), {contact.id: birthday_key(contact.birth_date) for contact in owned})
+                    self._bump(pipe, user_id)
+                await pipe.execute()
+        except RedisError as err:
+            await self._forget(user_ids, err)
+
+    async def remove(self, *contacts: Contact) -> None:
+        if self.redis is None:
+            return
+        user_ids = {contact.user_id for contact in contacts if contact.user_id is not None}
+        if not user_ids:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for user_id in user_ids:
+                    pipe.zrem(self.key(user_id), *(contact.id for contact in contacts if contact.user_id == user_id))
+                    self._bump(pipe, user_id)
+                await pipe.execute()
+        except RedisError as err:
+            await self._forget(user_ids, err)
+
+    async def rebuild(self, user_id: int, db: AsyncSession, attempts: int = 3) -> int | None:
+        """
+        The rebuild function replaces the calendar of a user with the birthdays stored in the database.
+        The version of the calendar is watched while the database is read, and the rebuild is retried
+        if a contact write changed it in the meantime.
+
+        :param user_id: int: The owner of the contacts
+        :param db: AsyncSession: Pass the database session to the function
+        :param attempts: int: How many times to read the database before giving up
+        :return: The number of contacts in the calendar, or None if every attempt raced a write
+        """
+        for _ in range(attempts):
+            async with self.redis.pipeline(transaction=True) as pipe:
+                await pipe.watch(self.version_key(user_id))
+                result = await db.execute(
+                    select(Contact.id, Contact.birthday_key).filter(Contact.user_id == user_id)
+                )
+                mapping = {contact_id: key for contact_id, key in result.all()}
+                mapping[self.sentinel] = 0
+                pipe.multi()
+                pipe.delete(self.key(user_id))
+                pipe.zadd(self.key(user_id), mapping)
+                pipe.expire(self.key(user_id), self.ttl)
+                try:
+                    await pipe.execute()
+                except WatchError:
+                    continue
+                return len(mapping) - 1
+        return None
+
+    async def upcoming_ids(self, user_id: int, ranges: Iterable[Tuple[int, int]], db: AsyncSession) -> List[int] | None:
+        """
+        The upcoming_ids function returns the ids of the contacts whose birthday_key falls in the ranges,
+        in range order. The calendar is rebuilt first if it is missing.
+
+        :param user_id: int: The owner of the contacts
+        :param ranges: Iterable[Tuple[int, int]]: Inclusive birthday_key ranges
+        :param db: AsyncSession: Used to rebuild the calendar
+        :return: A list of contact ids, or None when the calendar is not available and the database has to be queried
+        """
+        if self.redis is None:
+            return None
+        try:
+            if await self.redis.zscore(self.key(user_id), self.sentinel) is None:
+                if await self.rebuild(user_id, db) is None:
+                    return None
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for start, end in ranges:
+                    pipe.zrange(self.key(user_id), start, end, byscore=True)
+                results = await pipe.execute()
+        except RedisError as err:
+            logger.warning('Birthday calendar read failed for user %s: %s', user_id, err)
+            return None
+        return [int(contact_id) for ids in results for contact_id in ids]
+
+
+birthday_calendar = BirthdayCalendar()
+
+
+async def rebuild_all(user_ids: List[int]) -> None:
+    client = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=0, password=config.REDIS_PASSWORD)
+    await birthday_calendar.start(client)
+    try:
+        async with SessionLocal() as db:
+            if not user_ids:
+                result = await db.execute(select(Contact.user_id).filter(Contact.user_id.isnot(None)).distinct())
+                user_ids = result.scalars().all()
+            for user_id in user_ids:
+                count = await birthday_calendar.rebuild(user_id, db)
+                print(f'user {user_id}: {count} contacts' if count is not None else f'user {user_id}: changed, skipped')
+    finally:
+        await birthday_calendar.stop()
+        await client.aclose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild the Redis birthday calendars from the database.')
+    parser.add_argument('user_ids', type=int, nargs='*', help='Users to rebuild, all of them when omitted')
+    asyncio.run(rebuild_all(parser.parse_args().user_ids))
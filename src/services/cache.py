@@ -0,0 +1,278 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, NamedTuple
+
+import msgpack
+import redis.asyncio as redis
+
+from src.conf.config import config
+from src.database.models import Role, User
+
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """
+    A size-bounded in-process cache with a per-entry time to live.
+
+    Attributes:
+        maxsize (int): Maximum number of entries, the least recently used one is evicted first.
+        ttl (float): Seconds an entry stays valid after it was set, unless set() is given its own ttl.
+        hits, misses, evictions, expirations (int): Counters for observability.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Any | None:
+        """
+        The get function returns the cached value for a key and marks it as recently used.
+        Expired entries are dropped and reported as a miss.
+
+        :param key: str: The cache key
+        :return: The cached value or None
+        """
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+# Bump whenever CachedUser changes, so a deploy never reads entries written by the old code
+CACHE_SCHEMA_VERSION = 2
+
+
+class CachedUser(NamedTuple):
+    """
+    The part of a user that authenticated requests need. Immutable, so one instance
+    can be shared by concurrent requests through the local cache tier.
+    """
+    id: int
+    username: str
+    email: str
+    role: Role
+    confirmed: bool
+    avatar: str | None
+    token_version: int
+
+    @classmethod
+    def from_user(cls, user: User) -> 'CachedUser':
+        # Accounts created before roles were introduced have no role stored
+        role = user.role or Role.user
+        return cls(user.id, user.username, user.email, role, user.confirmed, user.avatar, user.token_version)
+
+
+def encode_user(user: CachedUser) -> bytes:
+    """
+    The encode_user function packs a CachedUser into a msgpack array.
+
+    :param user: CachedUser: The user to store
+    :return: The packed bytes
+    """
+    return msgpack.packb(
+        (user.id, user.username, user.email, user.role.value, user.confirmed, user.avatar, user.token_version)
+    )
+
+
+def decode_user(data: bytes) -> CachedUser:
+    """
+    The decode_user function is the inverse of encode_user.
+
+    :param data: bytes: Bytes produced by encode_user
+    :return: A CachedUser
+    """
+    id, username, email, role, confirmed, avatar, token_version = msgpack.unpackb(data)
+    return CachedUser(id, username, email, Role(role), confirmed, avatar, token_version)
+
+
+class UserCache:
+    """
+    Two-tier cache of authenticated users: an in-process LRU in front of Redis.
+
+    Changes to a user are broadcast on a Redis pub/sub channel, so every worker drops its
+    local copy and the next request reads the fresh value from Redis or the database.
+
+    Attributes:
+        local (LRUCache): The in-process tier.
+        redis (Redis): The shared Redis client, set by start().
+        channel (str): The pub/sub channel used for invalidation messages.
+        key_prefix (str): Prefix of the Redis keys, carries the schema version of the stored values.
+        origin (str): Identifies this process, so it ignores its own messages.
+    """
+    channel = 'users:invalidate'
+
+    def __init__(self, maxsize: int, ttl: float, redis_ttl: int,
+                 dumps: Callable[[Any], bytes] = encode_user, loads: Callable[[bytes], Any] = decode_user,
+                 key_prefix: str = f'user:v{CACHE_SCHEMA_VERSION}:'):
+        self.local = LRUCache(maxsize, ttl)
+        self.redis_ttl = redis_ttl
+        self.key_prefix = key_prefix
+        self.dumps = dumps
+        self.loads = loads
+        self.redis: redis.Redis | None = None
+        self.origin = uuid.uuid4().hex
+        self._listener: asyncio.Task | None = None
+        self.redis_hits = 0
+        self.invalidations_sent = 0
+        self.invalidations_received = 0
+        self.last_invalidation_lag = 0.0
+        self.max_invalidation_lag = 0.0
+
+    async def start(self, client: redis.Redis) -> None:
+        """
+        The start function attaches the shared Redis client and starts listening for invalidations.
+
+        :param client: Redis: The async Redis client created in the app lifespan
+        :return: None
+        """
+        self.redis = client
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        self.redis = None
+        self.local.clear()
+
+    async def get(self, key: str) -> Any | None:
+        """
+        The get function looks the key up in the local tier first and falls back to Redis.
+        A Redis hit is copied into the local tier.
+
+        :param key: str: The cache key, the user's email
+        :return: The cached value or None
+        """
+        value = self.local.get(key)
+        if value is not None or self.redis is None:
+            return value
+        data = await self.redis.get(self.key_prefix + key)
+        if data is None:
+            return None
+        self.redis_hits += 1
+        value = self.loads(data)
+        self.local.set(key, value)
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        self.local.set(key, value)
+        if self.redis is not None:
+            await self.redis.set(self.key_prefix + key, self.dumps(value), ex=self.redis_ttl)
+
+    async def invalidate(self, key: str) -> None:
+        """
+        The invalidate function drops the key from both tiers and tells the other workers
+        to drop their local copies.
+
+        :param key: str: The cache key, the user's email
+        :return: None
+        """
+        self.local.delete(key)
+        if self.redis is None:
+            return
+        await self.redis.delete(self.key_prefix + key)
+        await self.redis.publish(self.channel, f'{self.origin} {time.time()} {key}')
+        self.invalidations_sent += 1
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            self._on_message(message['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                # Messages may have been lost while disconnected, so the local tier can't be trusted
+                logger.warning('User cache invalidation listener failed: %s', err)
+                self.local.clear()
+                await asyncio.sleep(1)
+
+    def _on_message(self, data: bytes) -> None:
+        origin, sent_at, key = data.decode().split(' ', 2)
+        if origin == self.origin:
+            return
+        self.local.delete(key)
+        self.invalidations_received += 1
+        self.last_invalidation_lag = max(0.0, time.time() - float(sent_at))
+        self.max_invalidation_lag = max(self.max_invalidation_lag, self.last_invalidation_lag)
+
+    def stats(self) -> dict:
+        """
+        The stats function returns the counters of both tiers.
+
+        :return: A dictionary that can be returned as JSON
+        """
+        lookups = self.local.hits + self.local.misses
+        return {
+            'local_size': len(self.local),
+            'local_hits': self.local.hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.local.misses - self.redis_hits,
+            'local_hit_rate': self.local.hits / lookups if lookups else 0.0,
+            'evictions': self.local.evictions,
+            'expirations': self.local.expirations,
+            'invalidations_sent': self.invalidations_sent,
+            'invalidations_received': self.invalidations_received,
+            'last_invalidation_lag': self.last_invalidation_lag,
+            'max_invalidation_lag': self.max_invalidation_lag,
+        }
+
+
+user_cache = UserCache(
+    maxsize=config.USER_CACHE_LOCAL_SIZE,
+    ttl=config.USER_CACHE_LOCAL_TTL,
+    redis_ttl=config.USER_CACHE_TTL,
+)
@@ -0,0 +1,57 @@
+import csv
+import io
+import json
+from datetime import date
+from typing import AsyncIterator, Sequence
+
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from src.conf.config import config
+from src.database.models import User
+from src.repository import contacts as repository_contacts
+from src.services.contact_import import ImportFormat
+
+MEDIA_TYPES = {
+    ImportFormat.csv: 'text/csv',
+    ImportFormat.jsonl: 'application/x-ndjson',
+}
+
+HEADER = [column.key for column in repository_contacts.EXPORT_COLUMNS]
+
+
+def csv_chunk(rows: Sequence[Row] | None = None, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    if header:
+        writer.writerow(HEADER)
+    writer.writerows(rows or [])
+    return buffer.getvalue()
+
+
+def jsonl_chunk(rows: Sequence[Row]) -> str:
+    return ''.join(json.dumps(row._asdict(), default=date.isoformat) + '\n' for row in rows)
+
+
+async def export_contacts(export_format: ImportFormat, user: User, engine: AsyncEngine,
+                          batch_size: int = config.EXPORT_BATCH_SIZE) -> AsyncIterator[bytes]:
+    """
+    The export_contacts function streams all the contacts of the user as CSV with a header row or as JSON lines,
+    in the format the import accepts. One chunk is produced per batch, so memory use does not depend on the
+    number of contacts.
+
+    The session of the request is closed before a streamed body is sent, so the export opens its own
+    session on the same engine and keeps it for as long as the client reads.
+
+    :param export_format: ImportFormat: csv or jsonl
+    :param user: User: The owner of the contacts
+    :param engine: AsyncEngine: The engine of the request session
+    :param batch_size: int: Number of contacts per chunk
+    :return: The encoded chunks of the file
+    """
+    if export_format == ImportFormat.csv:
+        yield csv_chunk(header=True).encode()
+    async with AsyncSession(engine) as db:
+        async for rows in repository_contacts.stream_contacts(user, db, batch_size):
+            chunk = csv_chunk(rows) if export_format == ImportFormat.csv else jsonl_chunk(rows)
+            yield chunk.encode()
@@ -0,0 +1,213 @@
+import codecs
+import csv
+import json
+from enum import Enum
+from typing import AsyncIterator, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import config
+from src.database.models import User
+from src.repository import one_contact
+from src.schemas.contacts import ContactBase
+
+
+class ImportFormat(str, Enum):
+    csv: str = 'csv'
+    jsonl: str = 'jsonl'
+
+
+CONTENT_TYPES = {
+    'text/csv': ImportFormat.csv,
+    'application/x-ndjson': ImportFormat.jsonl,
+    'application/jsonl': ImportFormat.jsonl,
+}
+
+# The report keeps counting past this, but stops listing the rows
+MAX_REPORTED_ERRORS = 1000
+
+# Quoted fields may span lines, a record longer than this is reported instead of being held in memory
+MAX_RECORD_LENGTH = 64 * 1024
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_length: int = MAX_RECORD_LENGTH) -> AsyncIterator[str | None]:
+    """
+    The iter_lines function splits a stream of UTF-8 bytes into lines, holding at most one partial line.
+    A line longer than max_length is dropped up to the next line break and None is yielded in its place,
+    so a body without line breaks is never held in memory.
+
+    :param chunks: AsyncIterator[bytes]: The request body as it arrives
+    :param max_length: int: The longest line held in memory, in characters
+    :return: The lines without their line break, None for a line that was too long
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+
+    async def decoded() -> AsyncIterator[str]:
+        async for chunk in chunks:
+            yield decoder.decode(chunk)
+        yield decoder.decode(b'', final=True)
+
+    pieces: List[str] = []
+    length = 0
+    too_long = False
+    async for text in decoded():
+        for index, piece in enumerate(text.split('\n')):
+            if index:
+                yield None if too_long else ''.join(pieces).removesuffix('\r')
+                pieces, length, too_long = [], 0, False
+            if too_long or not piece:
+                continue
+            length += len(piece)
+            if length > max_length:
+                pieces, too_long = [], True
+            else:
+                pieces.append(piece)
+    if pieces or too_long:
+        yield None if too_long else ''.join(pieces).removesuffix('\r')
+
+
+def ends_quoted(line: str, quoted: bool) -> bool:
+    """
+    The ends_quoted function tells whether a quoted field is still open at the end of a CSV line, with the
+    quoting rules of the csv module: a quote only opens a field when it is the first character of the field,
+    and a doubled quote inside a quoted field is a literal quote. Linear in the length of the line.
+
+    :param line: str: A line of the file
+    :param quoted: bool: Whether the line starts inside a quoted field
+    :return: True if the record continues on the next line
+    """
+    position = 0
+    field_start = not quoted
+    while position < len(line):
+        if quoted:
+            end = line.find('"', position)
+            if end < 0:
+                return True
+            if line.startswith('"', end + 1):
+                position = end + 2
+                continue
+            quoted, field_start, position = False, False, end + 1
+        elif field_start and line[position] == '"':
+            quoted, position = True, position + 1
+        else:
+            end = line.find(',', position)
+            if end < 0:
+                return False
+            field_start, position = True, end + 1
+    return quoted
+
+
+async def iter_csv_records(lines: AsyncIterator[str | None],
+                           max_length: int = MAX_RECORD_LENGTH) -> AsyncIterator[Tuple[int, dict | None, str | None]]:
+    """
+    The iter_csv_records function parses CSV lines with a header row into dictionaries.
+    Quoted fields may span several lines, empty fields are left out. A record longer than max_length
+    is reported as an error and parsing resumes on the next line.
+
+    :param lines: AsyncIterator[str | None]: Lines of the file, None for a line that was too long
+    :param max_length: int: The longest record held in memory, in characters
+    :return: Row number (the header not counted), the record or None, and a parse error or None
+    """
+    header = None
+    number = 0
+    parts: List[str] = []
+    length = 0
+    quoted = False
+    async for line in lines:
+        length += max_length + 1 if line is None else len(line) + 1
+        if length > max_length:
+            number += header is not None
+            yield number, None, f'Record longer than {max_length} characters'
+            parts, length, quoted = [], 0, False
+            continue
+        parts.append(line)
+        quoted = ends_quoted(line, quoted)
+        if quoted:
+            continue
+        record = '\n'.join(parts)
+        parts, length = [], 0
+        values = next(csv.reader([record])) if record else []
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if not values:
+            continue
+        number += 1
+        if len(values) > len(header):
+            yield number, None, f'Expected {len(header)} columns, got {len(values)}'
+            continue
+        yield number, {name: value for name, value in zip(header, values) if value != ''}, None
+    if parts:
+        yield number + 1, None, 'Unterminated quoted field'
+
+
+async def iter_jsonl_records(lines: AsyncIterator[str | None],
+                             max_length: int = MAX_RECORD_LENGTH) -> AsyncIterator[Tuple[int, dict | None, str | None]]:
+    number = 0
+    async for line in lines:
+        if line is not None and not line.strip():
+            continue
+        number += 1
+        if line is None:
+            yield number, None, f'Record longer than {max_length} characters'
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as err:
+            yield number, None, f'Invalid JSON: {err}'
+            continue
+        if not isinstance(record, dict):
+            yield number, None, 'Expected a JSON object'
+            continue
+        yield number, record, None
+
+
+def validation_message(err: ValidationError) -> str:
+    return '; '.join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in err.errors())
+
+
+async def import_contacts(chunks: AsyncIterator[bytes], import_format: ImportFormat, user: User, db: AsyncSession,
+                          batch_size: int = config.IMPORT_BATCH_SIZE) -> dict:
+    """
+    The import_contacts function validates the uploaded rows against ContactBase and inserts the valid ones
+    in batches, committing each batch. Only one batch is held in memory at a time, so the upload can be
+    of any size. Rows that fail validation or collide with an existing contact are reported and skipped.
+
+    :param chunks: AsyncIterator[bytes]: The request body as it arrives
+    :param import_format: ImportFormat: csv with a header row, or JSON lines
+    :param user: User: The owner of the new contacts
+    :param db: AsyncSession: Access the database
+    :param batch_size: int: Number of contacts per INSERT
+    :return: The ContactImportReport fields
+    """
+    report = {'inserted': 0, 'failed': 0, 'errors': []}
+
+    def fail(number: int, error: str) -> None:
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': number, 'error': error})
+
+    async def flush(batch: List[Tuple[int, dict]]) -> None:
+        contacts, failures = await one_contact.create_contacts([body for _, body in batch], user, db)
+        report['inserted'] += len(contacts)
+        for index, error in failures.items():
+            fail(batch[index][0], error)
+
+    records = iter_csv_records if import_format == ImportFormat.csv else iter_jsonl_records
+    batch = []
+    async for number, record, error in records(iter_lines(chunks)):
+        if error is None:
+            try:
+                batch.append((number, ContactBase.model_validate(record).model_dump()))
+            except ValidationError as err:
+                error = validation_message(err)
+        if error is not None:
+            fail(number, error)
+        if len(batch) >= batch_size:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+    report['errors'].sort(key=lambda error: error['row'])
+    return report
@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import logging
+import os
+from ipaddress import ip_address, ip_network
+from typing import Iterable, Tuple
+
+import redis.asyncio as redis
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.conf import messages
+from src.conf.config import config
+
+
+logger = logging.getLogger(__name__)
+
+
+class PrefixTree:
+    """
+    A multibit trie of banned networks with a stride of one byte, so a lookup walks at most 4 levels
+    for IPv4 and 16 for IPv6 whatever the number of rules.
+
+    A node maps the next byte of the address to a child node, or to True when every address below it
+    is banned. A prefix that does not end on a byte boundary is expanded into all the byte values it
+    covers at its last level, and a rule inside a subtree that is already banned is not stored.
+
+    Attributes:
+        roots (dict): The root node for each IP version, True when the whole address space is banned.
+        rules (int): Number of rules inserted, including the ones covered by a shorter prefix.
+    """
+
+    def __init__(self):
+        self.roots: dict[int, dict | bool] = {4: {}, 6: {}}
+        self.rules = 0
+
+    def insert(self, rule: str) -> None:
+        """
+        The insert function bans a single address or a CIDR block.
+
+        :param rule: str: An IPv4 or IPv6 address or network, host bits are ignored
+        :return: None
+        """
+        network = ip_network(rule, strict=False)
+        self.rules += 1
+        node = self.roots[network.version]
+        if node is True:
+            return
+        if network.prefixlen == 0:
+            self.roots[network.version] = True
+            return
+        full, rest = divmod(network.prefixlen, 8)
+        packed = network.network_address.packed
+        for level, byte in enumerate(packed[:full]):
+            if level == full - 1 and not rest:
+                node[byte] = True
+                return
+            child = node.get(byte)
+            if child is True:
+                return
+            if child is None:
+                child = node[byte] = {}
+            node = child
+        first = packed[full]
+        for byte in range(first, first + (1 << (8 - rest))):
+            node[byte] = True
+
+    def __contains__(self, address: bytes) -> bool:
+        node = self.roots[4 if len(address) == 4 else 6]
+        for byte in address:
+            if node is True:
+                return True
+            node = node.get(byte)
+            if node is None:
+                return False
+        return node is True
+
+
+def parse_rules(lines: Iterable[str]) -> PrefixTree:
+    """
+    The parse_rules function builds a PrefixTree from ban rules, one per line.
+    Blank lines and # comments are skipped, invalid rules are logged and skipped.
+
+    :param lines: Iterable[str]: The rules
+    :return: The tree of banned networks
+    """
+    tree = PrefixTree()
+    for line in lines:
+        rule = line.split('#', 1)[0].strip()
+        if not rule:
+            continue
+        try:
+            tree.insert(rule)
+        except ValueError:
+            logger.warning('Invalid IP ban rule', extra={'rule': rule})
+    return tree
+
+
+def packed_address(host: str) -> bytes | None:
+    try:
+        address = ip_address(host)
+    except ValueError:
+        return None
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return address.packed
+
+
+class IpBanList:
+    """
+    The banned addresses and networks, read from a file (IP_BAN_FILE) or from a Redis set (IP_BAN_REDIS_KEY)
+    and reloaded without a restart.
+
+    A watcher task checks the modification time of the file, or the version counter that ban_cli bumps
+    next to the set, every IP_BAN_RELOAD_INTERVAL seconds. A new tree is built in a worker thread and then
+    swapped in whole, so requests never see a half-built tree.
+
+    Attributes:
+        tree (PrefixTree): The rules in force.
+        path (str | None): The rule file, one rule per line; Redis is used when it is not set.
+        key (str): The Redis set of rules, the version counter is stored at key + ':version'.
+        redis (Redis): The shared Redis client, set by start().
+    """
+
+    def __init__(self, path: str | None = config.IP_BAN_FILE, key: str = config.IP_BAN_REDIS_KEY,
+                 interval: float = config.IP_BAN_RELOAD_INTERVAL):
+        self.tree = PrefixTree()
+        self.path = path or None
+        self.key = key
+        self.interval = interval
+        self.redis: redis.Redis | None = None
+        self._version = None
+        self._watcher: asyncio.Task | None = None
+
+    async def start(self, client: redis.Redis) -> None:
+        self.redis = client
+        self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+        self.redis = None
+
+    def is_banned(self, host: str) -> bool:
+        if not self.tree.rules:
+            return False
+        address = packed_address(host)
+        return address is not None and address in self.tree
+
+    async def reload(self) -> bool:
+        """
+        The reload function rebuilds the tree if the source changed since the last load.
+
+        :return: True if the rules were reloaded
+        """
+        if self.path is not None:
+            version = os.stat(self.path).st_mtime_ns if os.path.exists(self.path) else None
+            if version == self._version:
+                return False
+            lines = await asyncio.to_thread(self._read_file) if version is not None else []
+        else:
+            version = await self.redis.get(f'{self.key}:version')
+            if version == self._version:
+                return False
+            lines = [rule.decode() for rule in await self.redis.smembers(self.key)]
+        self.tree = await asyncio.to_thread(parse_rules, lines)
+        self._version = version
+        logger.info('IP ban rules loaded', extra={'rules': self.tree.rules})
+        return True
+
+    def _read_file(self) -> list[str]:
+        with open(self.path, encoding='utf-8') as file:
+            return file.readlines()
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                # Keep enforcing the rules already loaded
+                logger.warning('IP ban reload failed: %s', err)
+            await asyncio.sleep(self.interval)
+
+
+ip_ban_list = IpBanList()
+
+
+class IpBanMiddleware:
+    """
+    ASGI middleware answering 403 to clients whose address is in the ban list. The address is the one
+    the server reports in the scope, so run uvicorn with --proxy-headers behind a reverse proxy.
+
+    Attributes:
+        app (ASGIApp): The wrapped application.
+        bans (IpBanList): The rules, read at every request so a reload applies at once.
+    """
+
+    def __init__(self, app: ASGIApp, bans: IpBanList = ip_ban_list):
+        self.app = app
+        self.bans = bans
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        client = scope.get('client')
+        if scope['type'] != 'http' or not client or not self.bans.is_banned(client[0]):
+            await self.app(scope, receive, send)
+            return
+        logger.info('Banned IP address', extra={'client': client[0], 'path': scope['path']})
+        response = JSONResponse(status_code=403, content={'detail': messages.BANNED})
+        await response(scope, receive, send)
+
+
+async def ban_cli(command: str, rules: Tuple[str, ...]) -> None:
+    client = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=0, password=config.REDIS_PASSWORD)
+    key = config.IP_BAN_REDIS_KEY
+    try:
+        for rule in rules:
+            ip_network(rule, strict=False)
+        if command == 'add' and rules:
+            await client.sadd(key, *rules)
+        elif command == 'remove' and rules:
+            await client.srem(key, *rules)
+        elif command == 'list':
+            for rule in sorted(rule.decode() for rule in await client.smembers(key)):
+                print(rule)
+            return
+        await client.incr(f'{key}:version')
+        print(f'{await client.scard(key)} rules')
+    finally:
+        await client.aclose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Edit the IP ban rules kept in Redis, the workers reload them.')
+    parser.add_argument('command', choices=['add', 'remove', 'list'])
+    parser.add_argument('rules', nargs='*', help='Addresses or CIDR blocks, e.g. 203.0.113.7 or 2001:db8::/32')
+    arguments = parser.parse_args()
+    asyncio.run(ban_cli(arguments.command, tuple(arguments.rules)))
@@ -0,0 +1,190 @@
+import logging
+import math
+import time
+from typing import Dict, NamedTuple
+
+import redis.asyncio as redis
+from fastapi import HTTPException, Request, status
+
+from src.conf import messages
+from src.conf.config import config
+from src.services.auth import auth_service
+from src.services.cache import LRUCache
+
+
+logger = logging.getLogger(__name__)
+
+
+class Policy(NamedTuple):
+    """A token bucket holding up to capacity requests and refilled by capacity every period seconds."""
+    capacity: int
+    period: float
+
+    @classmethod
+    def parse(cls, spec: str) -> 'Policy':
+        """
+        The parse function reads a policy written as 'times/seconds', e.g. '1/20' or '120/60'.
+
+        :param spec: str: The policy as declared in the config
+        :return: The Policy
+        """
+        times, seconds = spec.split('/')
+        return cls(int(times), float(seconds))
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+
+# Refills the bucket for the time elapsed since the last request, then takes a token if there is one.
+# Returns 0 when the request is allowed, otherwise the seconds until a token is available.
+# The clock is the Redis server's, so every worker sees the same time.
+TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(state[1]) or capacity
+local at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - at) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class MemoryBackend:
+    """The token bucket of TOKEN_BUCKET kept in process memory, for tests and single-process runs."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.buckets: Dict[str, tuple[float, float]] = {}
+
+    async def take(self, key: str, policy: Policy) -> float:
+        now = self.clock()
+        tokens, at = self.buckets.get(key, (policy.capacity, now))
+        tokens = min(policy.capacity, tokens + max(0.0, now - at) * policy.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / policy.rate
+        self.buckets[key] = (tokens, now)
+        return wait
+
+
+class RedisBackend:
+    """Runs TOKEN_BUCKET, one EVALSHA per check, so concurrent workers share each bucket atomically."""
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+        self.script = client.register_script(TOKEN_BUCKET)
+
+    async def load(self) -> None:
+        # Saves the first request of each worker the NOSCRIPT round trip, a restarted Redis is reloaded on demand
+        await self.client.script_load(TOKEN_BUCKET)
+
+    async def take(self, key: str, policy: Policy) -> float:
+        return float(await self.script(keys=[key], args=[policy.capacity, policy.rate]))
+
+
+class RateLimiter:
+    """
+    Token-bucket rate limiting of every route, declared in config instead of on each route.
+
+    A request spends a token from one bucket: the bucket of its route if RATE_LIMIT_ROUTES has a policy
+    for it ('METHOD /path/{template}'), otherwise the client's bucket shared by all routes with the
+    RATE_LIMIT_DEFAULT policy, or the policy RATE_LIMIT_USERS gives to that user id. Clients are told
+    apart by the user id of their access token, or by address when there is no valid token. The address
+    is the one the server reports in the scope, so run uvicorn with --proxy-headers behind a reverse
+    proxy, or every anonymous request (login, signup, email confirmation) shares the proxy's bucket.
+
+    When a bucket is empty the time it will refill is remembered locally, so a client retrying before
+    then is refused without a Redis call. If the backend fails, requests are let through.
+
+    Attributes:
+        backend (RedisBackend | MemoryBackend): Where the buckets are kept.
+        blocked (LRUCache): Bucket keys known to be empty, each until it refills.
+        default (Policy | None): The policy of routes without their own, None for no limit.
+        routes (dict): Policies by 'METHOD /path'.
+        users (dict): Default policy overrides by user id.
+    """
+    key_prefix = 'ratelimit:'
+
+    def __init__(self, default: str | None = config.RATE_LIMIT_DEFAULT,
+                 routes: Dict[str, str] = config.RATE_LIMIT_ROUTES, users: Dict[str, str] = config.RATE_LIMIT_USERS,
+                 blocked_size: int = config.RATE_LIMIT_BLOCKED_SIZE):
+        self.default = Policy.parse(default) if default else None
+        self.routes = {route: Policy.parse(spec) for route, spec in routes.items()}
+        self.users = {user_id: Policy.parse(spec) for user_id, spec in users.items()}
+        self.backend = MemoryBackend()
+        self.blocked = LRUCache(maxsize=blocked_size, ttl=0)
+        self.rejected_locally = 0
+
+    async def start(self, client: redis.Redis) -> None:
+        backend = RedisBackend(client)
+        await backend.load()
+        self.backend = backend
+
+    async def stop(self) -> None:
+        self.backend = MemoryBackend()
+        self.blocked.clear()
+
+    def client_id(self, request: Request) -> tuple[str, str | None]:
+        authorization = request.headers.get('authorization', '')
+        if authorization[:7].lower() == 'bearer ':
+            try:
+                user_id = str(auth_service.principal_from_token(authorization[7:]).id)
+                return f'user:{user_id}', user_id
+            except Exception:
+                # Whatever is wrong with the token is for the route to report, the client is counted by address
+                pass
+        return f'ip:{request.client.host if request.client else "-"}', None
+
+    def bucket(self, request: Request) -> tuple[str, Policy | None]:
+        """
+        The bucket function picks the bucket a request spends its token from.
+
+        :param request: Request: The request, after routing
+        :return: The bucket key and its policy, None when the request is not limited
+        """
+        client, user_id = self.client_id(request)
+        route = request.scope.get('route')
+        route_key = f'{request.method} {route.path}' if route is not None else None
+        policy = self.routes.get(route_key)
+        if policy is not None:
+            return f'{self.key_prefix}{route_key}:{client}', policy
+        return f'{self.key_prefix}*:{client}', self.users.get(user_id, self.default)
+
+    async def __call__(self, request: Request) -> None:
+        key, policy = self.bucket(request)
+        if policy is None:
+            return
+        until = self.blocked.get(key)
+        if until is not None:
+            self.rejected_locally += 1
+        else:
+            try:
+                wait = await self.backend.take(key, policy)
+            except Exception as err:
+                logger.warning('Rate limit check failed: %s', err)
+                return
+            if not wait:
+                return
+            until = time.monotonic() + wait
+            self.blocked.set(key, until, ttl=wait)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=messages.TOO_MANY_REQUESTS,
+            headers={'Retry-After': str(max(1, math.ceil(until - time.monotonic())))},
+        )
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,63 @@
+import logging
+import re
+from typing import Iterable
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.conf import messages
+from src.conf.config import config
+from src.services.cache import LRUCache
+
+
+logger = logging.getLogger(__name__)
+
+
+class UserAgentBanMiddleware:
+    """
+    ASGI middleware answering 403 to requests whose User-Agent matches one of the ban patterns.
+
+    The patterns are compiled once into a single alternation, and the verdict for each User-Agent
+    string is kept in a bounded LRU cache, so the few distinct clients of a deployment are matched
+    once rather than on every request. A request without the header is matched as an empty string.
+
+    Attributes:
+        app (ASGIApp): The wrapped application.
+        pattern (re.Pattern | None): The compiled alternation, None when nothing is banned.
+        verdicts (LRUCache): Whether a User-Agent (raw header bytes) is banned.
+    """
+
+    def __init__(self, app: ASGIApp, patterns: Iterable[str], cache_size: int = config.USER_AGENT_CACHE_SIZE):
+        self.app = app
+        patterns = list(patterns)
+        self.pattern = re.compile('|'.join(f'(?:{pattern})' for pattern in patterns)) if patterns else None
+        self.verdicts = LRUCache(maxsize=cache_size, ttl=float('inf'))
+
+    def is_banned(self, user_agent: bytes) -> bool:
+        """
+        The is_banned function tells whether a User-Agent matches any ban pattern, from the cache when it can.
+
+        :param user_agent: bytes: The raw header value, empty when the header is missing
+        :return: True if the client is banned
+        """
+        banned = self.verdicts.get(user_agent)
+        if banned is None:
+            banned = self.pattern.search(user_agent.decode('latin-1')) is not None
+            self.verdicts.set(user_agent, banned)
+        return banned
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or self.pattern is None:
+            await self.app(scope, receive, send)
+            return
+        user_agent = next((value for name, value in scope['headers'] if name == b'user-agent'), b'')
+        if not self.is_banned(user_agent):
+            await self.app(scope, receive, send)
+            return
+        client = scope.get('client')
+        logger.info('Banned user agent', extra={
+            'user_agent': user_agent.decode('latin-1'), 'client': client[0] if client else None,
+            'path': scope['path'],
+        })
+        response = JSONResponse(status_code=403, content={'detail': messages.BANNED})
+        await response(scope, receive, send)
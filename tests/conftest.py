@@ -2,7 +2,9 @@ import pytest
 from fastapi.testclient import TestClient
 from httpx import WSGITransport
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from unittest.mock import MagicMock, patch
 from main import app
 from src.database.models import Base, User
@@ -17,6 +19,14 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The application talks to the same database file through the async driver
+async_engine = create_async_engine(
+    "sqlite+aiosqlite:///./test.db", poolclass=NullPool
+)
+AsyncTestingSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
 test_user = {
     "username": "deadpool",
     "email": "deadpool@example.com",
@@ -73,11 +83,9 @@ def session():
 @pytest.fixture(scope="module", autouse=True)
 def client(session):
     # Создаем клиента с правильными зависимостями
-    def override_get_db():
-        try:
-            yield session
-        finally:
-            session.close()
+    async def override_get_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
 
     app.dependency_overrides[get_db] = override_get_db
     # Создаем тестового клиента
@@ -83,3 +83,14 @@ def test_validation_error_login(client, user):
     assert response.status_code == 422, response.text
     data = response.json()
     assert "detail" in data  
+
+
+def test_login_hashing_saturated(client, user, monkeypatch):
+    monkeypatch.setattr("src.services.auth.auth_service.hash_pending", 10_000)
+    response = client.post(
+        "/api/auth/login",
+        data={"username": user.get("email"), "password": user.get("password")},
+    )
+    assert response.status_code == 503, response.text
+    data = response.json()
+    assert data["detail"] == messages.SERVER_BUSY
@@ -1,4 +1,4 @@
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from datetime import date, timedelta
 import datetime
 import pytest
@@ -9,7 +9,7 @@ from tests.test_route_one_contact import token
 
 
 def test_read_contacts(client, token):
-    with patch.object(auth_service, 'cache') as r_mock:
+    with patch.object(auth_service, 'cache', new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.get(
             "/api/contacts",
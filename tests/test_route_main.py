@@ -0,0 +1,76 @@
+import io
+import time
+from unittest.mock import MagicMock
+
+from PIL import Image
+
+from src.conf import messages
+from src.database.db import PoolMetrics
+from src.services.auth import auth_service
+from src.services.avatars import LocalStorage, avatar_uploads
+
+
+def test_pool_stats(client):
+    response = client.get("/api/healthchecker/pool")
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert "checked_out" in data
+    assert "overflow" in data
+    assert "+Inf" in data["wait_seconds"]["buckets"]
+
+
+def test_pool_metrics_histogram():
+    metrics = PoolMetrics()
+    metrics.observe_wait(0.0005)
+    metrics.observe_wait(0.2)
+    metrics.observe_wait(10)
+    buckets = metrics.snapshot(MagicMock())["wait_seconds"]["buckets"]
+    assert buckets["0.001"] == 1
+    assert buckets["0.5"] == 2
+    assert buckets["+Inf"] == 3
+
+
+def test_banned_user_agent(client):
+    response = client.get("/", headers={"User-Agent": "Python-urllib/3.11"})
+    assert response.status_code == 403, response.text
+    assert response.json()["detail"] == messages.BANNED
+    response = client.get("/")
+    assert response.status_code == 200, response.text
+
+
+def test_rate_limited_route(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    responses = [client.get("/api/users/me", headers=headers) for _ in range(2)]
+    assert responses[-1].status_code == 429, responses[-1].text
+    assert responses[-1].json()["detail"] == messages.TOO_MANY_REQUESTS
+    assert int(responses[-1].headers["Retry-After"]) >= 1
+
+
+def test_email_token_as_bearer(client):
+    token = auth_service.create_email_token(data={"sub": "deadpool@example.com"})
+    response = client.get("/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200, response.text
+    response = client.get("/api/users/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401, response.text
+
+
+def test_update_avatar(client, token, tmp_path, monkeypatch):
+    monkeypatch.setattr(avatar_uploads, "storage", LocalStorage(str(tmp_path), "/static/avatars"))
+    headers = {"Authorization": f"Bearer {token}"}
+    image = io.BytesIO()
+    Image.new("RGB", (640, 480), "red").save(image, "PNG")
+    response = client.patch("/api/users/avatar", content=image.getvalue(),
+                            headers={**headers, "Content-Type": "image/png"})
+    assert response.status_code == 202, response.text
+    assert response.json()["status"] == "pending"
+    for _ in range(100):
+        job = client.get(response.headers["Location"], headers=headers).json()
+        if job["status"] != "pending":
+            break
+        time.sleep(0.05)
+    assert job["status"] == "done", job
+    assert job["url"].startswith("/static/avatars/")
+    assert job["variants"] == {"250": job["url"]}
+    with Image.open(tmp_path / job["url"].split("/")[-1].split("?")[0]) as avatar:
+        assert avatar.size == (250, 250)
+    assert client.get(response.headers["Location"]).status_code == 401
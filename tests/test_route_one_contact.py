@@ -1,5 +1,6 @@
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from datetime import date, timedelta
+import json
 import datetime
 import pytest
 
@@ -26,7 +27,7 @@ test_json_1 = {
 
 
 def test_create_contact(client, token):
-    with patch.object(auth_service, "cache") as r_mock:
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.post(
             "/api/contact",
@@ -40,7 +41,7 @@ def test_create_contact(client, token):
 
 
 def test_read_contact(client, token):
-    with patch.object(auth_service, "cache") as r_mock:
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.get(
             "/api/contact/1", headers={"Authorization": f"Bearer {token}"}
@@ -52,7 +53,7 @@ def test_read_contact(client, token):
 
 
 def test_read_contact_by_email(client, token):
-    with patch.object(auth_service, "cache") as r_mock:
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.get(
             "/api/contact/search/user@example.com",
@@ -65,7 +66,7 @@ def test_read_contact_by_email(client, token):
 
 
 def test_get_contact_not_found(client, token):
-    with patch.object(auth_service, "cache") as r_mock:
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.get(
             "/api/contact/2", headers={"Authorization": f"Bearer {token}"}
@@ -76,7 +77,7 @@ def test_get_contact_not_found(client, token):
 
 
 def test_read_contacts(client, token):  # to move to the test_route_contacts.py
-    with patch.object(auth_service, "cache") as r_mock:
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.get(
             "/api/contacts", headers={"Authorization": f"Bearer {token}"}
@@ -89,7 +90,7 @@ def test_read_contacts(client, token):  # to move to the test_route_contacts.py
 
 
 # def test_update_contact(client, token):
-#     with patch.object(auth_service, "cache") as r_mock:
+#     with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
 #         r_mock.get.return_value = None
 #         response = client.put(
 #             "/api/contact/1",
@@ -103,7 +104,7 @@ def test_read_contacts(client, token):  # to move to the test_route_contacts.py
 
 
 def test_update_contact_not_found(client, token):
-    with patch.object(auth_service, "cache") as r_mock:
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.put(
             "/api/contact/2",
@@ -115,7 +116,7 @@ def test_update_contact_not_found(client, token):
         assert data["detail"] == messages.NOT_CONTACT
 
 def test_update_name(client, token):
-    with patch.object(auth_service, "cache") as r_mock:
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
         r_mock.get.return_value = None
         response = client.patch(
             "/api/contact/update_name/1/test",
@@ -151,3 +152,241 @@ def test_update_name(client, token):
 #         assert response.status_code == 404, response.text
 #         data = response.json()
 #         assert data["detail"] == messages.NOT_CONTACT
+
+
+def test_read_contacts_page(client, token):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.get(
+            "/api/contacts/page?limit=1&order=last_name",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert len(data["items"]) == 1
+        assert data["next_cursor"] is None
+
+
+def test_read_contacts_page_invalid_cursor(client, token):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.get(
+            "/api/contacts/page?cursor=garbage",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 400, response.text
+        assert response.json()["detail"] == messages.INVALID_CURSOR
+
+
+def test_search_contacts(client, token):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        for query in ("EXAMPLE", "st", "@example.c"):
+            response = client.get(
+                f"/api/contacts/search/{query}",
+                headers={"Authorization": f"Bearer {token}"},
+            )
+            assert response.status_code == 200, response.text
+            assert [contact["email"] for contact in response.json()] == [test_json.get("email")]
+        response = client.get(
+            "/api/contacts/search/100%",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 200, response.text
+        assert response.json() == []
+
+
+def test_read_contacts_with_birth(client, token):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.get(
+            "/api/contacts/birthday_for_week?days=365",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 200, response.text
+        assert [contact["email"] for contact in response.json()] == [test_json.get("email")]
+        response = client.get(
+            "/api/contacts/birthday_for_week?days=366",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 422, response.text
+
+
+def test_patch_contact(client, token):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        before = client.get(
+            "/api/contact/1",
+            headers={"Authorization": f"Bearer {token}"},
+        ).json()
+        response = client.patch(
+            "/api/contact/1",
+            json={"last_name": "patched", "info": None},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data == {**before, "last_name": "patched", "info": None}
+
+
+def test_patch_contact_invalid(client, token):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.patch(
+            "/api/contact/1",
+            json={"first_name": None},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 422, response.text
+        response = client.patch(
+            "/api/contact/2",
+            json={"last_name": "patched"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 404, response.text
+        assert response.json()["detail"] == messages.NOT_CONTACT
+
+
+def test_patch_contact_conflict(client, token):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.post(
+            "/api/contact",
+            json={**test_json, "email": "taken@example.com", "phone": "4242474896"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 201, response.text
+        response = client.patch(
+            "/api/contact/1",
+            json={"email": "taken@example.com"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 409, response.text
+        assert response.json()["detail"] == messages.CONTACT_EXISTS
+        response = client.get("/api/contact/1", headers={"Authorization": f"Bearer {token}"})
+        assert response.json()["email"] == test_json["email"]
+
+
+def test_update_contact_conflict(client, token):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.post(
+            "/api/contact",
+            json={**test_json, "email": "taken2@example.com", "phone": "4242474897"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 201, response.text
+        phone = response.json()["phone"]
+        requests = [
+            ("put", "/api/contact/1", {"json": {**test_json, "email": "taken2@example.com"}}),
+            ("patch", "/api/contact/update_email/1/taken2@example.com", {}),
+            ("patch", f"/api/contact/update_phone/1/{phone}", {}),
+        ]
+        for method, url, kwargs in requests:
+            response = client.request(method, url, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+            assert response.status_code == 409, response.text
+            assert response.json()["detail"] == messages.CONTACT_EXISTS
+        response = client.get("/api/contact/1", headers={"Authorization": f"Bearer {token}"})
+        assert response.json()["email"] == test_json["email"]
+
+
+def test_remove_contacts(client, token):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.post(
+            "/api/contact",
+            json={**test_json, "email": "bulk@example.com", "phone": "4242474891"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 201, response.text
+        contact_id = response.json()["id"]
+        response = client.request(
+            "DELETE",
+            "/api/contact/",
+            json={"ids": [contact_id, 999]},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 200, response.text
+        assert [contact["id"] for contact in response.json()] == [contact_id]
+        response = client.request(
+            "DELETE",
+            "/api/contact/",
+            json={"ids": []},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 422, response.text
+
+
+def test_import_contacts(client, token):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        body = (
+            "first_name,last_name,email,phone,birth_date,info\n"
+            "Import,One,import1@example.com,4242474892,1990-03-01,\n"
+            "Import,Two,import2@example.com,4242474893,not a date,\n"
+            f"Import,Three,{test_json['email']},4242474894,1990-03-01,\n"
+        )
+        response = client.post(
+            "/api/contact/import",
+            content=body.encode(),
+            headers={"Authorization": f"Bearer {token}", "Content-Type": "text/csv"},
+        )
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["inserted"] == 1
+        assert [error["row"] for error in data["errors"]] == [2, 3]
+        assert data["errors"][1]["error"] == messages.CONTACT_EXISTS
+        response = client.post(
+            "/api/contact/import",
+            content=b"[]",
+            headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+        )
+        assert response.status_code == 415, response.text
+
+
+def test_export_contacts(client, token):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.get(
+            "/api/contacts/export", headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"] == "application/x-ndjson"
+        emails = [json.loads(line)["email"] for line in response.text.splitlines()]
+        assert "import1@example.com" in emails
+        response = client.get(
+            "/api/contacts/export",
+            params={"format": "csv"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 200, response.text
+        assert response.headers["content-disposition"] == 'attachment; filename="contacts.csv"'
+        lines = response.text.splitlines()
+        assert lines[0] == "id,first_name,last_name,email,phone,birth_date,info"
+        assert len(lines) == len(emails) + 1
+
+
+def test_apply_batch(client, token):
+    with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.post(
+            "/api/contact/batch",
+            json={"operations": [
+                {"op": "create", "contact": {**test_json, "email": "batch@example.com", "phone": "4242474895"}},
+                {"op": "update", "id": 1, "contact": {"info": "batched"}},
+                {"op": "delete", "id": 999},
+            ]},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 200, response.text
+        results = response.json()["results"]
+        assert [result["status"] for result in results] == [201, 200, 404]
+        assert results[0]["contact"]["email"] == "batch@example.com"
+        assert results[1]["contact"]["info"] == "batched"
+        assert results[2]["detail"] == messages.NOT_CONTACT
+        response = client.post(
+            "/api/contact/batch",
+            json={"operations": [{"op": "move", "id": 1}]},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 422, response.text
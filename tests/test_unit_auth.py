@@ -0,0 +1,66 @@
+import time
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from fastapi import HTTPException
+from jose import JWTError
+
+from src.database.models import Role, User
+from src.services.auth import Principal, auth_service
+from src.services.cache import CachedUser
+
+
+class TestAsyncAuth(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.user = User(id=1, username="test_user", email="user@example.com", role=Role.moderator,
+                         confirmed=True, token_version=3)
+
+    async def test_get_principal_from_claims(self):
+        token = await auth_service.create_access_token(data=auth_service.token_claims(self.user))
+        principal = await auth_service.get_principal(token)
+        self.assertEqual(principal, Principal(1, "user@example.com", Role.moderator, 3))
+
+    async def test_get_principal_without_claims(self):
+        token = await auth_service.create_access_token(data={"sub": self.user.email})
+        with self.assertRaises(HTTPException) as err:
+            await auth_service.get_principal(token)
+        self.assertEqual(err.exception.status_code, 401)
+
+    async def test_get_principal_refresh_token(self):
+        token = await auth_service.create_refresh_token(data=auth_service.token_claims(self.user))
+        with self.assertRaises(HTTPException):
+            await auth_service.get_principal(token)
+
+    async def test_get_principal_email_token(self):
+        token = auth_service.create_email_token(data={"sub": self.user.email})
+        with self.assertRaises(HTTPException) as err:
+            await auth_service.get_principal(token)
+        self.assertEqual(err.exception.status_code, 401)
+
+    async def test_get_current_user_revoked_token(self):
+        token = await auth_service.create_access_token(data=auth_service.token_claims(self.user))
+        cached = CachedUser.from_user(self.user)._replace(token_version=4)
+        with patch.object(auth_service, "cache", new_callable=AsyncMock) as r_mock:
+            r_mock.get.return_value = cached
+            with self.assertRaises(HTTPException) as err:
+                await auth_service.get_current_user(token, db=AsyncMock())
+        self.assertEqual(err.exception.status_code, 401)
+
+    async def test_verified_token_is_cached(self):
+        token = await auth_service.create_access_token(data=auth_service.token_claims(self.user))
+        await auth_service.get_principal(token)
+        hits = auth_service.token_cache.hits
+        with patch("src.services.auth.jwt.decode") as decode_mock:
+            principal = await auth_service.get_principal(token)
+        decode_mock.assert_not_called()
+        self.assertEqual(auth_service.token_cache.hits, hits + 1)
+        self.assertEqual(principal.id, self.user.id)
+
+    async def test_expired_token_is_not_served_from_cache(self):
+        token = await auth_service.create_access_token(data=auth_service.token_claims(self.user), expires_delta=1)
+        await auth_service.get_principal(token)
+        with patch("src.services.cache.time.monotonic", return_value=time.monotonic() + 5), \
+                patch("src.services.auth.jwt.decode", side_effect=JWTError) as decode_mock:
+            with self.assertRaises(HTTPException):
+                await auth_service.get_principal(token)
+        decode_mock.assert_called_once()
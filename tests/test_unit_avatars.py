@@ -0,0 +1,191 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fakeredis import aioredis
+from PIL import Image
+
+from src.conf import messages
+from src.services.avatars import (
+    AvatarUploads,
+    InvalidImage,
+    LocalStorage,
+    UploadTooLarge,
+    avatar_digest,
+    render_avatar,
+    spool_form_file,
+    spool_upload,
+)
+from starlette.datastructures import Headers
+
+
+async def chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+def make_image(size=(800, 600), mode="RGB", image_format="JPEG", color="red") -> io.BytesIO:
+    file = io.BytesIO()
+    Image.new(mode, size, color).save(file, image_format)
+    file.seek(0)
+    return file
+
+
+class TestAsyncSpoolUpload(unittest.IsolatedAsyncioTestCase):
+    async def test_spool(self):
+        spool = await spool_upload(chunks(b"abc", b"def"), max_bytes=6)
+        self.assertEqual(spool.read(), b"abcdef")
+
+    async def test_too_large(self):
+        with self.assertRaises(UploadTooLarge):
+            await spool_upload(chunks(b"abc", b"def"), max_bytes=5)
+
+
+def form_body(name: str, content: bytes) -> bytes:
+    return (
+        b'--bound\r\nContent-Disposition: form-data; name="' + name.encode() + b'"; filename="a.png"\r\n'
+        b"Content-Type: image/png\r\n\r\n" + content + b"\r\n--bound--\r\n"
+    )
+
+
+class TestAsyncSpoolFormFile(unittest.IsolatedAsyncioTestCase):
+    headers = Headers({"content-type": "multipart/form-data; boundary=bound"})
+
+    async def test_spool(self):
+        file = await spool_form_file(self.headers, chunks(form_body("file", b"abcdef")), max_bytes=6)
+        self.assertEqual(file.read(), b"abcdef")
+
+    async def test_other_field(self):
+        self.assertIsNone(await spool_form_file(self.headers, chunks(form_body("photo", b"abc")), max_bytes=6))
+
+    async def test_file_too_large(self):
+        with self.assertRaises(UploadTooLarge):
+            await spool_form_file(self.headers, chunks(form_body("file", b"abcdefg")), max_bytes=6)
+
+    async def test_body_cut_off_while_streaming(self):
+        read = []
+
+        async def endless():
+            yield b'--bound\r\nContent-Disposition: form-data; name="file"; filename="a.png"\r\n\r\n'
+            while True:
+                read.append(1)
+                yield b"x" * 1024
+
+        with self.assertRaises(UploadTooLarge):
+            await spool_form_file(self.headers, endless(), max_bytes=1024)
+        self.assertLess(len(read), 100)
+
+
+class TestRenderAvatar(unittest.TestCase):
+    def test_variants(self):
+        for image_format, signature in [("webp", b"RIFF"), ("jpeg", b"\xff\xd8")]:
+            variants = render_avatar(make_image((3000, 2000)), [250, 64], image_format, 85)
+            self.assertEqual(list(variants), [250, 64])
+            for size, data in variants.items():
+                self.assertTrue(data.startswith(signature))
+                with Image.open(io.BytesIO(data)) as image:
+                    self.assertEqual(image.size, (size, size))
+
+    def test_transparency(self):
+        source = make_image((300, 300), "RGBA", "PNG", (0, 0, 0, 0))
+        with Image.open(io.BytesIO(render_avatar(source, [250], "webp", 85)[250])) as image:
+            self.assertEqual(image.mode, "RGBA")
+        source.seek(0)
+        with Image.open(io.BytesIO(render_avatar(source, [250], "jpeg", 85)[250])) as image:
+            self.assertGreater(image.convert("L").getpixel((125, 125)), 240)
+
+    def test_invalid(self):
+        with self.assertRaises(InvalidImage):
+            render_avatar(io.BytesIO(b"not an image"), [250], "webp", 85)
+        with self.assertRaises(InvalidImage):
+            render_avatar(make_image((2000, 2000)), [250], "webp", 85, max_pixels=1_000_000)
+
+    def test_digest(self):
+        first = avatar_digest(make_image(), [250], "webp", 85)
+        self.assertEqual(first, avatar_digest(make_image(), [250], "webp", 85))
+        self.assertNotEqual(first, avatar_digest(make_image(), [250], "jpeg", 85))
+        self.assertNotEqual(first, avatar_digest(make_image(color="blue"), [250], "webp", 85))
+
+
+class TestLocalStorage(unittest.TestCase):
+    def test_save(self):
+        with tempfile.TemporaryDirectory() as directory:
+            storage = LocalStorage(directory, "/static/avatars/")
+            first = storage.save("user@example.com", b"first", "webp")
+            second = storage.save("user@example.com", b"second", "webp")
+            self.assertTrue(first.startswith("/static/avatars/"))
+            self.assertEqual(first.split("?")[0], second.split("?")[0])
+            self.assertNotEqual(first, second)
+            self.assertEqual(os.listdir(directory), [first.split("?")[0].rsplit("/", 1)[1]])
+
+
+class TestAsyncAvatarUploads(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.uploads = AvatarUploads(storage="local", workers=2, sizes=[250, 64], image_format="webp")
+        self.uploads.storage = LocalStorage(self.directory.name, "/static/avatars")
+        self.user = MagicMock(id=1, email="user@example.com", avatar="/old", avatar_hash=None)
+        repository_patcher = patch("src.services.avatars.repositories_users")
+        cache_patcher = patch("src.services.avatars.user_cache")
+        self.repository = repository_patcher.start()
+        self.repository.get_user_by_email = AsyncMock(return_value=self.user)
+        self.repository.update_avatar_url = AsyncMock(return_value=self.user)
+        self.cache = cache_patcher.start()
+        self.cache.set = AsyncMock()
+        self.addCleanup(repository_patcher.stop)
+        self.addCleanup(cache_patcher.stop)
+
+    async def upload(self, file) -> dict:
+        job = await self.uploads.submit(file, 1, "user@example.com", MagicMock())
+        self.assertEqual(job.status, "pending")
+        await self.uploads.stop()
+        return await self.uploads.get(job.id)
+
+    async def test_upload(self):
+        await self.uploads.start(aioredis.FakeRedis())
+        file = make_image()
+        done = await self.upload(file)
+        self.assertEqual(done.status, "done")
+        self.assertEqual(set(done.variants), {"250", "64"})
+        self.assertEqual(done.url, done.variants["250"])
+        self.assertTrue(file.closed)
+        update = self.repository.update_avatar_url.await_args
+        self.assertEqual(update.args[:2], ("user@example.com", done.url))
+        self.assertEqual(update.kwargs["avatar_hash"], avatar_digest(make_image(), [250, 64], "webp"))
+        self.cache.set.assert_awaited_once()
+        self.assertEqual(len(os.listdir(self.directory.name)), 2)
+
+    async def test_same_image_is_not_uploaded_again(self):
+        self.user.avatar_hash = avatar_digest(make_image(), [250, 64], "webp")
+        self.uploads.storage = MagicMock()
+        done = await self.upload(make_image())
+        self.assertEqual((done.status, done.url, done.detail), ("done", "/old", messages.AVATAR_UNCHANGED))
+        self.uploads.storage.save.assert_not_called()
+        self.repository.update_avatar_url.assert_not_awaited()
+
+    async def test_status_shared_through_redis(self):
+        client = aioredis.FakeRedis()
+        await self.uploads.start(client)
+        job = await self.uploads.submit(make_image(), 1, "user@example.com", MagicMock())
+        await self.uploads.stop()
+        other = AvatarUploads(storage="local")
+        await other.start(client)
+        self.assertEqual(await other.get(job.id), await self.uploads.get(job.id))
+        self.assertIsNone(await other.get("unknown"))
+
+    async def test_failed_upload(self):
+        self.uploads.storage = MagicMock()
+        self.uploads.storage.save.side_effect = OSError("storage is down")
+        with self.assertLogs("src.services.avatars", "ERROR"):
+            failed = await self.upload(make_image())
+        self.assertEqual((failed.status, failed.detail), ("failed", messages.AVATAR_UPLOAD_FAILED))
+        self.repository.update_avatar_url.assert_not_awaited()
+
+    async def test_invalid_image(self):
+        with self.assertLogs("src.services.avatars", "INFO"):
+            failed = await self.upload(io.BytesIO(b"not an image"))
+        self.assertEqual(failed.status, "failed")
+        self.assertEqual(os.listdir(self.directory.name), [])
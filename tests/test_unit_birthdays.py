@@ -0,0 +1,100 @@
+import asyncio
+import unittest
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fakeredis import aioredis
+from redis.exceptions import ConnectionError
+
+from src.database.models import Contact
+from src.services.birthdays import BirthdayCalendar, birthday_key
+
+
+class TestBirthdayKey(unittest.TestCase):
+    def test_month_and_day(self):
+        self.assertEqual(birthday_key(date(2000, 2, 29)), 229)
+        self.assertEqual(birthday_key(date(1990, 12, 31)), 1231)
+
+
+class TestAsyncBirthdayCalendar(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.calendar = BirthdayCalendar()
+        self.calendar.redis = aioredis.FakeRedis()
+        self.contact = Contact(id=5, user_id=1, birth_date=date(1990, 7, 4))
+
+    def make_db(self, *rows) -> AsyncMock:
+        db = AsyncMock()
+        db.execute.return_value.all = MagicMock(side_effect=[list(batch) for batch in rows])
+        return db
+
+    async def test_add_and_remove(self):
+        await self.calendar.add(self.contact, Contact(id=7, user_id=1, birth_date=date(1985, 1, 2)))
+        self.assertEqual(await self.calendar.redis.zrange("birthdays:1", 0, -1, withscores=True),
+                         [(b"7", 102.0), (b"5", 704.0)])
+        await self.calendar.remove(self.contact, Contact(id=7, user_id=1))
+        self.assertEqual(await self.calendar.redis.zcard("birthdays:1"), 0)
+        self.assertEqual(await self.calendar.redis.get("birthdays:1:version"), b"2")
+        self.assertGreater(await self.calendar.redis.ttl("birthdays:1:version"), 0)
+
+    async def test_writes_renew_the_expiry(self):
+        await self.calendar.rebuild(1, self.make_db([(5, 704)]))
+        self.assertGreater(await self.calendar.redis.ttl("birthdays:1"), 0)
+        await self.calendar.redis.persist("birthdays:1")
+        await self.calendar.add(Contact(id=6, user_id=1, birth_date=date(1990, 12, 25)))
+        self.assertGreater(await self.calendar.redis.ttl("birthdays:1"), 0)
+
+    async def test_without_redis(self):
+        self.calendar.redis = None
+        await self.calendar.add(self.contact)
+        self.assertIsNone(await self.calendar.upcoming_ids(1, [(101, 1231)], db=None))
+
+    async def test_missing_calendar_is_rebuilt(self):
+        db = self.make_db([(5, 704), (6, 1225)])
+        ids = await self.calendar.upcoming_ids(1, [(1220, 1231), (101, 710)], db)
+        self.assertEqual(ids, [6, 5])
+        self.assertEqual(await self.calendar.redis.zscore("birthdays:1", "-"), 0.0)
+
+    async def test_complete_calendar_is_trusted(self):
+        await self.calendar.redis.zadd("birthdays:1", {"5": 704, "-": 0})
+        db = AsyncMock()
+        self.assertEqual(await self.calendar.upcoming_ids(1, [(701, 710)], db), [5])
+        db.execute.assert_not_called()
+
+    async def test_rebuild_retries_after_a_concurrent_write(self):
+        db = self.make_db([(6, 1225)], [(5, 704), (6, 1225)])
+        added = Contact(id=5, user_id=1, birth_date=date(1990, 7, 4))
+
+        async def execute(stmt):
+            # The contact is created while the first rebuild reads the database
+            if db.execute.await_count == 1:
+                await self.calendar.add(added)
+            return db.execute.return_value
+
+        db.execute.side_effect = execute
+        self.assertEqual(await self.calendar.rebuild(1, db), 2)
+        self.assertEqual(db.execute.await_count, 2)
+        self.assertEqual(await self.calendar.redis.zscore("birthdays:1", "5"), 704.0)
+
+    async def test_redis_failure(self):
+        self.calendar.redis = MagicMock()
+        self.calendar.redis.pipeline.side_effect = ConnectionError("redis is down")
+        self.calendar.redis.delete = AsyncMock()
+        self.calendar.redis.zscore = AsyncMock(side_effect=ConnectionError("redis is down"))
+        with self.assertLogs("src.services.birthdays", "WARNING"):
+            await self.calendar.add(self.contact)
+            await self.calendar.remove(self.contact)
+            self.assertIsNone(await self.calendar.upcoming_ids(1, [(701, 710)], AsyncMock()))
+        self.calendar.redis.delete.assert_awaited_with("birthdays:1")
+
+    async def test_stale_calendar_expires_when_redis_fails(self):
+        self.calendar.ttl = 1
+        await self.calendar.rebuild(1, self.make_db([(5, 704)]))
+        down = ConnectionError("redis is down")
+        with patch.object(self.calendar.redis, "pipeline", side_effect=down), \
+                patch.object(self.calendar.redis, "delete", side_effect=down), \
+                self.assertLogs("src.services.birthdays", "WARNING"):
+            await self.calendar.add(Contact(id=5, user_id=1, birth_date=date(1990, 12, 25)))
+        self.assertEqual(await self.calendar.redis.zscore("birthdays:1", "5"), 704.0)
+        await asyncio.sleep(1.1)
+        db = self.make_db([(5, 1225)])
+        self.assertEqual(await self.calendar.upcoming_ids(1, [(1220, 1231)], db), [5])
@@ -0,0 +1,74 @@
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from src.database.models import Role
+from src.schemas.user import UserResponse
+from src.services.cache import CachedUser, LRUCache, UserCache, decode_user, encode_user
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.evictions, 1)
+
+    def test_expired_entry_is_a_miss(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        with patch("src.services.cache.time.monotonic", return_value=0):
+            cache.set("a", 1)
+        with patch("src.services.cache.time.monotonic", return_value=61):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.expirations, 1)
+        self.assertEqual(cache.misses, 1)
+
+
+class TestCachedUserCodec(unittest.TestCase):
+    def test_round_trip(self):
+        user = CachedUser(1, "test_user", "user@example.com", Role.admin, True, None, 0)
+        self.assertEqual(decode_user(encode_user(user)), user)
+
+    def test_user_response_from_cached_user(self):
+        user = CachedUser(1, "test_user", "user@example.com", Role.admin, True, None, 0)
+        response = UserResponse.model_validate(user)
+        self.assertEqual(response.email, user.email)
+        self.assertEqual(response.role, Role.admin)
+
+
+class TestAsyncUserCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.cache = UserCache(maxsize=10, ttl=60, redis_ttl=300)
+        self.cache.redis = AsyncMock()
+        self.user = CachedUser(1, "test_user", "user@example.com", Role.user, True, None, 0)
+
+    async def test_local_hit_skips_redis(self):
+        await self.cache.set("user@example.com", self.user)
+        result = await self.cache.get("user@example.com")
+        self.assertEqual(result, self.user)
+        self.cache.redis.get.assert_not_called()
+
+    async def test_redis_hit_fills_local_tier(self):
+        self.cache.redis.get.return_value = encode_user(self.user)
+        self.assertEqual(await self.cache.get("user@example.com"), self.user)
+        self.assertEqual(await self.cache.get("user@example.com"), self.user)
+        self.cache.redis.get.assert_awaited_once_with("user:v2:user@example.com")
+        self.assertEqual(self.cache.stats()["redis_hits"], 1)
+
+    async def test_invalidate_publishes(self):
+        await self.cache.set("user@example.com", self.user)
+        await self.cache.invalidate("user@example.com")
+        self.assertEqual(len(self.cache.local), 0)
+        self.cache.redis.delete.assert_awaited_once_with("user:v2:user@example.com")
+        self.cache.redis.publish.assert_awaited_once()
+
+    async def test_message_from_other_worker_drops_local_copy(self):
+        await self.cache.set("user@example.com", self.user)
+        self.cache._on_message(f"{self.cache.origin} 0 user@example.com".encode())
+        self.assertEqual(len(self.cache.local), 1)
+        self.cache._on_message(b"other-worker 0 user@example.com")
+        self.assertEqual(len(self.cache.local), 0)
+        self.assertEqual(self.cache.invalidations_received, 1)
@@ -0,0 +1,60 @@
+import csv
+import io
+import json
+import unittest
+from datetime import date
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.database.models import Base, Contact, User
+from src.services.contact_export import export_contacts
+from src.services.contact_import import ImportFormat
+
+
+class TestAsyncExportContacts(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with async_sessionmaker(self.engine, expire_on_commit=False)() as db:
+            users = [User(username=f"user{i}", email=f"user{i}@example.com", password="qwerty") for i in range(2)]
+            db.add_all(users)
+            await db.commit()
+            await db.execute(insert(Contact), [{
+                "first_name": f"first{i}", "last_name": "last", "email": f"contact{i}@example.com",
+                "phone": f"+1212555{i:04d}", "birth_date": date(1990, 1, 1 + i),
+                "info": "a, \"quoted\"\nnote" if i == 0 else None, "user_id": users[i % 2].id,
+            } for i in range(5)])
+            await db.commit()
+        self.user, self.other = users
+
+    async def asyncTearDown(self) -> None:
+        await self.engine.dispose()
+
+    async def export(self, export_format: ImportFormat, user: User) -> tuple[list[bytes], str]:
+        chunks = [chunk async for chunk in export_contacts(export_format, user, self.engine, batch_size=2)]
+        return chunks, b"".join(chunks).decode()
+
+    async def test_jsonl(self):
+        chunks, body = await self.export(ImportFormat.jsonl, self.user)
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual([record["email"] for record in records],
+                         ["contact0@example.com", "contact2@example.com", "contact4@example.com"])
+        self.assertEqual(records[0]["birth_date"], "1990-01-01")
+        self.assertEqual(records[0]["info"], "a, \"quoted\"\nnote")
+        self.assertIsNone(records[1]["info"])
+
+    async def test_csv(self):
+        _, body = await self.export(ImportFormat.csv, self.other)
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([row["email"] for row in rows], ["contact1@example.com", "contact3@example.com"])
+        self.assertEqual(rows[0]["birth_date"], "1990-01-02")
+        self.assertEqual(rows[0]["info"], "")
+
+    async def test_no_contacts(self):
+        _, body = await self.export(ImportFormat.csv, User(id=999))
+        self.assertEqual(body, "id,first_name,last_name,email,phone,birth_date,info\n")
+        _, body = await self.export(ImportFormat.jsonl, User(id=999))
+        self.assertEqual(body, "")
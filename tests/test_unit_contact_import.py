@@ -0,0 +1,94 @@
+import csv
+import io
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from src.database.models import Contact, User
+from src.services.contact_import import (
+    ImportFormat, ends_quoted, import_contacts, iter_csv_records, iter_jsonl_records, iter_lines,
+)
+
+
+async def stream(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+async def collect(iterator) -> list:
+    return [item async for item in iterator]
+
+
+class TestAsyncImportParsing(unittest.IsolatedAsyncioTestCase):
+    async def test_lines_split_across_chunks(self):
+        data = "﻿name\r\nОлена\nlast".encode()
+        chunks = [data[i:i + 3] for i in range(0, len(data), 3)]
+        self.assertEqual(await collect(iter_lines(stream(*chunks))), ["name", "Олена", "last"])
+
+    async def test_line_without_line_break(self):
+        body = [b"x" * 1000] * 100 + [b"\rend\nnext\r\n"]
+        self.assertEqual(await collect(iter_lines(stream(*body), max_length=2000)), [None, "next"])
+        self.assertEqual(await collect(iter_lines(stream(*body[:3]), max_length=2000)), [None])
+
+    async def test_csv_records(self):
+        lines = stream(b'first_name,last_name,info\n', b'a,b,"two\nlines"\n', b'\n', b'c,,\n', b'd,e,f,g\n')
+        records = await collect(iter_csv_records(iter_lines(lines)))
+        self.assertEqual(records, [
+            (1, {"first_name": "a", "last_name": "b", "info": "two\nlines"}, None),
+            (2, {"first_name": "c"}, None),
+            (3, None, "Expected 3 columns, got 4"),
+        ])
+
+    async def test_csv_quote_inside_unquoted_field(self):
+        rows = [b'first_name,last_name,info\n', b'Shaquille,O"Neal,x\n']
+        rows += [b'a%d,"b, ""quoted""",c\n' % i for i in range(3)]
+        records = await collect(iter_csv_records(iter_lines(stream(*rows))))
+        self.assertEqual(records[0], (1, {"first_name": "Shaquille", "last_name": 'O"Neal', "info": "x"}, None))
+        self.assertEqual([record[1]["last_name"] for record in records[1:]], ['b, "quoted"'] * 3)
+
+    async def test_csv_record_too_long(self):
+        rows = [b'name,info\n', b'a,"never\n', b'closed\n', b'b,c\n', b'd,"open']
+        records = await collect(iter_csv_records(iter_lines(stream(*rows)), max_length=12))
+        self.assertEqual(records, [
+            (1, None, "Record longer than 12 characters"),
+            (2, {"name": "b", "info": "c"}, None),
+            (3, None, "Unterminated quoted field"),
+        ])
+
+    async def test_csv_line_too_long(self):
+        rows = [b'name,info\n', b'a,"open\n', b'x' * 100, b'\n', b'b,c\n']
+        records = await collect(iter_csv_records(iter_lines(stream(*rows), max_length=50), max_length=50))
+        self.assertEqual(records, [(1, None, "Record longer than 50 characters"), (2, {"name": "b", "info": "c"}, None)])
+
+    async def test_jsonl_line_too_long(self):
+        rows = [b'{"a": "' + b'x' * 100, b'"}\n', b'\n', b'{"b": 1}']
+        records = await collect(iter_jsonl_records(iter_lines(stream(*rows), max_length=50), max_length=50))
+        self.assertEqual(records, [(1, None, "Record longer than 50 characters"), (2, {"b": 1}, None)])
+
+    def test_ends_quoted_matches_csv(self):
+        for line in ['a,b', '"a', '"a""', '"a"",b', 'a"b,"c', '"a"x,"', '"",', '"a,b",c', ',"', 'x,"y""z"']:
+            rows = list(csv.reader(io.StringIO(line + "\nmore\n")))
+            self.assertEqual(ends_quoted(line, False), len(rows) == 1, line)
+
+
+class TestAsyncImportContacts(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        repository_patcher = patch("src.services.contact_import.one_contact", new_callable=AsyncMock)
+        self.repository = repository_patcher.start()
+        self.addCleanup(repository_patcher.stop)
+        self.user = User(id=1)
+
+    async def test_batches_and_errors(self):
+        self.repository.create_contacts.side_effect = lambda bodies, user, db: (
+            [Contact() for _ in bodies[1:]], {0: "Contact with this email or phone already exists"}
+        )
+        rows = [
+            b'{"first_name": "a", "last_name": "b", "email": "a%d@example.com", "phone": "+1212555%04d", '
+            b'"birth_date": "2000-01-01"}\n' % (i, i) for i in range(5)
+        ]
+        body = rows[:2] + [b'{"first_name": "no email"}\n', b'not json\n'] + rows[2:]
+        report = await import_contacts(stream(*body), ImportFormat.jsonl, self.user, db=None, batch_size=2)
+        self.assertEqual(self.repository.create_contacts.await_count, 3)
+        self.assertEqual(report["inserted"], 2)
+        self.assertEqual(report["failed"], 5)
+        self.assertEqual([error["row"] for error in report["errors"]], [1, 3, 4, 5, 7])
+        self.assertIn("email: Field required", report["errors"][1]["error"])
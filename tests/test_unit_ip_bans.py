@@ -0,0 +1,85 @@
+import os
+import random
+import tempfile
+import unittest
+from ipaddress import IPv4Address, IPv4Network, ip_address, ip_network
+from unittest.mock import AsyncMock
+
+from src.services.ip_bans import IpBanList, IpBanMiddleware, PrefixTree, packed_address, parse_rules
+
+
+class TestPrefixTree(unittest.TestCase):
+    def test_matches_linear_scan(self):
+        rng = random.Random(7)
+        networks = [IPv4Network((rng.getrandbits(32), rng.randint(1, 32)), strict=False) for _ in range(300)]
+        tree = PrefixTree()
+        for network in networks:
+            tree.insert(str(network))
+        addresses = [IPv4Address(rng.getrandbits(32)) for _ in range(2000)]
+        addresses += [network.network_address for network in networks]
+        addresses += [network.broadcast_address for network in networks]
+        for address in addresses:
+            self.assertEqual(address.packed in tree, any(address in network for network in networks), address)
+
+    def test_rules(self):
+        tree = parse_rules([
+            "# comment", "", "203.0.113.7", "10.0.0.0/8", "10.1.0.0/16  # covered", "172.16.0.0/12",
+            "2001:db8::/32", "2001:db8::1", "not an address",
+        ])
+        self.assertEqual(tree.rules, 6)
+        for host, banned in [
+            ("203.0.113.7", True), ("203.0.113.8", False), ("10.255.1.1", True), ("11.0.0.1", False),
+            ("172.31.255.255", True), ("172.32.0.0", False), ("2001:db8:ffff::1", True),
+            ("2001:db9::1", False), ("::ffff:10.0.0.1", True),
+        ]:
+            self.assertEqual(packed_address(host) in tree, banned, host)
+
+    def test_shorter_prefix_replaces_subtree(self):
+        tree = PrefixTree()
+        tree.insert("192.168.1.1")
+        tree.insert("192.168.0.0/16")
+        self.assertIs(tree.roots[4][192][168], True)
+        tree.insert("::/0")
+        self.assertIn(ip_address("2001:db8::1").packed, tree)
+        self.assertNotIn(ip_network("8.8.8.8").network_address.packed, tree)
+
+
+class TestAsyncIpBanList(unittest.IsolatedAsyncioTestCase):
+    async def test_reload_from_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bans.txt")
+            bans = IpBanList(path=path)
+            self.assertFalse(await bans.reload())
+            with open(path, "w") as file:
+                file.write("198.51.100.0/24\n")
+            self.assertTrue(await bans.reload())
+            self.assertTrue(bans.is_banned("198.51.100.9"))
+            self.assertFalse(await bans.reload())
+            os.remove(path)
+            self.assertTrue(await bans.reload())
+            self.assertFalse(bans.is_banned("198.51.100.9"))
+
+    async def test_reload_from_redis(self):
+        bans = IpBanList(path=None, key="bans")
+        bans.redis = AsyncMock()
+        bans.redis.get.return_value = b"1"
+        bans.redis.smembers.return_value = {b"198.51.100.7", b"2001:db8::/48"}
+        self.assertTrue(await bans.reload())
+        self.assertTrue(bans.is_banned("2001:db8:0:1::1"))
+        self.assertFalse(await bans.reload())
+        bans.redis.get.assert_awaited_with("bans:version")
+        self.assertFalse(bans.is_banned("testclient"))
+
+    async def test_middleware(self):
+        bans = IpBanList(path=None)
+        bans.tree = parse_rules(["198.51.100.7"])
+        app = AsyncMock()
+        middleware = IpBanMiddleware(app, bans)
+        send = AsyncMock()
+        scope = {"type": "http", "path": "/", "headers": [], "client": ("198.51.100.7", 1234)}
+        await middleware(scope, AsyncMock(), send)
+        app.assert_not_awaited()
+        self.assertEqual(send.await_args_list[0].args[0]["status"], 403)
+        await middleware({**scope, "client": ("198.51.100.8", 1234)}, AsyncMock(), send)
+        await middleware({"type": "lifespan"}, AsyncMock(), send)
+        self.assertEqual(app.await_count, 2)
@@ -0,0 +1,98 @@
+import unittest
+from datetime import date, timedelta
+from unittest.mock import AsyncMock, patch
+
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.database.models import Base, Contact, User
+from src.repository import contacts as repository_contacts
+from src.repository import full_access as repository_full_access
+from src.repository import one_contact as repository_one_contact
+from src.schemas.contacts import ContactBase, ContactResponse, ContactResponseAdmin
+
+
+class TestQueryCounts(unittest.IsolatedAsyncioTestCase):
+    """
+    Counts the statements each endpoint's repository call sends and checks which of them read the users
+    table: none of the user-scoped ones, and a single separate SELECT for the admin listings.
+    """
+
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)()
+        users = [User(username=f"user{i}", email=f"user{i}@example.com", password="qwerty") for i in range(2)]
+        self.session.add_all(users)
+        await self.session.commit()
+        await self.session.execute(insert(Contact), [{
+            "first_name": f"first{i}", "last_name": f"last{i}", "email": f"contact{i}@example.com",
+            "phone": f"+1212555{i:04d}", "birth_date": date.today() + timedelta(days=i % 5),
+            "user_id": users[i % 2].id,
+        } for i in range(20)])
+        await self.session.commit()
+        self.user = users[0]
+
+        for module in (repository_contacts, repository_one_contact):
+            patcher = patch(f"{module.__name__}.birthday_calendar", new_callable=AsyncMock)
+            patcher.start().upcoming_ids.return_value = None
+            self.addCleanup(patcher.stop)
+
+        self.statements = []
+        event.listen(self.engine.sync_engine, "before_cursor_execute", self._record)
+
+    async def asyncTearDown(self) -> None:
+        await self.session.close()
+        await self.engine.dispose()
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if not statement.startswith(("SAVEPOINT", "RELEASE")):
+            self.statements.append(statement)
+
+    async def run_call(self, call):
+        self.session.expunge_all()
+        self.statements.clear()
+        return await call()
+
+    async def test_user_scoped_queries_skip_users(self):
+        body = ContactBase(first_name="new", last_name="name", email="new@example.com", phone="12123456789",
+                           birth_date=date(1991, 2, 3), info="info")
+        calls = {
+            "get_contacts": (1, lambda: repository_contacts.get_contacts(0, 100, self.user, self.session)),
+            "get_contacts_page": (1, lambda: repository_contacts.get_contacts_page(5, self.user, self.session)),
+            "search_contacts": (1, lambda: repository_contacts.search_contacts("last1", self.user, self.session)),
+            "get_upcoming_birthdays_contacts": (1, lambda: repository_contacts.get_upcoming_birthdays_contacts(
+                self.user, self.session)),
+            "get_contact": (1, lambda: repository_one_contact.get_contact(1, self.user, self.session)),
+            "get_contact_by_email": (1, lambda: repository_one_contact.get_contact_by_email(
+                "contact2@example.com", self.user, self.session)),
+            "create_contact": (2, lambda: repository_one_contact.create_contact(body, self.user, self.session)),
+            "patch_contact": (1, lambda: repository_one_contact.patch_contact(
+                3, {"info": "note"}, self.user, self.session)),
+            "remove_contact": (1, lambda: repository_one_contact.remove_contact(5, self.user, self.session)),
+        }
+        for name, (expected, call) in calls.items():
+            with self.subTest(name):
+                result = await self.run_call(call)
+                self.assertEqual(len(self.statements), expected, self.statements)
+                self.assertFalse([statement for statement in self.statements if "users" in statement])
+                contacts = result[0] if isinstance(result, tuple) else result
+                for contact in contacts if isinstance(contacts, list) else [contacts]:
+                    ContactResponse.model_validate(contact)
+
+    async def test_admin_listings_select_users_once(self):
+        calls = {
+            "get_all_contacts": lambda: repository_full_access.get_all_contacts(0, 100, self.session),
+            "get_all_contacts_page": lambda: repository_full_access.get_all_contacts_page(100, self.session),
+        }
+        for name, call in calls.items():
+            with self.subTest(name):
+                result = await self.run_call(call)
+                self.assertEqual(len(self.statements), 2, self.statements)
+                self.assertNotIn("users", self.statements[0])
+                self.assertTrue(self.statements[1].lstrip().startswith("SELECT users."), self.statements[1])
+                contacts = result[0] if isinstance(result, tuple) else result
+                self.assertEqual(len(contacts), 20)
+                for contact in contacts:
+                    self.assertEqual(ContactResponseAdmin.model_validate(contact).user.id, contact.user_id)
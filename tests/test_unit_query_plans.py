@@ -0,0 +1,147 @@
+import json
+import os
+import unittest
+from datetime import date, timedelta
+from unittest.mock import AsyncMock, patch
+
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.database.models import Base, Contact, User
+from src.repository import contacts as repository_contacts
+from src.repository import one_contact as repository_one_contact
+from src.repository.pagination import ContactOrder
+from src.schemas.contacts import ContactBase
+
+# Point it at a scratch PostgreSQL database to check the production plans, the tables are recreated
+QUERY_PLAN_DB_URL = os.environ.get("QUERY_PLAN_DB_URL", "sqlite+aiosqlite://")
+
+USERS = 3
+CONTACTS_PER_USER = 300
+
+
+def sqlite_full_scans(rows) -> list[str]:
+    # Virtual tables (the FTS5 index) are always reported as SCAN
+    return [row[3] for row in rows if row[3].startswith("SCAN ") and "VIRTUAL TABLE" not in row[3]]
+
+
+def postgresql_full_scans(rows) -> list[str]:
+    plan = rows[0][0]
+    nodes = [json.loads(plan)[0]["Plan"] if isinstance(plan, str) else plan[0]["Plan"]]
+    scans = []
+    while nodes:
+        node = nodes.pop()
+        if node["Node Type"] == "Seq Scan":
+            scans.append(f"Seq Scan on {node['Relation Name']}")
+        nodes.extend(node.get("Plans", []))
+    return scans
+
+
+class TestQueryPlans(unittest.IsolatedAsyncioTestCase):
+    """
+    Runs every per-user repository query against a seeded database and fails when the plan of
+    any statement it sends reads a whole table instead of an index range.
+    """
+
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine(QUERY_PLAN_DB_URL)
+        self.dialect = self.engine.dialect.name
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)()
+        users = [User(username=f"user{i}", email=f"user{i}@example.com", password="qwerty") for i in range(USERS)]
+        self.session.add_all(users)
+        await self.session.commit()
+        await self.session.execute(insert(Contact), [{
+            "first_name": f"first{i}", "last_name": f"last{i % 50}", "email": f"contact{i}@example.com",
+            "phone": f"+{i:012d}", "birth_date": date(1990, 1, 1) + timedelta(days=i % 365),
+            "user_id": users[i % USERS].id,
+        } for i in range(USERS * CONTACTS_PER_USER)])
+        await self.session.commit()
+        self.user = users[0]
+
+        calendar_patchers = [patch(f"{module.__name__}.birthday_calendar", new_callable=AsyncMock)
+                             for module in (repository_contacts, repository_one_contact)]
+        for patcher in calendar_patchers:
+            patcher.start().upcoming_ids.return_value = None
+            self.addCleanup(patcher.stop)
+
+        self.statements = []
+        event.listen(self.engine.sync_engine, "before_cursor_execute", self._record)
+
+    async def asyncTearDown(self) -> None:
+        await self.session.close()
+        await self.engine.dispose()
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            self.statements.append((statement, parameters))
+
+    async def full_scans(self, statement: str, parameters) -> list[str]:
+        async with self.engine.connect() as conn:
+            if self.dialect == "postgresql":
+                # Small tables are cheaper to read whole, so only fail when no index could be used at all
+                await conn.exec_driver_sql("SET enable_seqscan = off")
+                result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+                return postgresql_full_scans(result.all())
+            result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            return sqlite_full_scans(result.all())
+
+    @staticmethod
+    async def consume(batches) -> None:
+        async for _ in batches:
+            pass
+
+    async def assertIndexed(self, call) -> None:
+        self.statements.clear()
+        await call()
+        event.remove(self.engine.sync_engine, "before_cursor_execute", self._record)
+        try:
+            self.assertTrue(self.statements)
+            for statement, parameters in self.statements:
+                self.assertEqual(await self.full_scans(statement, parameters), [], statement)
+        finally:
+            event.listen(self.engine.sync_engine, "before_cursor_execute", self._record)
+
+    async def test_contacts_queries(self):
+        _, cursor = await repository_contacts.get_contacts_page(10, self.user, self.session)
+        _, name_cursor = await repository_contacts.get_contacts_page(10, self.user, self.session,
+                                                                     order=ContactOrder.last_name)
+        calls = {
+            "get_contacts": lambda: repository_contacts.get_contacts(100, 10, self.user, self.session),
+            "get_contacts_page": lambda: repository_contacts.get_contacts_page(10, self.user, self.session, cursor),
+            "get_contacts_page last_name": lambda: repository_contacts.get_contacts_page(
+                10, self.user, self.session, name_cursor, ContactOrder.last_name),
+            "search_contacts": lambda: repository_contacts.search_contacts("last4", self.user, self.session),
+            "search_contacts short": lambda: repository_contacts.search_contacts("t4", self.user, self.session),
+            "get_upcoming_birthdays_contacts": lambda: repository_contacts.get_upcoming_birthdays_contacts(
+                self.user, self.session, 30),
+            "stream_contacts": lambda: self.consume(repository_contacts.stream_contacts(self.user, self.session, 100)),
+        }
+        for name, call in calls.items():
+            with self.subTest(name):
+                await self.assertIndexed(call)
+
+    async def test_one_contact_queries(self):
+        contact = (await repository_contacts.get_contacts(0, 1, self.user, self.session))[0]
+        body = ContactBase(first_name="new", last_name="name", email="new@example.com", phone="12123456789",
+                           birth_date=date(1991, 2, 3), info="info")
+        calls = {
+            "get_contact": lambda: repository_one_contact.get_contact(contact.id, self.user, self.session),
+            "get_contact_by_email": lambda: repository_one_contact.get_contact_by_email(
+                contact.email, self.user, self.session),
+            "update_contact": lambda: repository_one_contact.update_contact(contact.id, body, self.user, self.session),
+            "update_name": lambda: repository_one_contact.update_name(contact.id, "a", self.user, self.session),
+            "update_last_name": lambda: repository_one_contact.update_last_name(
+                contact.id, "b", self.user, self.session),
+            "update_email": lambda: repository_one_contact.update_email(
+                contact.id, "c@example.com", self.user, self.session),
+            "update_phone": lambda: repository_one_contact.update_phone(
+                contact.id, "+381111111111", self.user, self.session),
+            "update_info": lambda: repository_one_contact.update_info(contact.id, "d", self.user, self.session),
+            "remove_contact": lambda: repository_one_contact.remove_contact(contact.id, self.user, self.session),
+        }
+        for name, call in calls.items():
+            with self.subTest(name):
+                await self.assertIndexed(call)
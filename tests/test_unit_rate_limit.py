@@ -0,0 +1,90 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fakeredis import aioredis
+from fastapi import HTTPException
+
+from src.database.models import Role
+from src.services.auth import Principal
+from src.services.rate_limit import MemoryBackend, Policy, RateLimiter, RedisBackend
+
+
+def make_request(method: str = "GET", path: str = "/api/contacts/", token: str | None = None,
+                 host: str = "10.0.0.1") -> MagicMock:
+    request = MagicMock()
+    request.method = method
+    request.scope = {"route": MagicMock(path=path)}
+    request.headers = {"authorization": f"Bearer {token}"} if token else {}
+    request.client.host = host
+    return request
+
+
+class TestAsyncTokenBucket(unittest.IsolatedAsyncioTestCase):
+    async def test_memory_backend(self):
+        now = [0.0]
+        backend = MemoryBackend(clock=lambda: now[0])
+        policy = Policy.parse("2/10")
+        self.assertEqual([await backend.take("k", policy) for _ in range(3)], [0.0, 0.0, 5.0])
+        now[0] = 5.0
+        self.assertEqual(await backend.take("k", policy), 0.0)
+        self.assertEqual(await backend.take("k", policy), 5.0)
+
+    async def test_redis_backend(self):
+        backend = RedisBackend(aioredis.FakeRedis())
+        policy = Policy.parse("2/20")
+        waits = [await backend.take("k", policy) for _ in range(3)]
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 10.0, places=1)
+        self.assertEqual(await backend.take("other", policy), 0.0)
+
+
+class TestAsyncRateLimiter(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.limiter = RateLimiter(default="2/60", routes={"GET /api/users/me": "1/20"}, users={"7": "5/60"})
+        auth_patcher = patch("src.services.rate_limit.auth_service")
+        self.auth = auth_patcher.start()
+        self.addCleanup(auth_patcher.stop)
+        self.auth.principal_from_token.return_value = Principal(7, "user@example.com", Role.user, 0)
+
+    async def allowed(self, request, times: int) -> list[bool]:
+        results = []
+        for _ in range(times):
+            try:
+                await self.limiter(request)
+                results.append(True)
+            except HTTPException as err:
+                self.assertEqual(err.status_code, 429)
+                self.assertGreaterEqual(int(err.headers["Retry-After"]), 1)
+                results.append(False)
+        return results
+
+    async def test_policies(self):
+        self.assertEqual(await self.allowed(make_request(), 3), [True, True, False])
+        self.assertEqual(await self.allowed(make_request(host="10.0.0.2"), 1), [True])
+        self.assertEqual(await self.allowed(make_request(path="/api/users/me"), 2), [True, False])
+        self.assertEqual(await self.allowed(make_request(token="token"), 6), [True] * 5 + [False])
+        self.assertEqual(await self.allowed(make_request(path="/api/users/me", token="token"), 2), [True, False])
+
+    async def test_invalid_token_counts_by_address(self):
+        for error in [HTTPException(status_code=401), KeyError("scope")]:
+            self.auth.principal_from_token.side_effect = error
+            host = f"10.0.1.{len(str(error))}"
+            self.assertEqual(await self.allowed(make_request(token="bad", host=host), 3), [True, True, False])
+
+    async def test_local_pre_check(self):
+        self.limiter.backend = AsyncMock()
+        self.limiter.backend.take.side_effect = [0.0, 30.0]
+        self.assertEqual(await self.allowed(make_request(), 5), [True, False, False, False, False])
+        self.assertEqual(self.limiter.backend.take.await_count, 2)
+        self.assertEqual(self.limiter.rejected_locally, 3)
+
+    async def test_backend_failure_lets_requests_through(self):
+        self.limiter.backend = AsyncMock()
+        self.limiter.backend.take.side_effect = ConnectionError("redis is down")
+        with self.assertLogs("src.services.rate_limit", "WARNING"):
+            self.assertEqual(await self.allowed(make_request(), 3), [True, True, True])
+
+    async def test_no_default(self):
+        limiter = RateLimiter(default=None, routes={}, users={})
+        for _ in range(10):
+            await limiter(make_request())
@@ -1,22 +1,29 @@
 import unittest
-from unittest.mock import MagicMock, AsyncMock
+from unittest.mock import MagicMock, AsyncMock, patch
 
 from datetime import date, timedelta
-from sqlalchemy.orm import Session
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
-from src.schemas.contacts import ContactResponse, ContactBase
+from src.conf import messages
+from src.schemas.contacts import ContactBatch, ContactResponse, ContactBase
 from src.schemas.user import UserBase, UserResponse
-from src.database.models import User, Contact
+from src.database.models import Base, User, Contact
 from src.repository.contacts import (
     get_contacts,
     search_contacts,
     get_upcoming_birthdays_contacts,
+    get_contacts_page,
 )
 from src.repository.full_access import get_all_contacts
+from src.repository.search import like_pattern, search_stmt
+from src.repository.pagination import ContactOrder, InvalidCursor, decode_cursor, encode_cursor
 from src.repository.one_contact import (
     get_contact,
     get_contact_by_email,
     create_contact,
+    create_contacts,
     update_contact,
     update_email,
     update_info,
@@ -24,6 +31,8 @@ from src.repository.one_contact import (
     update_name,
     update_phone,
     remove_contact,
+    remove_contacts,
+    apply_batch,
 )
 from src.repository.users import (
     get_user_by_email,
@@ -37,45 +46,149 @@ from src.repository.users import (
 class TestAsyncContacts(unittest.IsolatedAsyncioTestCase):
     def setUp(self) -> None:
         self.user = User(id=1, username="test_user", password="qwerty", confirmed=True)
-        self.session = MagicMock(spec=Session)
+        self.session = AsyncMock(spec=AsyncSession)
 
     async def test_get_contacts(self):
         contacts = [Contact(), Contact(), Contact()]
-        self.session.query().filter().offset().limit().all.return_value = contacts
+        mocked_contacts = MagicMock()
+        mocked_contacts.scalars.return_value.all.return_value = contacts
+        self.session.execute.return_value = mocked_contacts
         result = await get_contacts(skip=0, limit=10, user=self.user, db=self.session)
         self.assertEqual(result, contacts)
 
     async def test_search_contacts(self):
         contacts = [Contact(), Contact(), Contact()]
-        self.session.query().filter().all.return_value = contacts
+        mocked_contacts = MagicMock()
+        mocked_contacts.scalars.return_value.all.return_value = contacts
+        self.session.execute.return_value = mocked_contacts
         result = await search_contacts(query="query", user=self.user, db=self.session)
         self.assertEqual(result, contacts)
 
-    async def test_get_upcoming_birthdays_contacts(self):
-        contacts = [
-            Contact(birth_date=date.today() + timedelta(days=3)),
-            Contact(birth_date=date.today() + timedelta(days=10)),
-        ]
-        self.session.query().filter().all.return_value = contacts
-        result = await get_upcoming_birthdays_contacts(user=self.user, db=self.session)
-        self.assertEqual(len(result), 1)
-        self.assertEqual(result[0].birth_date, date.today() + timedelta(days=3))
+    def test_search_stmt(self):
+        self.assertEqual(like_pattern("50%_a\\"), "%50\\%\\_a\\\\%")
+        stmt = search_stmt(select(Contact), "smith", "sqlite")
+        self.assertIn("contacts_fts MATCH", str(stmt))
+        stmt = search_stmt(select(Contact), "sm", "sqlite")
+        self.assertNotIn("contacts_fts", str(stmt))
+        stmt = search_stmt(select(Contact), "smith", "postgresql")
+        self.assertIn("word_similarity", str(stmt))
 
     async def test_get_all_contacts(self):
         contacts = [Contact(), Contact(), Contact()]
-        self.session.query().offset().limit().all.return_value = contacts
+        mocked_contacts = MagicMock()
+        mocked_contacts.scalars.return_value.all.return_value = contacts
+        self.session.execute.return_value = mocked_contacts
         result = await get_all_contacts(skip=0, limit=10, db=self.session)
         self.assertEqual(result, contacts)
 
+    async def test_get_contacts_page(self):
+        contacts = [Contact(id=1, last_name="a"), Contact(id=2, last_name="b"), Contact(id=3, last_name="c")]
+        mocked_contacts = MagicMock()
+        mocked_contacts.scalars.return_value.all.return_value = contacts
+        self.session.execute.return_value = mocked_contacts
+        result, next_cursor = await get_contacts_page(limit=2, user=self.user, db=self.session,
+                                                      order=ContactOrder.last_name)
+        self.assertEqual(result, contacts[:2])
+        self.assertEqual(decode_cursor(ContactOrder.last_name, next_cursor), ["b", 2])
+
+    async def test_get_contacts_last_page(self):
+        contacts = [Contact(id=3)]
+        mocked_contacts = MagicMock()
+        mocked_contacts.scalars.return_value.all.return_value = contacts
+        self.session.execute.return_value = mocked_contacts
+        cursor = encode_cursor(ContactOrder.id, Contact(id=2))
+        result, next_cursor = await get_contacts_page(limit=2, user=self.user, db=self.session, cursor=cursor)
+        self.assertEqual(result, contacts)
+        self.assertIsNone(next_cursor)
+
+    async def test_get_contacts_page_invalid_cursor(self):
+        cursor = encode_cursor(ContactOrder.id, Contact(id=2))
+        with self.assertRaises(InvalidCursor):
+            await get_contacts_page(limit=2, user=self.user, db=self.session, cursor=cursor,
+                                    order=ContactOrder.last_name)
+        with self.assertRaises(InvalidCursor):
+            await get_contacts_page(limit=2, user=self.user, db=self.session, cursor="not a cursor")
+        self.session.execute.assert_not_called()
+
+
+class FixedDate(date):
+    today_value = date(2027, 12, 28)
+
+    @classmethod
+    def today(cls):
+        return cls.today_value
+
+
+class TestAsyncUpcomingBirthdays(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)()
+        self.user = User(username="test_user", email="user@example.com", password="qwerty")
+        self.session.add(self.user)
+        births = [date(1990, 12, 30), date(1985, 1, 2), date(2000, 2, 29), date(1970, 6, 15)]
+        self.session.add_all(
+            Contact(first_name=f"name{i}", last_name="last", email=f"{i}@example.com", phone=str(i),
+                    birth_date=birth, user=self.user)
+            for i, birth in enumerate(births)
+        )
+        await self.session.commit()
+        calendar_patcher = patch("src.repository.contacts.birthday_calendar", new_callable=AsyncMock)
+        self.calendar = calendar_patcher.start()
+        self.addCleanup(calendar_patcher.stop)
+        self.calendar.upcoming_ids.return_value = None
+
+    async def asyncTearDown(self) -> None:
+        await self.session.close()
+        await self.engine.dispose()
+
+    async def upcoming(self, today: date, days: int = 7) -> list:
+        with patch.object(FixedDate, "today_value", today), patch("src.repository.contacts.date", FixedDate):
+            contacts = await get_upcoming_birthdays_contacts(user=self.user, db=self.session, days=days)
+        return [contact.birth_date for contact in contacts]
+
+    async def test_window_wraps_around_new_year(self):
+        result = await self.upcoming(date(2027, 12, 28))
+        self.assertEqual(result, [date(1990, 12, 30), date(1985, 1, 2)])
+
+    async def test_february_29_in_non_leap_year(self):
+        result = await self.upcoming(date(2027, 2, 25))
+        self.assertEqual(result, [date(2000, 2, 29)])
+
+    async def test_configurable_window(self):
+        self.assertEqual(await self.upcoming(date(2027, 6, 1)), [])
+        result = await self.upcoming(date(2027, 6, 1), days=365)
+        self.assertEqual(result, [date(1970, 6, 15), date(1990, 12, 30), date(1985, 1, 2), date(2000, 2, 29)])
+
+    async def test_ids_from_calendar(self):
+        self.calendar.upcoming_ids.return_value = [2, 1]
+        result = await self.upcoming(date(2027, 12, 28))
+        self.assertEqual(result, [date(1990, 12, 30), date(1985, 1, 2)])
+        self.calendar.upcoming_ids.assert_awaited_once_with(self.user.id, [(1228, 1231), (101, 104)], self.session)
+
 
 class TestAsyncContact(unittest.IsolatedAsyncioTestCase):
     def setUp(self) -> None:
+        calendar_patcher = patch("src.repository.one_contact.birthday_calendar", new_callable=AsyncMock)
+        self.calendar = calendar_patcher.start()
+        self.addCleanup(calendar_patcher.stop)
         self.user = User(id=1, username="test_user", password="qwerty", confirmed=True)
-        self.session = MagicMock(spec=Session)
+        self.session = AsyncMock(spec=AsyncSession)
+
+    def assertSingleUpdate(self, **values):
+        self.session.execute.assert_awaited_once()
+        stmt = self.session.execute.await_args.args[0]
+        self.assertTrue(stmt.is_update)
+        self.assertTrue(stmt._returning)
+        params = stmt.compile().params
+        self.assertEqual({key: params[key] for key in values}, values)
 
     async def test_get_contact(self):
         contact = Contact()
-        self.session.query().filter().first.return_value = contact
+        mocked_contact = MagicMock()
+        mocked_contact.scalar_one_or_none.return_value = contact
+        self.session.execute.return_value = mocked_contact
         result = await get_contact(
             contact_id=contact.id, user=self.user, db=self.session
         )
@@ -90,7 +203,9 @@ class TestAsyncContact(unittest.IsolatedAsyncioTestCase):
             birth_date="2010-04-23",
             info="test",
         )
-        self.session.query().filter().first.return_value = contact
+        mocked_contact = MagicMock()
+        mocked_contact.scalars.return_value.first.return_value = contact
+        self.session.execute.return_value = mocked_contact
         result = await get_contact_by_email(
             contact_email="user@example.com", user=self.user, db=self.session
         )
@@ -113,6 +228,36 @@ class TestAsyncContact(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result.phone, body.phone)
         self.assertEqual(result.birth_date, body.birth_date)
         self.assertEqual(result.info, body.info)
+        self.calendar.add.assert_awaited_once_with(result)
+
+    async def test_create_contacts(self):
+        bodies = [
+            {"first_name": "a", "email": "a@example.com", "phone": "+1"},
+            {"first_name": "b", "email": "b@example.com", "phone": "+2"},
+            {"first_name": "c", "email": "a@example.com", "phone": "+3"},
+            {"first_name": "d", "email": "taken@example.com", "phone": "+4"},
+        ]
+        taken = MagicMock()
+        taken.all.return_value = [("taken@example.com", "+9")]
+        self.session.execute.return_value = taken
+        created = [Contact(id=1), Contact(id=2)]
+        self.session.scalars.return_value = MagicMock(all=MagicMock(return_value=created))
+        contacts, failures = await create_contacts(bodies, self.user, self.session)
+        self.assertEqual(contacts, created)
+        self.assertEqual(failures, {2: messages.CONTACT_EXISTS, 3: messages.CONTACT_EXISTS})
+        rows = self.session.scalars.await_args.args[1]
+        self.assertEqual([row["first_name"] for row in rows], ["a", "b"])
+        self.calendar.add.assert_awaited_once_with(*created)
+
+    async def test_create_contacts_race(self):
+        bodies = [{"email": "a@example.com", "phone": "+1"}, {"email": "b@example.com", "phone": "+2"}]
+        self.session.execute.return_value = MagicMock(all=MagicMock(return_value=[]))
+        self.session.scalars.side_effect = IntegrityError("INSERT", {}, Exception())
+        contact = Contact(id=2)
+        self.session.scalar.side_effect = [IntegrityError("INSERT", {}, Exception()), contact]
+        contacts, failures = await create_contacts(bodies, self.user, self.session)
+        self.assertEqual(contacts, [contact])
+        self.assertEqual(failures, {0: messages.CONTACT_EXISTS})
 
     async def test_update_contact(self):
         contact = Contact()
@@ -124,78 +269,193 @@ class TestAsyncContact(unittest.IsolatedAsyncioTestCase):
             birth_date="2010-04-23",
             info="test",
         )
-        self.session.query().filter().first.return_value = contact
+        mocked_contact = MagicMock()
+        mocked_contact.scalar_one_or_none.return_value = contact
+        self.session.execute.return_value = mocked_contact
         result = await update_contact(
             contact_id=contact.id, body=body, user=self.user, db=self.session
         )
         self.assertEqual(result, contact)
+        self.assertSingleUpdate(**body.model_dump())
+        self.calendar.add.assert_awaited_once_with(contact)
 
     async def test_update_name(self):
-        contact = Contact()
         name = "test_test"
-        self.session.query().filter().first.return_value = contact
+        contact = Contact(id=1, first_name=name)
+        mocked_contact = MagicMock()
+        mocked_contact.scalar_one_or_none.return_value = contact
+        self.session.execute.return_value = mocked_contact
         result = await update_name(
             contact_id=contact.id, first_name=name, user=self.user, db=self.session
         )
         self.assertIsInstance(result, Contact)
-        self.assertEqual(result.first_name[0], name)
+        self.assertEqual(result.first_name, name)
+        self.assertSingleUpdate(first_name=name)
 
     async def test_update_last_name(self):
-        contact = Contact()
         last_name = "test_test"
-        self.session.query().filter().first.return_value = contact
+        contact = Contact(id=1, last_name=last_name)
+        mocked_contact = MagicMock()
+        mocked_contact.scalar_one_or_none.return_value = contact
+        self.session.execute.return_value = mocked_contact
         result = await update_last_name(
             contact_id=contact.id, last_name=last_name, user=self.user, db=self.session
         )
         self.assertIsInstance(result, Contact)
-        self.assertEqual(result.last_name[0], last_name)
+        self.assertEqual(result.last_name, last_name)
+        self.assertSingleUpdate(last_name=last_name)
 
     async def test_update_email(self):
-        contact = Contact()
         email = "test_email"
-        self.session.query().filter().first.return_value = contact
+        contact = Contact(id=1, email=email)
+        mocked_contact = MagicMock()
+        mocked_contact.scalar_one_or_none.return_value = contact
+        self.session.execute.return_value = mocked_contact
         result = await update_email(
             contact_id=contact.id, email=email, user=self.user, db=self.session
         )
         self.assertIsInstance(result, Contact)
-        self.assertEqual(result.email[0], email)
+        self.assertEqual(result.email, email)
+        self.assertSingleUpdate(email=email)
 
     async def test_update_phone(self):
-        contact = Contact()
         phone = "12123456789"
-        self.session.query().filter().first.return_value = contact
+        contact = Contact(id=1, phone=phone)
+        mocked_contact = MagicMock()
+        mocked_contact.scalar_one_or_none.return_value = contact
+        self.session.execute.return_value = mocked_contact
         result = await update_phone(
             contact_id=contact.id, phone=phone, user=self.user, db=self.session
         )
         self.assertIsInstance(result, Contact)
-        self.assertEqual(result.phone[0], phone)
+        self.assertEqual(result.phone, phone)
+        self.assertSingleUpdate(phone=phone)
 
     async def test_update_info(self):
-        contact = Contact()
         info = "test_info"
-        self.session.query().filter().first.return_value = contact
+        contact = Contact(id=1, info=info)
+        mocked_contact = MagicMock()
+        mocked_contact.scalar_one_or_none.return_value = contact
+        self.session.execute.return_value = mocked_contact
         result = await update_info(
             contact_id=contact.id, info=info, user=self.user, db=self.session
         )
         self.assertIsInstance(result, Contact)
-        self.assertEqual(result.info[0], info)
+        self.assertEqual(result.info, info)
+        self.assertSingleUpdate(info=info)
 
     async def test_remove_contact(self):
-        contact = Contact()
-        self.session.query().filter().first.return_value = contact
+        contact = Contact(id=1, user_id=1)
+        mocked_contact = MagicMock()
+        mocked_contact.scalar_one_or_none.return_value = contact
+        self.session.execute.return_value = mocked_contact
         result = await remove_contact(
             contact_id=contact.id, user=self.user, db=self.session
         )
         self.assertEqual(result, contact)
+        self.session.execute.assert_awaited_once()
+        self.assertTrue(self.session.execute.await_args.args[0].is_delete)
+        self.calendar.remove.assert_awaited_once_with(contact)
+
+    async def test_remove_contacts(self):
+        contacts = [Contact(id=1, user_id=1), Contact(id=3, user_id=1)]
+        mocked_contacts = MagicMock()
+        mocked_contacts.scalars.return_value.all.return_value = contacts
+        self.session.execute.return_value = mocked_contacts
+        result = await remove_contacts(contact_ids=[1, 2, 3], user=self.user, db=self.session)
+        self.assertEqual(result, contacts)
+        self.session.execute.assert_awaited_once()
+        self.calendar.remove.assert_awaited_once_with(*contacts)
+
+
+class TestAsyncApplyBatch(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)()
+        self.user = User(username="test_user", email="user@example.com", password="qwerty")
+        self.other = User(username="other", email="other@example.com", password="qwerty")
+        self.session.add_all([self.user, self.other])
+        self.contacts = [
+            Contact(first_name=f"name{i}", last_name="last", email=f"{i}@example.com", phone=f"+1212555000{i}",
+                    birth_date=date(1990, 1, 1 + i), user=self.other if i == 3 else self.user)
+            for i in range(4)
+        ]
+        self.session.add_all(self.contacts)
+        await self.session.commit()
+        calendar_patcher = patch("src.repository.one_contact.birthday_calendar", new_callable=AsyncMock)
+        self.calendar = calendar_patcher.start()
+        self.addCleanup(calendar_patcher.stop)
+
+    async def asyncTearDown(self) -> None:
+        await self.session.close()
+        await self.engine.dispose()
+
+    def create(self, i: int) -> dict:
+        return {"op": "create", "contact": {"first_name": "new", "last_name": "new", "email": f"new{i}@example.com",
+                                            "phone": f"+1212555100{i}", "birth_date": "2000-05-05"}}
+
+    async def apply(self, *operations: dict) -> list:
+        return await apply_batch(ContactBatch(operations=list(operations)).operations, self.user, self.session)
+
+    async def emails(self) -> list:
+        self.session.expunge_all()
+        result = await self.session.execute(select(Contact.email).order_by(Contact.email))
+        return result.scalars().all()
+
+    async def test_bulk(self):
+        first, second, third, foreign = self.contacts
+        statements = []
+        listener = lambda *args: statements.append(args[2].strip())
+        event.listen(self.engine.sync_engine, "before_cursor_execute", listener)
+        results = await self.apply(
+            {"op": "update", "id": first.id, "contact": {"last_name": "changed", "birth_date": "1991-02-02"}},
+            self.create(0),
+            {"op": "delete", "id": second.id},
+            {"op": "update", "id": third.id, "contact": {"info": "note"}},
+            {"op": "delete", "id": foreign.id},
+            self.create(1),
+            {"op": "update", "id": second.id, "contact": {"info": "gone"}},
+            {"op": "create", "contact": {**self.create(2)["contact"], "email": "0@example.com"}},
+        )
+        event.remove(self.engine.sync_engine, "before_cursor_execute", listener)
+        self.assertEqual([status for status, _, _ in results], [200, 201, 200, 200, 404, 201, 404, 409])
+        self.assertEqual(results[0][1].last_name, "changed")
+        self.assertEqual(results[3][1].info, "note")
+        self.assertEqual(results[7][2], messages.CONTACT_EXISTS)
+        # The updates are one executemany per set of changed columns
+        kinds = [statement.split()[0] for statement in statements if not statement.endswith("sa_savepoint_1")]
+        self.assertEqual(kinds, ["DELETE", "SELECT", "UPDATE", "UPDATE", "SELECT", "SELECT", "INSERT"])
+        self.assertEqual(await self.emails(), ["0@example.com", "2@example.com", "3@example.com",
+                                               "new0@example.com", "new1@example.com"])
+        self.calendar.remove.assert_awaited_once_with(results[2][1])
+        self.calendar.add.assert_awaited_once_with(results[0][1], results[1][1], results[5][1])
+
+    async def test_conflict_falls_back_to_one_by_one(self):
+        first, second, _, _ = self.contacts
+        results = await self.apply(
+            {"op": "update", "id": first.id, "contact": {"email": "1@example.com"}},
+            {"op": "update", "id": second.id, "contact": {"info": "kept"}},
+            self.create(0),
+        )
+        self.assertEqual([status for status, _, _ in results], [409, 200, 201])
+        self.assertEqual(results[1][1].info, "kept")
+        self.assertIn("new0@example.com", await self.emails())
 
 
 class TestAsyncUsers(unittest.IsolatedAsyncioTestCase):
     def setUp(self) -> None:
         self.user = User()
-        self.session = MagicMock(spec=Session)
+        self.session = AsyncMock(spec=AsyncSession)
+        cache_patcher = patch("src.repository.users.user_cache", new_callable=AsyncMock)
+        self.cache = cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
 
     async def test_get_user_by_email(self):
-        self.session.query().filter().first.return_value = self.user
+        mocked_user = MagicMock()
+        mocked_user.scalar_one_or_none.return_value = self.user
+        self.session.execute.return_value = mocked_user
         result = await get_user_by_email(email="user@example.com", db=self.session)
         self.assertEqual(result, self.user)
 
@@ -203,15 +463,20 @@ class TestAsyncUsers(unittest.IsolatedAsyncioTestCase):
         token = "test"
         result = await update_token(user=self.user, token=token, db=self.session)
         self.assertEqual(self.user.refresh_token, token)
+        self.cache.invalidate.assert_awaited_once_with(self.user.email)
 
     async def test_confirmed_email(self):
-        self.session.query().filter().first.return_value = self.user
+        mocked_user = MagicMock()
+        mocked_user.scalar_one_or_none.return_value = self.user
+        self.session.execute.return_value = mocked_user
         result = await confirmed_email(email="user@example.com", db=self.session)
         self.assertEqual(self.user.confirmed, True)
 
     async def test_update_avatar_url(self):
         url = "test"
-        self.session.query().filter().first.return_value = self.user
+        mocked_user = MagicMock()
+        mocked_user.scalar_one_or_none.return_value = self.user
+        self.session.execute.return_value = mocked_user
         result = await update_avatar_url(
             email="user@example.com", url=url, db=self.session
         )
@@ -0,0 +1,50 @@
+import json
+import unittest
+from unittest.mock import AsyncMock
+
+from src.conf import messages
+from src.services.user_agents import UserAgentBanMiddleware
+
+
+def http_scope(*headers: tuple[bytes, bytes]) -> dict:
+    return {"type": "http", "method": "GET", "path": "/", "headers": list(headers), "client": ("10.0.0.1", 1234)}
+
+
+class TestAsyncUserAgentBan(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.app = AsyncMock()
+        self.middleware = UserAgentBanMiddleware(self.app, [r"Googlebot", r"Python-urllib/\d"], cache_size=2)
+
+    async def call(self, scope: dict) -> list:
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        await self.middleware(scope, AsyncMock(), send)
+        return sent
+
+    async def test_banned(self):
+        with self.assertLogs("src.services.user_agents", "INFO") as logs:
+            sent = await self.call(http_scope((b"user-agent", b"Mozilla/5.0 (compatible; Googlebot/2.1)")))
+        self.app.assert_not_awaited()
+        self.assertEqual(sent[0]["status"], 403)
+        self.assertEqual(json.loads(sent[1]["body"]), {"detail": messages.BANNED})
+        self.assertEqual(logs.records[0].client, "10.0.0.1")
+
+    async def test_allowed_and_missing_header(self):
+        for scope in (http_scope((b"user-agent", b"Mozilla/5.0")), http_scope(), {"type": "lifespan"}):
+            await self.call(scope)
+        self.assertEqual(self.app.await_count, 3)
+
+    async def test_verdicts_are_cached(self):
+        for user_agent in (b"Python-urllib/3.11", b"Python-urllib/3.11", b"curl/8", b"Mozilla/5.0"):
+            await self.call(http_scope((b"user-agent", user_agent)))
+        self.assertEqual(self.middleware.verdicts.hits, 1)
+        self.assertEqual(len(self.middleware.verdicts), 2)
+        self.assertEqual(self.app.await_count, 2)
+
+    async def test_no_patterns(self):
+        middleware = UserAgentBanMiddleware(self.app, [])
+        await middleware(http_scope((b"user-agent", b"Googlebot")), AsyncMock(), AsyncMock())
+        self.app.assert_awaited_once()